@@ -0,0 +1,138 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTask:
+    def __init__(self, description, on_success, on_error, cancellable=True, quiet=False):
+        self.description = description
+        # Work the app can't go on without (e.g. connecting) ignores Cancel
+        self.cancellable = cancellable
+        # Periodic polls stay out of the status bar
+        self.quiet = quiet
+        self.on_success = on_success
+        self.on_error = on_error
+        self.future = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        # A queued task never starts; a running one finishes in its worker but
+        # its result is dropped instead of being delivered to the UI
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+        logger.debug(f"Cancelled background task: {self.description}")
+
+
+class BackgroundExecutor:
+    def __init__(self, root, max_workers=4, poll_interval=50):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db-worker')
+        # Workers never touch Tk; they hand results to this queue and the Tk
+        # thread drains it from an after() callback
+        self._results = queue.Queue()
+        self._active = []
+        self._listeners = []
+        self._shutdown = False
+        self._after_id = self.root.after(self.poll_interval, self._poll)
+
+    def add_listener(self, callback):
+        # callback(active_tasks) runs on the Tk thread whenever work starts or ends
+        self._listeners.append(callback)
+
+    @property
+    def active_tasks(self):
+        return [task for task in self._active if not task.quiet]
+
+    def submit(self, fn, *args, on_success=None, on_error=None, description=None, cancellable=True, quiet=False,
+               **kwargs):
+        task = BackgroundTask(description or getattr(fn, '__name__', 'task'), on_success, on_error, cancellable, quiet)
+        if self._shutdown:
+            task.cancel()
+            return task
+
+        def run():
+            if task.cancelled:
+                self._results.put((task, None, None))
+                return
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as err:
+                self._results.put((task, None, err))
+            else:
+                self._results.put((task, result, None))
+
+        def on_done(future):
+            # Cancelled before a worker picked it up, so run() never reported back
+            if future.cancelled():
+                self._results.put((task, None, None))
+
+        self._active.append(task)
+        task.future = self._executor.submit(run)
+        task.future.add_done_callback(on_done)
+        self._notify()
+        return task
+
+    def cancel_all(self):
+        for task in list(self._active):
+            if task.cancellable:
+                task.cancel()
+                self._finish(task)
+        self._notify()
+
+    def _finish(self, task):
+        if task in self._active:
+            self._active.remove(task)
+
+    def _notify(self):
+        for callback in self._listeners:
+            try:
+                callback(self.active_tasks)
+            except Exception as err:
+                logger.error(f"Background listener failed: {err}")
+
+    def _poll(self):
+        changed = False
+        while True:
+            try:
+                task, result, err = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if task not in self._active:
+                continue
+            self._finish(task)
+            changed = True
+            if task.cancelled:
+                continue
+            try:
+                if err is not None:
+                    logger.error(f"Background task '{task.description}' failed: {err}")
+                    if task.on_error:
+                        task.on_error(err)
+                elif task.on_success:
+                    task.on_success(result)
+            except Exception as callback_err:
+                logger.error(f"Callback for '{task.description}' failed: {callback_err}")
+        if changed:
+            self._notify()
+        if not self._shutdown:
+            self._after_id = self.root.after(self.poll_interval, self._poll)
+
+    def shutdown(self):
+        self._shutdown = True
+        for task in list(self._active):
+            task.cancel()
+        self._active.clear()
+        try:
+            self.root.after_cancel(self._after_id)
+        except Exception:
+            pass
+        self._executor.shutdown(wait=False, cancel_futures=True)
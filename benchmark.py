@@ -0,0 +1,283 @@
+import argparse
+import json
+import logging
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime
+
+import inventory
+from backends import default_backend, from_url, is_default_database
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    ms = lambda value: round(value * 1000, 3)
+    return {
+        'count': len(ordered),
+        'mean_ms': ms(sum(ordered) / len(ordered)),
+        'min_ms': ms(ordered[0]),
+        'p50_ms': ms(percentile(ordered, 0.50)),
+        'p90_ms': ms(percentile(ordered, 0.90)),
+        'p95_ms': ms(percentile(ordered, 0.95)),
+        'p99_ms': ms(percentile(ordered, 0.99)),
+        'max_ms': ms(ordered[-1]),
+    }
+
+
+def time_case(fn, iterations, warmup):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+class Benchmarks:
+    # Each bench_* method returns a zero-argument callable; one call is one sample
+    def __init__(self, system, seed=42):
+        self.system = system
+        self.rng = random.Random(seed)
+        self.customer_ids = [row[0] for row in system.fetch_all("SELECT id FROM customers")]
+        self.staff_ids = [row[0] for row in system.fetch_all("SELECT id FROM staff")]
+        self.game_ids = [row[0] for row in system.fetch_all("SELECT id FROM games")]
+        self.names = [row[0] for row in system.fetch_all("SELECT name FROM customers LIMIT 1000")]
+        self.titles = [row[0] for row in system.fetch_all("SELECT title FROM games LIMIT 1000")]
+        if not (self.customer_ids and self.staff_ids and self.game_ids):
+            raise ValueError("The database is empty; run datagen.py first")
+        # Deep keyset page for the rentals view (newest first): the key of a row
+        # a tenth of the way down the list
+        self.deep_key = system.fetch_one(
+            "SELECT rental_date, id FROM rentals ORDER BY rental_date DESC, id DESC LIMIT 1 OFFSET %s",
+            (max(0, system.fetch_one("SELECT COUNT(*) FROM rentals")[0] // 10),)
+        )
+
+    def _stock_up(self, copies=1000):
+        # Writes real rentals; shelve enough new copies of a sample of games
+        # (ledger and counter together, so reconciliation stays clean)
+        game_ids = self.rng.sample(self.game_ids, min(20, len(self.game_ids)))
+        with self.system.pool.transaction() as cursor:
+            inventory.restock(cursor, [(game_id, copies) for game_id in game_ids])
+        return game_ids
+
+    def _add_rental(self, prepared, batched):
+        game_ids = self._stock_up()
+
+        def run():
+            self.system.prepared_statements, self.system.batch_statements = prepared, batched
+            if not self.system.add_rental(
+                self.rng.choice(self.customer_ids), self.rng.choice(game_ids), self.rng.choice(self.staff_ids)
+            ):
+                raise RuntimeError("add_rental failed during benchmark")
+        return run
+
+    def _add_customer(self, prepared):
+        run_id = f"{time.time_ns():x}"
+        counter = iter(range(10 ** 9))
+
+        def run():
+            self.system.prepared_statements = prepared
+            if not self.system.add_customer("Bench Customer", f"bench-{run_id}-{next(counter)}@example.com", "555-0000"):
+                raise RuntimeError("add_customer failed during benchmark")
+        return run
+
+    # The *_unprepared/_batched variants measure the per-call effect of
+    # prepared statements and of sending a checkout as one batch (MySQL only;
+    # SQLite caches compiled statements itself and has no round trips to save)
+    def bench_add_rental(self):
+        return self._add_rental(prepared=True, batched=False)
+
+    def bench_add_rental_unprepared(self):
+        return self._add_rental(prepared=False, batched=False)
+
+    def bench_add_rental_batched(self):
+        return self._add_rental(prepared=False, batched=True)
+
+    def bench_add_customer(self):
+        return self._add_customer(prepared=True)
+
+    def bench_add_customer_unprepared(self):
+        return self._add_customer(prepared=False)
+
+    def bench_rentals_first_page(self):
+        return lambda: self.system.fetch_page('rentals', None, 200)
+
+    def bench_rentals_deep_page(self):
+        after = tuple(self.deep_key) if self.deep_key else None
+        return lambda: self.system.fetch_page('rentals', after, 200)
+
+    def bench_reference_staff_cold(self):
+        def run():
+            self.system.reference.invalidate()
+            self.system.reference.staff()
+        return run
+
+    def bench_reference_refresh(self):
+        self.system.reference.staff()
+        return self.system.reference.refresh
+
+    def bench_search_customers(self):
+        return lambda: self.system.search_customers(self.rng.choice(self.names)[:3])
+
+    def bench_search_games(self):
+        return lambda: self.system.search_games(self.rng.choice(self.titles)[:3])
+
+    def bench_populate_rentals_view(self):
+        # The full GUI path: fetch a page and insert it into a Treeview. Needs a
+        # display; skipped on headless machines.
+        import tkinter as tk
+        from tkinter import ttk
+
+        root = tk.Tk()
+        root.withdraw()
+        tree = ttk.Treeview(root, columns=tuple(range(7)))
+
+        def run():
+            tree.delete(*tree.get_children())
+            for values, _ in self.system.fetch_page('rentals', None, 200):
+                tree.insert('', 'end', values=values)
+            root.update_idletasks()
+        run.cleanup = root.destroy
+        return run
+
+
+READ_CASES = [
+    'rentals_first_page',
+    'rentals_deep_page',
+    'reference_staff_cold',
+    'reference_refresh',
+    'search_customers',
+    'search_games',
+    'populate_rentals_view',
+]
+WRITE_CASES = [
+    'add_rental',
+    'add_rental_unprepared',
+    'add_rental_batched',
+    'add_customer',
+    'add_customer_unprepared',
+]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(system, cases=None, iterations=200, warmup=10, seed=42):
+    benchmarks = Benchmarks(system, seed)
+    options = (system.prepared_statements, system.batch_statements)
+    results = {}
+    for name in cases or READ_CASES + WRITE_CASES:
+        try:
+            fn = getattr(benchmarks, f"bench_{name}")()
+        except Exception as err:
+            logger.warning(f"Skipping {name}: {err}")
+            results[name] = {'skipped': str(err)}
+            continue
+        try:
+            results[name] = time_case(fn, iterations, warmup)
+        finally:
+            cleanup = getattr(fn, 'cleanup', None)
+            if cleanup:
+                cleanup()
+        logger.info(f"{name}: p50 {results[name]['p50_ms']} ms, p99 {results[name]['p99_ms']} ms")
+    system.prepared_statements, system.batch_statements = options
+
+    counts = {
+        table: system.fetch_one(f"SELECT COUNT(*) FROM {table}")[0]
+        for table in ('customers', 'games', 'staff', 'rentals')
+    }
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'backend': system.backend.describe(),
+        'python': platform.python_version(),
+        'iterations': iterations,
+        'dataset': counts,
+        'results': results,
+    }
+
+
+def compare(baseline, current):
+    # One line per case: p50/p99 now vs the baseline file, as a % change
+    lines = []
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if 'skipped' in result or not before or 'skipped' in before:
+            continue
+        changes = []
+        for key in ('p50_ms', 'p99_ms'):
+            change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            changes.append(f"{key[:3]} {before[key]} -> {result[key]} ms ({change:+.1f}%)")
+        lines.append(f"{name}: " + ", ".join(changes))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the hot paths and write machine-readable results")
+    parser.add_argument('--db', help="Database URL, e.g. sqlite:///bench.db (default: GAMERENTAL_DB or MySQL)")
+    parser.add_argument('--case', action='append', choices=READ_CASES + WRITE_CASES,
+                        help="Run only this case (repeatable)")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--write', action='store_true',
+                        help="Also run the cases that write to the database (needs --db naming a scratch database)")
+    parser.add_argument('--output', help="Write the JSON results here instead of stdout")
+    parser.add_argument('--compare', help="Baseline JSON file to compare against")
+    args = parser.parse_args()
+
+    from videogamerental import DB_CONFIG, GameRentalSystem, configure_logging
+
+    configure_logging()
+
+    cases = args.case or (READ_CASES + WRITE_CASES if args.write else READ_CASES)
+    writes = [case for case in cases if case in WRITE_CASES]
+    # The write cases shelve copies and add rentals for good, so they only
+    # ever run against a database named on the command line, never the
+    # everyday one
+    if writes and not args.write:
+        parser.error(f"{', '.join(writes)}: these cases write to the database; add --write")
+    if writes and not args.db:
+        parser.error("--write needs --db naming a scratch database")
+    if writes and is_default_database(args.db, DB_CONFIG):
+        parser.error(f"{args.db} is the everyday database (GAMERENTAL_DB or MySQL); use a scratch copy")
+    system = GameRentalSystem(None, backend=from_url(args.db) if args.db else default_backend(DB_CONFIG))
+    try:
+        report = run_benchmarks(system, cases, args.iterations, args.warmup, args.seed)
+    finally:
+        system.close()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            for line in compare(json.load(baseline_file), report):
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import csv
+import logging
+import re
+from decimal import Decimal, InvalidOperation
+
+import inventory
+from backends import Error, default_backend, from_url
+
+logger = logging.getLogger(__name__)
+
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def _text(row, field, max_length, required=True):
+    value = (row.get(field) or '').strip()
+    if required and not value:
+        raise ValueError(f"{field} is required")
+    if len(value) > max_length:
+        raise ValueError(f"{field} is longer than {max_length} characters")
+    return value or None
+
+
+def _email(row):
+    value = _text(row, 'email', 100)
+    if not EMAIL_PATTERN.match(value):
+        raise ValueError(f"invalid email '{value}'")
+    return value
+
+
+def _customer(row):
+    return (_text(row, 'name', 100), _email(row), _text(row, 'phone', 20, required=False))
+
+
+def _game(row):
+    try:
+        price = Decimal((row.get('price_per_day') or '').strip())
+    except InvalidOperation:
+        raise ValueError("price_per_day must be a number")
+    # NaN and Infinity parse, but can't be compared or stored
+    if not price.is_finite():
+        raise ValueError("price_per_day must be a number")
+    if price < 0:
+        raise ValueError("price_per_day cannot be negative")
+    try:
+        copies = int((row.get('available_copies') or '').strip())
+    except ValueError:
+        raise ValueError("available_copies must be a whole number")
+    if copies < 0:
+        raise ValueError("available_copies cannot be negative")
+    return (_text(row, 'title', 100), _text(row, 'genre', 50, required=False), price, copies)
+
+
+def _staff(row):
+    return (_text(row, 'name', 100), _email(row), _text(row, 'position', 50))
+
+
+# kind -> (required CSV columns, INSERT statement, row validator)
+IMPORTERS = {
+    'customers': (
+        ('name', 'email'),
+        "INSERT INTO customers (name, email, phone) VALUES (%s, %s, %s)",
+        _customer,
+    ),
+    'games': (
+        ('title', 'price_per_day', 'available_copies'),
+        "INSERT INTO games (title, genre, price_per_day, available_copies) VALUES (%s, %s, %s, %s)",
+        _game,
+    ),
+    'staff': (
+        ('name', 'email', 'position'),
+        "INSERT INTO staff (name, email, position) VALUES (%s, %s, %s)",
+        _staff,
+    ),
+}
+
+
+class ImportReport:
+    def __init__(self, kind, path):
+        self.kind = kind
+        self.path = path
+        self.inserted = 0
+        self.batches = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    def summary(self):
+        return f"Imported {self.inserted} {self.kind} from {self.path} in {self.batches} batches, {len(self.errors)} rows rejected"
+
+
+def _insert_batch(system, query, batch, report):
+    try:
+        with system.pool.transaction() as cursor:
+            cursor.executemany(query, [values for _, values in batch])
+        report.inserted += len(batch)
+        report.batches += 1
+        return
+    except Error as err:
+        logger.warning(f"Batch of {len(batch)} rows failed ({err}), retrying row by row")
+
+    # Something in the batch was rejected by the database (duplicate email, bad
+    # value...): load the rows one at a time so only the offenders are skipped
+    for line, values in batch:
+        try:
+            with system.pool.transaction() as cursor:
+                cursor.execute(query, values)
+            report.inserted += 1
+        except Error as err:
+            report.add_error(line, err.msg)
+    report.batches += 1
+
+
+def import_csv(system, kind, path, batch_size=500, on_progress=None):
+    if kind not in IMPORTERS:
+        raise ValueError(f"Unknown import kind '{kind}', expected one of {', '.join(IMPORTERS)}")
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    required, query, validate = IMPORTERS[kind]
+    report = ImportReport(kind, path)
+
+    with open(path, newline='', encoding='utf-8-sig') as csv_file:
+        reader = csv.DictReader(csv_file)
+        missing = [column for column in required if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path} is missing required columns: {', '.join(missing)}")
+
+        batch = []
+        for row in reader:
+            # reader.line_num is the physical line, which is what a user can find in the file
+            try:
+                batch.append((reader.line_num, validate(row)))
+            except ValueError as err:
+                report.add_error(reader.line_num, str(err))
+                continue
+            if len(batch) >= batch_size:
+                _insert_batch(system, query, batch, report)
+                batch = []
+                if on_progress:
+                    on_progress(report)
+        if batch:
+            _insert_batch(system, query, batch, report)
+
+    if kind == 'games' and report.inserted:
+        # Put the imported copies on the shelf in the copy ledger
+        try:
+            with system.pool.transaction() as cursor:
+                inventory.stock_new_games(cursor)
+        except Error as err:
+            logger.error(f"Error adding copies for imported games: {err}; run inventory.py --fix")
+
+    report.errors.sort()
+    logger.info(report.summary())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import customers, games or staff from a CSV file")
+    parser.add_argument('kind', choices=sorted(IMPORTERS))
+    parser.add_argument('path', help="CSV file with a header row")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--db', help="Database URL, e.g. sqlite:///rentals.db (default: GAMERENTAL_DB or MySQL)")
+    args = parser.parse_args()
+
+    from videogamerental import DB_CONFIG, GameRentalSystem, configure_logging
+
+    configure_logging()
+
+    system = GameRentalSystem(None, backend=from_url(args.db) if args.db else default_backend(DB_CONFIG))
+    try:
+        report = import_csv(
+            system, args.kind, args.path, args.batch_size,
+            on_progress=lambda r: print(f"{r.inserted} rows imported...")
+        )
+    finally:
+        system.close()
+
+    for line, message in report.errors:
+        print(f"line {line}: {message}")
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
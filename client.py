@@ -0,0 +1,261 @@
+import json
+import logging
+import threading
+import uuid
+from decimal import Decimal
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceError(Exception):
+    def __init__(self, message, status=None, error=None):
+        super().__init__(message)
+        # HTTP status and the service's own error message, when it answered at all
+        self.status = status
+        self.error = error
+
+
+class RemoteReference:
+    # Stands in for ReferenceCache: the service keeps the real cache, the
+    # client just remembers the staff list it last showed
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.Lock()
+        self._staff = None
+
+    def staff(self):
+        staff = [tuple(row) for row in self.client.get('/staff/all')['staff']]
+        with self._lock:
+            self._staff = staff
+        return staff
+
+    def refresh(self):
+        with self._lock:
+            known = self._staff
+        if known is None or self.staff() == known:
+            return []
+        return ['staff']
+
+
+class RemoteRentalSystem:
+    # Thin client for service.py with the same methods the GUI calls on
+    # GameRentalSystem, so a counter needs no database access or credentials
+    def __init__(self, root, url, token=None, timeout=15):
+        self.root = root
+        self.url = url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+        # Lets the service send this counter's reads to the primary right
+        # after it writes, when the service reads from replicas
+        self.session = uuid.uuid4().hex
+        self.reference = RemoteReference(self)
+        try:
+            health = self.get('/health')
+            logger.debug(f"Connected to rental service at {self.url} ({health['backend']})")
+        except ServiceError as err:
+            logger.error(f"Error connecting to rental service: {err}")
+            if self.root is None:
+                raise
+            from tkinter import messagebox
+            messagebox.showerror("Connection Error", f"Failed to connect to the rental service at {self.url}.")
+            self.root.quit()
+
+    def close(self):
+        logger.info("Disconnected from rental service.")
+
+    def _request(self, method, path, params=None, body=None):
+        url = self.url + path + (f"?{urlencode(params)}" if params else "")
+        headers = {'Accept': 'application/json', 'X-Session': self.session}
+        data = None
+        if body is not None:
+            data = json.dumps(body, default=str).encode()
+            headers['Content-Type'] = 'application/json'
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        try:
+            with urlopen(Request(url, data=data, headers=headers, method=method), timeout=self.timeout) as response:
+                return response.status, response.read()
+        except HTTPError as err:
+            # 4xx/5xx still carry a JSON body explaining what went wrong
+            return err.code, err.read()
+        except (URLError, OSError) as err:
+            raise ServiceError(f"{method} {path}: {err}")
+
+    def _json(self, method, path, params=None, body=None):
+        status, data = self._request(method, path, params, body)
+        try:
+            payload = json.loads(data) if data else {}
+        except ValueError:
+            raise ServiceError(f"{method} {path}: HTTP {status}, response is not JSON")
+        return status, payload
+
+    def get(self, path, **params):
+        status, payload = self._json('GET', path, {k: v for k, v in params.items() if v is not None})
+        if status != 200:
+            error = payload.get('error', '')
+            raise ServiceError(f"GET {path}: HTTP {status} {error}".rstrip(), status, error)
+        return payload
+
+    def _write(self, path, body, what):
+        # Same contract as GameRentalSystem: True/False, never an exception
+        try:
+            status, payload = self._json('POST', path, body=body)
+        except ServiceError as err:
+            logger.error(f"Error adding {what}: {err}")
+            return False
+        if status != 201:
+            logger.error(f"Error adding {what}: HTTP {status} {payload.get('error', '')}")
+            return False
+        return True
+
+    # Reads
+
+    def _view(self, path, params, sort, descending, filters):
+        params['sort'] = sort
+        if descending is not None:
+            params['desc'] = int(descending)
+        params.update({f'filter.{name}': value for name, value in (filters or {}).items()})
+        try:
+            return self.get(path, **params)
+        except ServiceError as err:
+            # The service rejects unknown sorts and filters like GameRentalSystem does
+            if err.status == 400:
+                raise ValueError(err.error)
+            raise
+
+    def fetch_page(self, view, after=None, limit=200, sort=None, descending=None, filters=None, until=None):
+        # `after` and `until` are the opaque cursors of rows handed out by an earlier page
+        payload = self._view(f'/{view}', {'after': after, 'until': until, 'limit': limit}, sort, descending, filters)
+        return [(tuple(row['values']), row['cursor']) for row in payload['rows']]
+
+    def view_changes(self, view, since=None, after=None, until=None, sort=None, descending=None, filters=None):
+        payload = self._view(
+            f'/{view}/changes', {'since': since, 'after': after, 'until': until}, sort, descending, filters
+        )
+        rows = [(tuple(row['values']), row['cursor']) for row in payload['rows']]
+        return payload['watermark'], payload['changed'], rows if payload['changed'] is not None else None
+
+    def search_customers(self, text, limit=20):
+        return [tuple(row) for row in self.get('/customers/search', q=text, limit=limit)['results']]
+
+    def search_games(self, text, limit=20, customer_id=None, rentable_only=True):
+        payload = self.get(
+            '/games/search', q=text, limit=limit, customer=customer_id, all=None if rentable_only else 1
+        )
+        return [tuple(row) for row in payload['results']]
+
+    def customer_summary(self, customer_id):
+        try:
+            return self.get('/customers/summary', id=customer_id)
+        except ServiceError as err:
+            if err.status == 404:
+                return None
+            raise
+
+    def customer_reservations(self, customer_id):
+        return [tuple(row) for row in self.get('/customers/reservations', id=customer_id)['reservations']]
+
+    def available_games_between(self, first_day, last_day, limit=None):
+        payload = self.get('/games/availability', **{'from': first_day, 'to': last_day, 'limit': limit})
+        return [tuple(row) for row in payload['games']]
+
+    def game_availability(self, game_id, first_day, last_day):
+        return self.get('/games/availability', **{'id': game_id, 'from': first_day, 'to': last_day})['free']
+
+    def game_bookings(self, game_id, first_day, last_day):
+        payload = self.get('/games/bookings', **{'id': game_id, 'from': first_day, 'to': last_day})
+        return [tuple(row) for row in payload['bookings']]
+
+    def dashboard(self, days=30, limit=10):
+        return self.get('/reports', days=days, limit=limit)
+
+    def diagnostics(self):
+        return self.get('/diagnostics')
+
+    def diagnostics_json(self):
+        return json.dumps(self.diagnostics(), indent=2)
+
+    def prometheus_metrics(self):
+        status, data = self._request('GET', '/metrics')
+        if status != 200:
+            raise ServiceError(f"GET /metrics: HTTP {status}")
+        return data.decode()
+
+    def reset_diagnostics(self):
+        self._json('POST', '/diagnostics/reset')
+
+    # Writes
+
+    def add_customer(self, name, email, phone):
+        return self._write('/customers', {'name': name, 'email': email, 'phone': phone}, "customer")
+
+    def add_game(self, title, genre, price_per_day, copies):
+        return self._write(
+            '/games', {'title': title, 'genre': genre, 'price_per_day': price_per_day, 'copies': copies}, "game"
+        )
+
+    def add_staff(self, name, position, email):
+        return self._write('/staff', {'name': name, 'position': position, 'email': email}, "staff member")
+
+    def add_rental(self, customer_id, game_id, staff_id, rental_date=None, return_date=None):
+        return self._write('/rentals', {
+            'customer_id': customer_id, 'game_id': game_id, 'staff_id': staff_id,
+            'rental_date': rental_date, 'return_date': return_date,
+        }, "rental")
+
+    def add_rentals(self, customer_id, game_ids, staff_id, rental_date=None, return_date=None):
+        if not game_ids:
+            return False
+        return self._write('/rentals/basket', {
+            'customer_id': customer_id, 'game_ids': list(game_ids), 'staff_id': staff_id,
+            'rental_date': rental_date, 'return_date': return_date,
+        }, "rentals")
+
+    def return_rentals(self, rental_ids, return_date=None):
+        # -> {rental_id: (total_cost, late_fee)}, or None on error
+        try:
+            status, payload = self._json('POST', '/returns', body={
+                'rental_ids': list(rental_ids), 'return_date': return_date
+            })
+        except ServiceError as err:
+            logger.error(f"Error returning rentals: {err}")
+            return None
+        if status != 200:
+            logger.error(f"Error returning rentals: HTTP {status} {payload.get('error', '')}")
+            return None
+        return {
+            int(rental_id): (Decimal(str(charge['total_cost'])), Decimal(str(charge['late_fee'])))
+            for rental_id, charge in payload['charges'].items()
+        }
+
+    def return_rental(self, rental_id, return_date=None):
+        charges = self.return_rentals([rental_id], return_date)
+        return charges.get(rental_id) if charges else None
+
+    def reserve(self, customer_id, game_id, first_day, last_day):
+        # -> reservation id, or None if it couldn't be made
+        try:
+            status, payload = self._json('POST', '/reservations', body={
+                'customer_id': customer_id, 'game_id': game_id, 'from': first_day, 'to': last_day
+            })
+        except ServiceError as err:
+            logger.error(f"Error adding reservation: {err}")
+            return None
+        if status != 201:
+            logger.error(f"Error adding reservation: HTTP {status} {payload.get('error', '')}")
+            return None
+        return payload['id']
+
+    def cancel_reservation(self, reservation_id):
+        try:
+            status, payload = self._json('POST', '/reservations/cancel', body={'id': reservation_id})
+        except ServiceError as err:
+            logger.error(f"Error cancelling reservation: {err}")
+            return False
+        if status != 200:
+            logger.error(f"Error cancelling reservation: HTTP {status} {payload.get('error', '')}")
+            return False
+        return True
@@ -0,0 +1,209 @@
+import logging
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from backends import Error, OperationalError, PoolError
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    def __init__(self, backend, pool_size=5, acquire_timeout=10, health_check_interval=30):
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        self.backend = backend
+        if backend.max_connections is not None and pool_size > backend.max_connections:
+            logger.info(f"{backend.name} backend allows {backend.max_connections} connection(s), shrinking pool")
+            pool_size = backend.max_connections
+        self.pool_size = pool_size
+        self.acquire_timeout = acquire_timeout
+        # Connections idle for longer than this are pinged before being handed out
+        self.health_check_interval = health_check_interval
+        # LIFO keeps the most recently used (warmest) connections in circulation
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self.retries = 0
+        # Transactions that were still failing after their last retry
+        self.retries_exhausted = 0
+        # Called after every commit (read-your-writes tracking in replicas.py)
+        self.on_commit = None
+
+    def _open(self):
+        conn = self.backend.connect()
+        logger.debug(f"Opened pooled connection ({self._created}/{self.pool_size})")
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except Error:
+            pass
+
+    def _is_healthy(self, conn, last_used):
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            conn.ping()
+            return True
+        except Error as err:
+            logger.warning(f"Dropping stale pooled connection: {err}")
+            return False
+
+    def _acquire(self):
+        if self._closed:
+            raise PoolError("Connection pool is closed")
+
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._created < self.pool_size
+                    if can_open:
+                        self._created += 1
+                if can_open:
+                    try:
+                        return self._open()
+                    except Error:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError(f"No connection available after {self.acquire_timeout}s")
+                try:
+                    conn, last_used = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    raise PoolError(f"No connection available after {self.acquire_timeout}s")
+
+            if self._is_healthy(conn, last_used):
+                return conn
+            self._discard(conn)
+
+    def _release(self, conn, broken=False):
+        if broken or self._closed:
+            self._discard(conn)
+            return
+        try:
+            # Never hand the next borrower someone else's half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+        except Error:
+            self._discard(conn)
+            return
+        self._idle.put_nowait((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except OperationalError:
+            broken = True
+            raise
+        finally:
+            self._release(conn, broken)
+
+    @contextmanager
+    def cursor(self, **kwargs):
+        with self.connection() as conn:
+            cursor = conn.cursor(**kwargs)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def streaming_cursor(self):
+        # Rows come off the wire as they are fetched (an unbuffered cursor on
+        # MySQL), so a result of any size needs only one fetchmany() of memory.
+        # Leaving early strands the unread rows on the connection, so it is
+        # closed instead of going back to the pool.
+        conn = self._acquire()
+        broken = True
+        try:
+            cursor = conn.cursor(**self.backend.streaming_cursor_options)
+            yield cursor
+            cursor.close()
+            broken = False
+        finally:
+            self._release(conn, broken)
+
+    @contextmanager
+    def transaction(self, prepared=False):
+        with self.connection() as conn:
+            cursor = conn.cursor(prepared=prepared)
+            try:
+                yield cursor
+                conn.commit()
+            except Exception:
+                try:
+                    conn.rollback()
+                except Error as err:
+                    logger.warning(f"Rollback failed: {err}")
+                raise
+            finally:
+                cursor.close()
+        if self.on_commit:
+            self.on_commit()
+
+    def run_transaction(self, work, *args, retries=3, backoff=0.05, prepared=False):
+        # work(cursor, *args) runs inside one transaction; deadlock victims and
+        # lock-wait timeouts (the backend's retryable errors) are retried with
+        # jittered exponential backoff
+        attempt = 0
+        while True:
+            try:
+                with self.transaction(prepared) as cursor:
+                    return work(cursor, *args)
+            except Error as err:
+                if err.errno not in self.backend.retryable_errnos:
+                    raise
+                if attempt >= retries:
+                    with self._lock:
+                        self.retries_exhausted += 1
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                delay = backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                logger.warning(f"Retrying transaction after {err.msg} (attempt {attempt}/{retries}, {delay:.3f}s)")
+                time.sleep(delay)
+
+    def warm_up(self, count=1):
+        # Open connections eagerly so configuration errors surface at startup
+        conns = [self._acquire() for _ in range(min(count, self.pool_size))]
+        for conn in conns:
+            self._release(conn)
+
+    def stats(self):
+        with self._lock:
+            created = self._created
+        return {
+            'pool_size': self.pool_size,
+            'open': created,
+            'idle': self._idle.qsize(),
+            'in_use': created - self._idle.qsize(),
+            'retries': self.retries,
+            'retries_exhausted': self.retries_exhausted,
+        }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+        logger.info("Connection pool closed.")
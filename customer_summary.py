@@ -0,0 +1,105 @@
+import threading
+import time
+from datetime import date
+
+from lru import LRUCache
+
+
+class CustomerSummaries:
+    # What the account panel shows for one customer: lifetime totals from
+    # report_customers (kept up to date by checkouts and returns, like the
+    # other summary tables) plus the rentals still out, which the
+    # (customer_id, return_date, due_date) index finds directly. Recently
+    # picked customers stay in a bounded LRU; writes through GameRentalSystem
+    # drop their customers, and entries older than max_age seconds are
+    # reloaded so changes made at other counters show up too.
+    def __init__(self, system, capacity=256, max_age=30):
+        self.system = system
+        self.max_age = max_age
+        self._cache = LRUCache(capacity)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a load that raced with a write
+        # doesn't put its stale result back in the cache
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, customer_id, today=None):
+        # -> summary dict, or None for an unknown customer
+        entry = self._cache.get(customer_id)
+        if entry is None or time.monotonic() - entry[0] > self.max_age:
+            with self._lock:
+                self.misses += 1
+                generation = self._generation
+            summary = self._load(customer_id)
+            with self._lock:
+                if generation == self._generation:
+                    self._cache.put(customer_id, (time.monotonic(), summary))
+        else:
+            with self._lock:
+                self.hits += 1
+            summary = entry[1]
+        return self._with_overdue(summary, today or date.today())
+
+    def invalidate(self, customer_ids=None):
+        # Forget these customers, or everyone
+        with self._lock:
+            self._generation += 1
+            if customer_ids is None:
+                self._cache.clear()
+            else:
+                for customer_id in customer_ids:
+                    self._cache.pop(customer_id)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._cache), 'capacity': self._cache.capacity, 'hits': self.hits,
+                    'misses': self.misses}
+
+    def _load(self, customer_id):
+        row = self.system.fetch_one(
+            "SELECT c.name, s.rentals, s.open_rentals, s.spent, s.late_fees, s.last_visit "
+            "FROM customers c LEFT JOIN report_customers s ON s.customer_id = c.id WHERE c.id = %s",
+            (customer_id,)
+        )
+        if row is None:
+            return None
+        name, rentals, open_rentals, spent, late_fees, last_visit = row
+        active = self.system.fetch_all(
+            "SELECT r.id, g.title, r.rental_date, r.due_date, r.late_fee FROM rentals r "
+            "LEFT JOIN games g ON g.id = r.game_id WHERE r.customer_id = %s AND r.return_date IS NULL "
+            "ORDER BY r.due_date",
+            (customer_id,)
+        )
+        return {
+            'customer_id': customer_id,
+            'name': name,
+            'rentals': rentals or 0,
+            'open_rentals': open_rentals or 0,
+            'spent': spent or 0,
+            'late_fees': late_fees or 0,
+            'last_visit': last_visit,
+            'active': [
+                {'rental_id': rental_id, 'title': title, 'rental_date': rental_date, 'due_date': due_date,
+                 'late_fee': late_fee}
+                for rental_id, title, rental_date, due_date, late_fee in active
+            ],
+        }
+
+    @staticmethod
+    def _with_overdue(summary, today):
+        # Overdue depends on today's date, so it is worked out on every read
+        # rather than cached
+        if summary is None:
+            return None
+        active = []
+        for rental in summary['active']:
+            due = rental['due_date']
+            if isinstance(due, str):
+                due = date.fromisoformat(due)
+            active.append(dict(rental, overdue=due is not None and due < today))
+        overdue = [rental for rental in active if rental['overdue']]
+        return dict(
+            summary, active=active, overdue=len(overdue),
+            late_fees_due=sum((rental['late_fee'] or 0 for rental in active), 0)
+        )
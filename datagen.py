@@ -0,0 +1,167 @@
+import argparse
+import logging
+import random
+import time
+from datetime import date, timedelta
+
+import inventory
+import reports
+from backends import default_backend, from_url
+
+logger = logging.getLogger(__name__)
+
+FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Jamie", "Avery", "Quinn",
+               "Haider", "Sara", "Omar", "Lena", "Ravi", "Mei", "Noah", "Emma", "Liam", "Zoe"]
+LAST_NAMES = ["Smith", "Khan", "Garcia", "Chen", "Brown", "Ali", "Novak", "Singh", "Lopez", "Kim",
+              "Ahmed", "Muller", "Rossi", "Silva", "Ivanova", "Okafor", "Tanaka", "Haddad", "Jones", "Berg"]
+TITLE_WORDS = ["Dragon", "Quest", "Shadow", "Legends", "Racing", "Star", "Dungeon", "Empire", "Galaxy", "Knight",
+               "Ninja", "Zombie", "Kart", "Tactics", "Odyssey", "Storm", "Souls", "Craft", "Arena", "Frontier"]
+GENRES = ["Action", "Adventure", "RPG", "Racing", "Sports", "Strategy", "Puzzle", "Shooter", "Simulation", "Fighting"]
+POSITIONS = ["Manager", "Staff", "Admin"]
+
+# Rentals per unit of scale; customers/games/staff grow more slowly so the
+# ratios look like a real shop rather than one rental per customer
+SCALES = {
+    'tiny': 1_000,
+    'small': 10_000,
+    'medium': 100_000,
+    'large': 1_000_000,
+    'huge': 10_000_000,
+}
+
+
+def sizes_for(rentals):
+    return {
+        'customers': max(50, rentals // 20),
+        'games': max(20, rentals // 200),
+        'staff': max(3, min(200, rentals // 5000)),
+        'rentals': rentals,
+    }
+
+
+def _insert(system, query, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        with system.pool.transaction() as cursor:
+            cursor.executemany(query, rows[start:start + batch_size])
+
+
+def _insert_stream(system, query, row_iter, batch_size):
+    batch = []
+    for row in row_iter:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            with system.pool.transaction() as cursor:
+                cursor.executemany(query, batch)
+            batch = []
+    if batch:
+        with system.pool.transaction() as cursor:
+            cursor.executemany(query, batch)
+
+
+def generate(system, rentals=1_000, seed=42, batch_size=5_000, days=730, open_ratio=0.05, end_date=None):
+    # Same seed and sizes always produce the same rows, so benchmark runs on
+    # different commits measure the same data
+    rng = random.Random(seed)
+    sizes = sizes_for(rentals)
+    end_date = end_date or date.today()
+    start_date = end_date - timedelta(days=days)
+    started = time.perf_counter()
+    # Emails are unique, so keep numbering after whatever is already there
+    customer_offset = system.fetch_one("SELECT COALESCE(MAX(id), 0) FROM customers")[0]
+    staff_offset = system.fetch_one("SELECT COALESCE(MAX(id), 0) FROM staff")[0]
+
+    customers = [
+        (f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", f"customer{customer_offset + i}@example.com",
+         f"555-{rng.randint(0, 9999):04d}")
+        for i in range(sizes['customers'])
+    ]
+    _insert(system, "INSERT INTO customers (name, email, phone) VALUES (%s, %s, %s)", customers, batch_size)
+
+    games = [
+        (f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} {i}", rng.choice(GENRES),
+         round(rng.uniform(0.99, 9.99), 2), rng.randint(0, 12))
+        for i in range(sizes['games'])
+    ]
+    _insert(
+        system, "INSERT INTO games (title, genre, price_per_day, available_copies) VALUES (%s, %s, %s, %s)",
+        games, batch_size
+    )
+
+    staff = [
+        (f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", f"staff{staff_offset + i}@example.com",
+         rng.choice(POSITIONS))
+        for i in range(sizes['staff'])
+    ]
+    _insert(system, "INSERT INTO staff (name, email, position) VALUES (%s, %s, %s)", staff, batch_size)
+
+    # Ids are looked up rather than assumed, so generating into a database that
+    # already has rows still links rentals to real customers, games and staff
+    customer_ids = [row[0] for row in system.fetch_all("SELECT id FROM customers")]
+    game_rows = system.fetch_all("SELECT id, price_per_day FROM games")
+    staff_ids = [row[0] for row in system.fetch_all("SELECT id FROM staff")]
+
+    period = system.RENTAL_PERIOD_DAYS
+    late_fee_per_day = float(system.LATE_FEE_PER_DAY)
+
+    def rental_rows():
+        for _ in range(sizes['rentals']):
+            game_id, price = rng.choice(game_rows)
+            rental_date = start_date + timedelta(days=rng.randint(0, days))
+            due_date = rental_date + timedelta(days=period)
+            length = rng.randint(1, period * 2)
+            return_date = rental_date + timedelta(days=length)
+            # Recent rentals that wouldn't be back yet stay out
+            if rng.random() < open_ratio or return_date > end_date:
+                return_date, late_fee, total = None, 0, price
+            else:
+                late_fee = max(0, length - period) * late_fee_per_day
+                total = round(float(price) * length + late_fee, 2)
+            yield (rng.choice(customer_ids), game_id, rng.choice(staff_ids), rental_date, due_date, return_date,
+                   price, late_fee, total)
+
+    _insert_stream(
+        system,
+        "INSERT INTO rentals (customer_id, game_id, staff_id, rental_date, due_date, return_date, "
+        "daily_rate, late_fee, total_cost) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        rental_rows(), batch_size
+    )
+
+    # Rows went in behind the app's back; recompute the report summaries and
+    # the copy ledger (copies for the new games, one per open rental)
+    reports.rebuild_reports(system)
+    with system.pool.transaction() as cursor:
+        inventory.stock_new_games(cursor)
+        inventory.link_open_rentals(cursor)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Generated {sizes} in {elapsed:.1f}s (seed {seed})")
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the database with seeded synthetic data")
+    parser.add_argument('--rentals', type=int, help="Number of rentals to generate")
+    parser.add_argument('--scale', choices=list(SCALES), default='tiny', help="Preset size (10^3 to 10^7 rentals)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=5_000)
+    parser.add_argument('--db', help="Database URL, e.g. sqlite:///bench.db (default: GAMERENTAL_DB or MySQL)")
+    parser.add_argument('--migrate', action='store_true', help="Create or upgrade the schema first")
+    args = parser.parse_args()
+
+    import migrations
+    from videogamerental import DB_CONFIG, GameRentalSystem, configure_logging
+
+    configure_logging()
+
+    system = GameRentalSystem(None, backend=from_url(args.db) if args.db else default_backend(DB_CONFIG))
+    try:
+        if args.migrate:
+            migrations.migrate(system)
+        sizes = generate(system, args.rentals or SCALES[args.scale], args.seed, args.batch_size)
+        print(", ".join(f"{count} {table}" for table, count in sizes.items()))
+    finally:
+        system.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import argparse
+import csv
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from backends import default_backend, from_url
+
+logger = logging.getLogger(__name__)
+
+# kind -> (header, query, key column, date column for --from/--to or None).
+# Rows stream in primary key order, which needs no sort on the server.
+EXPORTS = {
+    'rentals': (
+        ['rental_id', 'rental_date', 'due_date', 'return_date', 'customer_id', 'customer_name', 'customer_email',
+         'game_id', 'game_title', 'genre', 'staff_id', 'staff_name', 'daily_rate', 'late_fee', 'total_cost'],
+        """
+        SELECT r.id, r.rental_date, r.due_date, r.return_date, r.customer_id, c.name, c.email,
+               r.game_id, g.title, g.genre, r.staff_id, s.name, r.daily_rate, r.late_fee, r.total_cost
+        FROM rentals r
+        LEFT JOIN customers c ON r.customer_id = c.id
+        LEFT JOIN games g ON r.game_id = g.id
+        LEFT JOIN staff s ON r.staff_id = s.id
+        """,
+        'r.id',
+        'r.rental_date',
+    ),
+    'customers': (['id', 'name', 'email', 'phone'], "SELECT id, name, email, phone FROM customers", 'id', None),
+    'games': (
+        ['id', 'title', 'genre', 'price_per_day', 'available_copies'],
+        "SELECT id, title, genre, price_per_day, available_copies FROM games",
+        'id',
+        None,
+    ),
+    'staff': (['id', 'name', 'position', 'email'], "SELECT id, name, position, email FROM staff", 'id', None),
+}
+
+FORMATS = ('csv', 'jsonl')
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'jsonl' if name.endswith(('.jsonl', '.json', '.ndjson')) else 'csv'
+
+
+def export_query(kind, date_from=None, date_to=None):
+    header, query, key, date_column = EXPORTS[kind]
+    conditions = []
+    params = []
+    if (date_from or date_to) and date_column is None:
+        raise ValueError(f"{kind} has no date to filter on")
+    if date_from:
+        conditions.append(f"{date_column} >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append(f"{date_column} <= %s")
+        params.append(date_to)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+        # A date range walks idx_rentals_rental_date in order instead of sorting the range
+        order = f"{date_column}, {key}"
+    else:
+        order = key
+    return header, f"{query} ORDER BY {order}", params
+
+
+def _csv_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def export(system, kind, path, fmt=None, compress=None, date_from=None, date_to=None, chunk_size=5000,
+           on_progress=None, should_stop=None):
+    # Streams the rows to path a chunk at a time, so memory stays flat however
+    # many rows there are. Writes to path.part and renames it when complete, so
+    # a failed or cancelled export never leaves a truncated file behind.
+    # -> number of rows written
+    if kind not in EXPORTS:
+        raise ValueError(f"Unknown export kind '{kind}', expected one of {', '.join(EXPORTS)}")
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {', '.join(FORMATS)}")
+    if compress is None:
+        compress = path.endswith('.gz')
+    header, query, params = export_query(kind, date_from, date_to)
+
+    started = time.perf_counter()
+    partial = path + '.part'
+    opener = gzip.open if compress else open
+    rows_written = 0
+    try:
+        with opener(partial, 'wt', newline='', encoding='utf-8') as out, \
+                system.reads.streaming_cursor() as cursor:
+            if fmt == 'csv':
+                writer = csv.writer(out)
+                writer.writerow(header)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if fmt == 'csv':
+                    writer.writerows([_csv_value(value) for value in row] for row in rows)
+                else:
+                    out.write("".join(
+                        json.dumps(dict(zip(header, map(_json_value, row))), ensure_ascii=False) + "\n"
+                        for row in rows
+                    ))
+                rows_written += len(rows)
+                if on_progress:
+                    on_progress(rows_written)
+                if should_stop and should_stop():
+                    raise ExportCancelled(f"Export of {kind} cancelled after {rows_written} rows")
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    logger.info(f"Exported {rows_written} {kind} to {path} in {time.perf_counter() - started:.1f}s")
+    return rows_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream rentals or the catalogue to CSV or JSON Lines")
+    parser.add_argument('kind', choices=sorted(EXPORTS))
+    parser.add_argument('path', help="Output file; .jsonl picks JSON Lines and a .gz suffix compresses")
+    parser.add_argument('--format', choices=FORMATS, help="Override the format implied by the file name")
+    parser.add_argument('--gzip', action='store_true', help="Compress even without a .gz suffix")
+    parser.add_argument('--from', dest='date_from', help="Rentals from this date, YYYY-MM-DD (inclusive)")
+    parser.add_argument('--to', dest='date_to', help="Rentals up to this date, YYYY-MM-DD (inclusive)")
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--db', help="Database URL, e.g. sqlite:///rentals.db (default: GAMERENTAL_DB or MySQL)")
+    args = parser.parse_args()
+
+    from videogamerental import DB_CONFIG, GameRentalSystem, configure_logging, parse_date
+
+    configure_logging()
+
+    def progress(rows):
+        if rows // 100_000 > (rows - args.chunk_size) // 100_000:
+            print(f"{rows} rows exported...")
+
+    try:
+        date_from, date_to = parse_date(args.date_from), parse_date(args.date_to)
+    except ValueError as err:
+        parser.error(str(err))
+    system = GameRentalSystem(None, backend=from_url(args.db) if args.db else default_backend(DB_CONFIG))
+    try:
+        count = export(
+            system, args.kind, args.path, args.format, args.gzip or None,
+            date_from, date_to, args.chunk_size, on_progress=progress
+        )
+    except ValueError as err:
+        # A date range on a table without dates and the like
+        parser.error(str(err))
+    finally:
+        system.close()
+    print(f"Exported {count} {args.kind} to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
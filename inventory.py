@@ -0,0 +1,188 @@
+import argparse
+import logging
+
+from backends import Error, default_backend, from_url
+
+logger = logging.getLogger(__name__)
+
+# The copy ledger (migration 6): one game_copies row per physical disc, either
+# 'available' or 'rented', and rentals.copy_id says which one went out. The
+# ledger is the truth; games.available_copies is a counter kept in step with
+# it in the same transactions, for the searches and the lookup cache.
+AVAILABLE = 'available'
+RENTED = 'rented'
+
+
+def add_copies(cursor, counts):
+    # counts: [(game_id, number of new copies on the shelf)]
+    rows = [(game_id, AVAILABLE) for game_id, count in counts for _ in range(int(count))]
+    if rows:
+        cursor.executemany("INSERT INTO game_copies (game_id, status) VALUES (%s, %s)", rows)
+    return len(rows)
+
+
+def restock(cursor, counts):
+    # Shelve more copies of games already in the ledger, counters included
+    add_copies(cursor, counts)
+    for game_id, count in counts:
+        cursor.execute(
+            "UPDATE games SET available_copies = available_copies + %s WHERE id = %s", (int(count), game_id)
+        )
+
+
+def stock_new_games(cursor):
+    # Shelve copies for games that were inserted without any (imports, datagen)
+    cursor.execute(
+        "SELECT id, available_copies FROM games g WHERE available_copies > 0 "
+        "AND NOT EXISTS (SELECT 1 FROM game_copies c WHERE c.game_id = g.id)"
+    )
+    return add_copies(cursor, cursor.fetchall())
+
+
+def link_open_rentals(cursor):
+    # Give every open rental without a copy a rented copy of its game. Copy ids
+    # are derived from the rental ids past the current maximum, so this is two
+    # set-based statements however many rentals there are.
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM game_copies")
+    offset = cursor.fetchone()[0]
+    condition = "return_date IS NULL AND copy_id IS NULL AND game_id IS NOT NULL"
+    cursor.execute(
+        f"INSERT INTO game_copies (id, game_id, status) SELECT id + %s, game_id, %s FROM rentals WHERE {condition}",
+        (offset, RENTED)
+    )
+    linked = cursor.rowcount
+    cursor.execute(f"UPDATE rentals SET copy_id = id + %s WHERE {condition}", (offset,))
+    return linked
+
+
+def build_ledger(cursor, backend):
+    # Migration step: the counters are all there is, so shelve that many
+    # copies of each game, then one rented copy per open rental
+    cursor.execute("SELECT id, available_copies FROM games WHERE available_copies > 0")
+    add_copies(cursor, cursor.fetchall())
+    link_open_rentals(cursor)
+
+
+# Reconciliation: bulk checks of the counters and the ledger against each other
+
+def _drifted_counters(cursor):
+    cursor.execute(
+        "SELECT g.id, g.available_copies, COALESCE(c.copies, 0) FROM games g "
+        "LEFT JOIN (SELECT game_id, COUNT(*) AS copies FROM game_copies WHERE status = %s GROUP BY game_id) c "
+        "ON c.game_id = g.id WHERE g.available_copies <> COALESCE(c.copies, 0) ORDER BY g.id",
+        (AVAILABLE,)
+    )
+    return cursor.fetchall()
+
+
+def _orphaned_copies(cursor):
+    # Marked rented, but no open rental has them
+    cursor.execute(
+        "SELECT c.id FROM game_copies c WHERE c.status = %s "
+        "AND NOT EXISTS (SELECT 1 FROM rentals r WHERE r.copy_id = c.id AND r.return_date IS NULL) ORDER BY c.id",
+        (RENTED,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _unlinked_rentals(cursor):
+    # Open rentals whose copy is missing or not marked rented
+    cursor.execute(
+        "SELECT r.id FROM rentals r LEFT JOIN game_copies c ON c.id = r.copy_id "
+        "WHERE r.return_date IS NULL AND r.game_id IS NOT NULL AND (c.id IS NULL OR c.status <> %s) ORDER BY r.id",
+        (RENTED,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _repair(cursor, orphaned, unlinked):
+    # Games whose copies were never shelved (an interrupted import) keep their counter
+    stock_new_games(cursor)
+    if orphaned:
+        placeholders = ", ".join(["%s"] * len(orphaned))
+        cursor.execute(f"UPDATE game_copies SET status = %s WHERE id IN ({placeholders})", [AVAILABLE] + orphaned)
+    if unlinked:
+        placeholders = ", ".join(["%s"] * len(unlinked))
+        # A copy that exists but is shelved goes back to being rented; rentals
+        # with no copy at all get a new one
+        cursor.execute(
+            f"UPDATE game_copies SET status = %s WHERE status = %s "
+            f"AND id IN (SELECT copy_id FROM rentals WHERE id IN ({placeholders}))",
+            [RENTED, AVAILABLE] + unlinked
+        )
+        cursor.execute(
+            f"UPDATE rentals SET copy_id = NULL WHERE id IN ({placeholders}) "
+            "AND copy_id NOT IN (SELECT id FROM game_copies)",
+            unlinked
+        )
+        link_open_rentals(cursor)
+    # Counters follow the (now consistent) ledger, in one statement
+    available = "SELECT COUNT(*) FROM game_copies c WHERE c.game_id = games.id AND c.status = %s"
+    cursor.execute(
+        f"UPDATE games SET available_copies = ({available}) WHERE available_copies <> ({available})",
+        (AVAILABLE, AVAILABLE)
+    )
+
+
+def _reconcile(cursor, fix):
+    orphaned = _orphaned_copies(cursor)
+    unlinked = _unlinked_rentals(cursor)
+    counters = _drifted_counters(cursor)
+    if fix and (orphaned or unlinked or counters):
+        _repair(cursor, orphaned, unlinked)
+    return {'counters': counters, 'orphaned_copies': orphaned, 'unlinked_rentals': unlinked}
+
+
+def reconcile(system, fix=False):
+    # -> {'counters': [(game_id, counter, copies on the shelf)], 'orphaned_copies':
+    # [copy ids], 'unlinked_rentals': [rental ids]} as found before any fixing,
+    # or None on error. With fix, the ledger is repaired and the counters reset
+    # from it in the same transaction.
+    try:
+        found = system.pool.run_transaction(_reconcile, fix)
+    except Error as err:
+        logger.error(f"Error reconciling inventory: {err}")
+        return None
+    problems = sum(len(items) for items in found.values())
+    if problems:
+        logger.warning(
+            f"Inventory: {len(found['counters'])} drifted counters, {len(found['orphaned_copies'])} orphaned "
+            f"copies, {len(found['unlinked_rentals'])} unlinked rentals{' (fixed)' if fix else ''}"
+        )
+    else:
+        logger.info("Inventory counters match the copy ledger")
+    return found
+
+
+def main():
+    # Meant for a nightly cron job next to overdue.py
+    parser = argparse.ArgumentParser(description="Check games.available_copies against the per-copy ledger")
+    parser.add_argument('--fix', action='store_true', help="Repair the ledger and reset the counters from it")
+    parser.add_argument('--db', help="Database URL, e.g. sqlite:///rentals.db (default: GAMERENTAL_DB or MySQL)")
+    args = parser.parse_args()
+
+    from videogamerental import DB_CONFIG, GameRentalSystem, configure_logging
+
+    configure_logging()
+
+    system = GameRentalSystem(None, backend=from_url(args.db) if args.db else default_backend(DB_CONFIG))
+    try:
+        found = reconcile(system, args.fix)
+    finally:
+        system.close()
+    if found is None:
+        raise SystemExit("Reconciliation failed, see the log for details")
+    for game_id, counter, copies in found['counters']:
+        print(f"game {game_id}: counter says {counter}, {copies} copies on the shelf")
+    if found['orphaned_copies']:
+        print(f"copies marked rented with no open rental: {found['orphaned_copies']}")
+    if found['unlinked_rentals']:
+        print(f"open rentals without a rented copy: {found['unlinked_rentals']}")
+    if not any(found.values()):
+        print("Counters match the ledger")
+    elif not args.fix:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import inventory
+from backends import from_url, is_default_database
+from benchmark import git_commit, summarize
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = ('checkout', 'return', 'add_customer', 'list_rentals', 'list_games', 'search')
+DEFAULT_MIX = 'checkout=30,return=10,add_customer=10,list_rentals=25,list_games=15,search=10'
+# What an operation can come to. Rejected is the system correctly saying no
+# (sold out, already returned); skipped means there was nothing to do.
+OK, REJECTED, FAILED, SKIPPED = 'ok', 'rejected', 'failed', 'skipped'
+
+
+def parse_mix(text):
+    # 'checkout=30,search=10' -> {'checkout': 30.0, 'search': 10.0}
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}' (choose from {', '.join(OPERATIONS)})")
+        mix[name] = float(weight) if weight.strip() else 1.0
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("The mix needs at least one operation with a positive weight")
+    return mix
+
+
+class ErrorCounter(logging.Handler):
+    # Counts ERROR records, i.e. failures the system logged instead of raising
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+class Clerk:
+    # One simulated counter: picks operations from the weighted mix until the
+    # deadline, timing each one. Checkouts and returns only touch the few
+    # "hot" games, so clerks really do fight over the same copies.
+    def __init__(self, system, plan, mix, number, seed, deadline, think_ms):
+        self.system = system
+        self.plan = plan
+        self.names = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.names]
+        self.number = number
+        self.rng = random.Random(seed * 1000 + number)
+        self.deadline = deadline
+        self.think = think_ms / 1000
+        self.samples = defaultdict(list)
+        self.outcomes = defaultdict(Counter)
+        # Successful checkouts and returns per game, for the oversell check
+        self.checked_out = Counter()
+        self.returned = Counter()
+        self._emails = iter(range(10 ** 9))
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            name = self.rng.choices(self.names, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                outcome = getattr(self, f"op_{name}")()
+            except Exception as err:
+                logger.error(f"Clerk {self.number}: {name} raised {err!r}")
+                outcome = FAILED
+            elapsed = time.perf_counter() - started
+            self.outcomes[name][outcome] += 1
+            if outcome != SKIPPED:
+                self.samples[name].append(elapsed)
+            if self.think:
+                time.sleep(self.rng.uniform(0, 2 * self.think))
+
+    def op_checkout(self):
+        game_id = self.rng.choice(self.plan['hot_games'])
+        customer_id = self.rng.choice(self.plan['customer_ids'])
+        if self.system.add_rental(customer_id, game_id, self.rng.choice(self.plan['staff_ids'])):
+            self.checked_out[game_id] += 1
+            return OK
+        # add_rental says False both for sold out (or all reserved) and for
+        # errors. A return landing in between can make a sold-out checkout
+        # count as failed; logged_errors in the report has the full story.
+        _, free = self.system.shelf_copies(game_id, customer_id)
+        return REJECTED if free <= 0 else FAILED
+
+    def op_return(self):
+        hot = self.plan['hot_games']
+        placeholders = ", ".join(["%s"] * len(hot))
+        rows = self.system.fetch_all(
+            f"SELECT id, game_id FROM rentals WHERE return_date IS NULL AND game_id IN ({placeholders}) "
+            "ORDER BY id DESC LIMIT 20",
+            hot
+        )
+        if not rows:
+            return SKIPPED
+        rental_id, game_id = self.rng.choice(rows)
+        charges = self.system.return_rentals([rental_id])
+        if charges and rental_id in charges:
+            self.returned[game_id] += 1
+            return OK
+        # Another clerk returned it first: a lost race rather than a failure
+        row = self.system.fetch_one("SELECT return_date FROM rentals WHERE id = %s", (rental_id,), primary=True)
+        return REJECTED if row is not None and row[0] is not None else FAILED
+
+    def op_add_customer(self):
+        email = f"load-{self.plan['run_id']}-{self.number}-{next(self._emails)}@example.com"
+        return OK if self.system.add_customer("Load Test Customer", email, "555-0000") else FAILED
+
+    def op_list_rentals(self):
+        self.system.fetch_page('rentals', None, 200)
+        return OK
+
+    def op_list_games(self):
+        self.system.fetch_page('games', None, 200)
+        return OK
+
+    def op_search(self):
+        self.system.search_customers(self.rng.choice(self.plan['prefixes']))
+        return OK
+
+
+def _open_system(db_url, pool_size=5):
+    # Always a database named by the caller: a run leaves customers, rentals
+    # and restocked copies behind
+    from videogamerental import GameRentalSystem
+
+    return GameRentalSystem(None, pool_size=pool_size, backend=from_url(db_url))
+
+
+def run_clerks(db_url, plan, mix, first, count, seed, duration, think_ms, pool_size=None):
+    # One process worth of clerks, as threads sharing a connection pool.
+    # Returns plain counters and samples so processes can hand them back.
+    system = _open_system(db_url, pool_size or count)
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    try:
+        deadline = time.monotonic() + duration
+        clerks = [Clerk(system, plan, mix, first + i, seed, deadline, think_ms) for i in range(count)]
+        threads = [threading.Thread(target=clerk.run, name=f"clerk-{clerk.number}") for clerk in clerks]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        pool = system.pool.stats()
+    finally:
+        logging.getLogger().removeHandler(errors)
+        system.close()
+
+    result = {'samples': defaultdict(list), 'outcomes': defaultdict(Counter), 'checked_out': Counter(),
+              'returned': Counter(), 'retries': pool['retries'], 'retries_exhausted': pool['retries_exhausted'],
+              'logged_errors': errors.count}
+    for clerk in clerks:
+        for name, samples in clerk.samples.items():
+            result['samples'][name].extend(samples)
+        for name, outcomes in clerk.outcomes.items():
+            result['outcomes'][name].update(outcomes)
+        result['checked_out'].update(clerk.checked_out)
+        result['returned'].update(clerk.returned)
+    return result
+
+
+def _run_process(args):
+    from videogamerental import configure_logging
+
+    configure_logging()
+    return run_clerks(*args)
+
+
+def prepare(system, hot_games=5, restock=0, seed=42):
+    # What every clerk needs to know, as plain data: who can rent, which games
+    # they fight over, and what to search for
+    rng = random.Random(seed)
+    plan = {
+        'run_id': f"{time.time_ns():x}",
+        'customer_ids': [row[0] for row in system.fetch_all("SELECT id FROM customers LIMIT 10000")],
+        'staff_ids': [row[0] for row in system.fetch_all("SELECT id FROM staff")],
+        'prefixes': sorted({row[0][:3] for row in system.fetch_all("SELECT name FROM customers LIMIT 1000")}),
+    }
+    stocked = "" if restock else " WHERE available_copies > 0"
+    game_ids = [row[0] for row in system.fetch_all(f"SELECT id FROM games{stocked} LIMIT 10000")]
+    if not (plan['customer_ids'] and plan['staff_ids'] and game_ids):
+        raise ValueError("The database has no customers, staff or games in stock; run datagen.py first")
+    plan['hot_games'] = sorted(rng.sample(game_ids, min(hot_games, len(game_ids))))
+    if restock:
+        with system.pool.transaction() as cursor:
+            inventory.restock(cursor, [(game_id, restock) for game_id in plan['hot_games']])
+    return plan
+
+
+def _stock(system, game_ids):
+    # From the primary: a replica's counters may not have caught up yet
+    placeholders = ", ".join(["%s"] * len(game_ids))
+    return dict(system.fetch_all(
+        f"SELECT id, available_copies FROM games WHERE id IN ({placeholders})", game_ids, primary=True
+    ))
+
+
+def check_stock(system, game_ids, before, checked_out, returned):
+    # Every successful checkout and return during the run went through the
+    # clerks, so each hot game must end at before - checked out + returned.
+    # Checking out more copies than were ever on the shelf is an oversell;
+    # any other mismatch is a lost counter update.
+    after = _stock(system, game_ids)
+    violations = []
+    for game_id in game_ids:
+        expected = before[game_id] - checked_out[game_id] + returned[game_id]
+        if after[game_id] == expected and after[game_id] >= 0:
+            continue
+        oversold = after[game_id] < 0 or checked_out[game_id] > before[game_id] + returned[game_id]
+        violations.append({
+            'game_id': game_id, 'kind': 'oversold' if oversold else 'counter drift',
+            'before': before[game_id], 'checked_out': checked_out[game_id], 'returned': returned[game_id],
+            'expected': expected, 'after': after[game_id],
+        })
+    # The ledger view of the same thing: one physical copy out on two rentals
+    double_rented = system.fetch_all(
+        "SELECT copy_id FROM rentals WHERE return_date IS NULL AND copy_id IS NOT NULL "
+        "GROUP BY copy_id HAVING COUNT(*) > 1", primary=True
+    )
+    found = inventory.reconcile(system) or {}
+    return {
+        'hot_games': game_ids,
+        'checked_out': sum(checked_out.values()),
+        'returned': sum(returned.values()),
+        'violations': violations,
+        'double_rented_copies': [row[0] for row in double_rented],
+        'ledger_problems': {key: len(items) for key, items in found.items()},
+    }
+
+
+def run_load_test(db_url, clerks=10, processes=1, duration=30, mix=None, hot_games=5, restock=0,
+                  think_ms=0, seed=42, pool_size=None):
+    mix = mix or parse_mix(DEFAULT_MIX)
+    system = _open_system(db_url)
+    try:
+        plan = prepare(system, hot_games, restock, seed)
+        before = _stock(system, plan['hot_games'])
+        backend = system.backend.describe()
+    finally:
+        system.close()
+
+    # Clerks are dealt out over the processes as evenly as possible
+    processes = max(1, min(processes, clerks))
+    shares = [clerks // processes + (1 if i < clerks % processes else 0) for i in range(processes)]
+    jobs, first = [], 0
+    for share in shares:
+        jobs.append((db_url, plan, mix, first, share, seed, duration, think_ms, pool_size))
+        first += share
+    logger.info(f"Load test: {clerks} clerks in {processes} process(es) for {duration}s against {backend}")
+    started = time.perf_counter()
+    if processes == 1:
+        results = [run_clerks(*jobs[0])]
+    else:
+        # spawn: workers must not inherit this process's connections
+        with multiprocessing.get_context('spawn').Pool(processes) as workers:
+            results = workers.map(_run_process, jobs)
+    elapsed = time.perf_counter() - started
+
+    samples, outcomes, checked_out, returned = defaultdict(list), defaultdict(Counter), Counter(), Counter()
+    for result in results:
+        for name, values in result['samples'].items():
+            samples[name].extend(values)
+        for name, counts in result['outcomes'].items():
+            outcomes[name].update(counts)
+        checked_out.update(result['checked_out'])
+        returned.update(result['returned'])
+
+    operations = {}
+    for name in OPERATIONS:
+        if not samples[name]:
+            continue
+        operations[name] = {
+            'ops': len(samples[name]),
+            'ops_per_s': round(len(samples[name]) / elapsed, 1),
+            **{outcome: outcomes[name][outcome] for outcome in (OK, REJECTED, FAILED, SKIPPED)},
+            **summarize(samples[name]),
+        }
+    total = sum(len(values) for values in samples.values())
+
+    system = _open_system(db_url)
+    try:
+        stock = check_stock(system, plan['hot_games'], before, checked_out, returned)
+    finally:
+        system.close()
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'backend': backend,
+        'python': platform.python_version(),
+        'clerks': clerks,
+        'processes': processes,
+        'duration_s': round(elapsed, 3),
+        'mix': mix,
+        'ops': total,
+        'ops_per_s': round(total / elapsed, 1),
+        'operations': operations,
+        'retries': sum(result['retries'] for result in results),
+        'retries_exhausted': sum(result['retries_exhausted'] for result in results),
+        'logged_errors': sum(result['logged_errors'] for result in results),
+        'stock': stock,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many simulated rental counters against one database at once")
+    parser.add_argument('--db', required=True,
+                        help="URL of a scratch database to load, e.g. sqlite:///load.db; the run writes to it for good")
+    parser.add_argument('--clerks', type=int, default=10, help="Simulated counters working at once")
+    parser.add_argument('--processes', type=int, default=1, help="Spread the clerks over this many processes")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds to run")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument('--hot-games', type=int, default=5, help="Games all checkouts and returns compete for")
+    parser.add_argument('--restock', type=int, default=0, help="Shelve this many extra copies of each hot game first")
+    parser.add_argument('--think-ms', type=float, default=0, help="Mean pause between a clerk's operations")
+    parser.add_argument('--pool-size', type=int, help="Connections per process (default: one per clerk)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Write the JSON results here instead of stdout")
+    args = parser.parse_args()
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as err:
+        parser.error(str(err))
+
+    from videogamerental import DB_CONFIG, configure_logging
+
+    configure_logging()
+    if is_default_database(args.db, DB_CONFIG):
+        parser.error(f"{args.db} is the everyday database (GAMERENTAL_DB or MySQL); use a scratch copy")
+
+    report = run_load_test(
+        args.db, args.clerks, args.processes, args.duration, mix, args.hot_games, args.restock,
+        args.think_ms, args.seed, args.pool_size
+    )
+    for name, result in report['operations'].items():
+        logger.info(
+            f"{name}: {result['ops_per_s']} ops/s, p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+            f"{result[REJECTED]} rejected, {result[FAILED]} failed"
+        )
+    logger.info(
+        f"{report['ops_per_s']} ops/s overall, {report['retries']} retries, "
+        f"{report['retries_exhausted']} gave up, {len(report['stock']['violations'])} stock violations"
+    )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(output + "\n")
+    else:
+        print(output)
+    # Non-zero so a CI job notices an oversell or a ledger out of step
+    stock = report['stock']
+    if stock['violations'] or stock['double_rented_copies'] or any(stock['ledger_problems'].values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+import argparse
+import logging
+from datetime import date
+
+import inventory
+import reports
+import reservations
+from backends import Error, default_backend, from_url
+
+logger = logging.getLogger(__name__)
+
+
+def _change_tracking(table):
+    # updated_at on every row, set by the database itself on insert and on
+    # every update, so the view windows can ask for just what changed. SQLite
+    # can't add a column with a clock default, so triggers stamp it there.
+    now = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+    return [
+        {
+            'mysql': f"ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP(3) NOT NULL "
+                     "DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)",
+            'sqlite': f"ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP",
+        },
+        {'sqlite': f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_inserted AFTER INSERT ON {table}
+        BEGIN UPDATE {table} SET updated_at = {now} WHERE id = NEW.id; END
+        """},
+        {'sqlite': f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_updated AFTER UPDATE ON {table}
+        WHEN NEW.updated_at IS OLD.updated_at
+        BEGIN UPDATE {table} SET updated_at = {now} WHERE id = NEW.id; END
+        """},
+        f"CREATE INDEX idx_{table}_updated ON {table} (updated_at)",
+    ]
+
+
+def _unswap_staff(cursor, backend):
+    # add_staff used to write the email into position and the other way
+    # round. Row by row, because MySQL applies SET assignments left to right
+    # and a single swapping UPDATE would copy one column over the other.
+    cursor.execute("SELECT id, position, email FROM staff WHERE position LIKE %s AND email NOT LIKE %s",
+                   ('%@%', '%@%'))
+    for staff_id, position, email in cursor.fetchall():
+        cursor.execute("UPDATE staff SET position = %s, email = %s WHERE id = %s", (email, position, staff_id))
+
+
+# (version, description, statements). A statement is portable SQL, a
+# {backend name: SQL} dict (backends it doesn't name skip it), or a
+# fn(cursor, backend) for data steps. Never edit a migration that has shipped;
+# add a new one instead.
+MIGRATIONS = [
+    (1, "Initial schema", [
+        """
+        CREATE TABLE IF NOT EXISTS customers (
+            id INT PRIMARY KEY AUTO_INCREMENT,
+            name VARCHAR(100) NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            phone VARCHAR(20)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS games (
+            id INT PRIMARY KEY AUTO_INCREMENT,
+            title VARCHAR(100) NOT NULL,
+            genre VARCHAR(50),
+            price_per_day DECIMAL(10,2) NOT NULL,
+            available_copies INT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS staff (
+            id INT PRIMARY KEY AUTO_INCREMENT,
+            name VARCHAR(100) NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            position VARCHAR(50) NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS rentals (
+            id INT PRIMARY KEY AUTO_INCREMENT,
+            customer_id INT,
+            game_id INT,
+            staff_id INT,
+            rental_date DATE NOT NULL,
+            return_date DATE,
+            total_cost DECIMAL(10,2),
+            FOREIGN KEY (customer_id) REFERENCES customers(id),
+            FOREIGN KEY (game_id) REFERENCES games(id),
+            FOREIGN KEY (staff_id) REFERENCES staff(id)
+        )
+        """,
+    ]),
+    (2, "Indexes for the rentals view, type-ahead search and available games", [
+        # Rentals view pages by (rental_date, id) descending
+        "CREATE INDEX idx_rentals_rental_date ON rentals (rental_date, id)",
+        # Prefix searches with ORDER BY name/title LIMIT n. SQLite only uses an
+        # index for case-insensitive LIKE when the index itself is NOCASE.
+        {
+            'mysql': "CREATE INDEX idx_customers_name ON customers (name)",
+            'sqlite': "CREATE INDEX idx_customers_name ON customers (name COLLATE NOCASE)",
+        },
+        {
+            'mysql': "CREATE INDEX idx_games_title ON games (title, available_copies)",
+            'sqlite': "CREATE INDEX idx_games_title ON games (title COLLATE NOCASE, available_copies)",
+        },
+        # Reference cache: games WHERE available_copies > 0
+        "CREATE INDEX idx_games_available ON games (available_copies, title)",
+    ]),
+    (3, "Rental rate, due date and late fee for returns", [
+        "ALTER TABLE rentals ADD COLUMN daily_rate DECIMAL(10,2)",
+        "ALTER TABLE rentals ADD COLUMN due_date DATE",
+        "ALTER TABLE rentals ADD COLUMN late_fee DECIMAL(10,2) NOT NULL DEFAULT 0",
+        # Open rentals were charged one day at the price of the day they went out
+        """
+        UPDATE rentals SET daily_rate = COALESCE(
+            CASE WHEN return_date IS NULL THEN total_cost END,
+            (SELECT price_per_day FROM games WHERE games.id = rentals.game_id)
+        )
+        WHERE daily_rate IS NULL
+        """,
+        # The rental period at the time of this migration was 7 days
+        {
+            'mysql': "UPDATE rentals SET due_date = DATE_ADD(rental_date, INTERVAL 7 DAY) WHERE due_date IS NULL",
+            'sqlite': "UPDATE rentals SET due_date = date(rental_date, '+7 days') WHERE due_date IS NULL",
+        },
+        # Overdue fee run: open rentals past their due date
+        "CREATE INDEX idx_rentals_open ON rentals (return_date, due_date)",
+    ]),
+    (4, "Summary tables for the Reports tab", [
+        """
+        CREATE TABLE IF NOT EXISTS report_daily (
+            day DATE PRIMARY KEY,
+            rentals INT NOT NULL DEFAULT 0,
+            returns INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+            late_fees DECIMAL(12,2) NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS report_games (
+            game_id INT PRIMARY KEY,
+            rentals INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(12,2) NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS report_staff (
+            staff_id INT PRIMARY KEY,
+            rentals INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(12,2) NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS report_genres (
+            genre VARCHAR(50) PRIMARY KEY,
+            rentals INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(12,2) NOT NULL DEFAULT 0
+        )
+        """,
+        # Top games by number of rentals
+        "CREATE INDEX idx_report_games_rentals ON report_games (rentals)",
+        # Fill them from the existing history
+        reports.rebuild,
+    ]),
+    (5, "Indexes for sorting and filtering the view windows", [
+        # Both engines append the primary key to a secondary index, so these
+        # already order by (column, id) the way the keyset pages need
+        "CREATE INDEX idx_games_price ON games (price_per_day)",
+        "CREATE INDEX idx_games_genre ON games (genre)",
+        # One customer's or one game's rentals, newest first
+        "CREATE INDEX idx_rentals_customer ON rentals (customer_id, rental_date, id)",
+        "CREATE INDEX idx_rentals_game ON rentals (game_id, rental_date, id)",
+    ]),
+    (6, "Per-copy inventory ledger", [
+        """
+        CREATE TABLE IF NOT EXISTS game_copies (
+            id INT PRIMARY KEY AUTO_INCREMENT,
+            game_id INT NOT NULL,
+            status VARCHAR(10) NOT NULL DEFAULT 'available',
+            FOREIGN KEY (game_id) REFERENCES games(id)
+        )
+        """,
+        "ALTER TABLE rentals ADD COLUMN copy_id INT",
+        # Allocation: the lowest free copy of a game
+        "CREATE INDEX idx_game_copies_game ON game_copies (game_id, status)",
+        # Reconciliation: which open rental holds a copy
+        "CREATE INDEX idx_rentals_copy ON rentals (copy_id)",
+        # Shelve the copies the counters say are there, plus one rented copy per open rental
+        inventory.build_ledger,
+    ]),
+    (7, "Change tracking for auto-refreshing view windows", [
+        statement for table in ('customers', 'games', 'staff', 'rentals') for statement in _change_tracking(table)
+    ]),
+    (8, "Per-customer summaries for the account panel", [
+        # Lifetime rentals, rentals still out, money paid and the last day the
+        # customer rented or returned something; checkouts and returns keep it
+        """
+        CREATE TABLE IF NOT EXISTS report_customers (
+            customer_id INT PRIMARY KEY,
+            rentals INT NOT NULL DEFAULT 0,
+            open_rentals INT NOT NULL DEFAULT 0,
+            spent DECIMAL(12,2) NOT NULL DEFAULT 0,
+            late_fees DECIMAL(12,2) NOT NULL DEFAULT 0,
+            last_visit DATE
+        )
+        """,
+        # One customer's open rentals, soonest due first
+        "CREATE INDEX idx_rentals_customer_open ON rentals (customer_id, return_date, due_date)",
+        reports.rebuild_customers,
+    ]),
+    (9, "Date-range reservations", [
+        # One copy held for a customer from start_date to end_date, inclusive
+        """
+        CREATE TABLE IF NOT EXISTS reservations (
+            id INT PRIMARY KEY AUTO_INCREMENT,
+            customer_id INT NOT NULL,
+            game_id INT NOT NULL,
+            copy_id INT NOT NULL,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            status VARCHAR(10) NOT NULL DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(id),
+            FOREIGN KEY (game_id) REFERENCES games(id),
+            FOREIGN KEY (copy_id) REFERENCES game_copies(id)
+        )
+        """,
+        # Is this copy reserved during these days (reserving, checkouts)
+        "CREATE INDEX idx_reservations_copy ON reservations (copy_id, start_date, end_date)",
+        # Everything reserved during these days (the catalogue availability search)
+        "CREATE INDEX idx_reservations_dates ON reservations (start_date, end_date)",
+        # A customer's reservations (account panel, pick-up)
+        "CREATE INDEX idx_reservations_customer ON reservations (customer_id, start_date)",
+        # A copy's open rental without walking its whole rental history;
+        # supersedes idx_rentals_copy
+        "CREATE INDEX idx_rentals_copy_open ON rentals (copy_id, return_date, due_date)",
+        {'mysql': "DROP INDEX idx_rentals_copy ON rentals", 'sqlite': "DROP INDEX IF EXISTS idx_rentals_copy"},
+    ]),
+    (10, "Indexes for sorting the staff view", [
+        # Name is also a prefix filter, hence NOCASE on SQLite like customers
+        {
+            'mysql': "CREATE INDEX idx_staff_name ON staff (name)",
+            'sqlite': "CREATE INDEX idx_staff_name ON staff (name COLLATE NOCASE)",
+        },
+        "CREATE INDEX idx_staff_position ON staff (position)",
+    ]),
+    (11, "Repair staff added with position and email swapped", [
+        _unswap_staff,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT PRIMARY KEY,
+        description VARCHAR(200) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def current_version(system):
+    with system.pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            _ensure_version_table(cursor)
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+
+def migrate(system, target=None):
+    target = LATEST_VERSION if target is None else target
+    version = current_version(system)
+    applied = []
+    for number, description, statements in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        logger.info(f"Applying migration {number}: {description}")
+        with system.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for statement in statements:
+                    if callable(statement):
+                        statement(cursor, system.pool.backend)
+                        continue
+                    if isinstance(statement, dict):
+                        statement = statement.get(system.pool.backend.name)
+                        if statement is None:
+                            continue
+                    try:
+                        cursor.execute(system.pool.backend.ddl(statement))
+                    except Error as err:
+                        # Re-running a half-applied migration (MySQL DDL is not
+                        # transactional) must not fail on objects that made it
+                        if not system.pool.backend.ignorable_ddl_error(err):
+                            raise
+                        logger.warning(f"Migration {number}: {err.msg}, skipping")
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)", (number, description)
+                )
+                conn.commit()
+            finally:
+                cursor.close()
+        applied.append(number)
+    return applied
+
+
+def hot_queries(system):
+    # (name, query, params) for the statements the app runs most; keep in step
+    # with GameRentalSystem
+    backend = system.pool.backend
+    rentals = system.VIEWS['rentals']
+    reserved = reservations.overlapping(date(2024, 6, 1), date(2024, 6, 2))
+    rentable = system._rentable(1)
+    unreserved = reservations.unreserved(1, date(2024, 6, 1), date(2024, 6, 8))
+    first_page, first_params = rentals.page_sql(None, 200, backend.row_value_keyset)
+    next_page, next_params = rentals.page_sql(('2024-01-01', 1000), 200, backend.row_value_keyset)
+    return [
+        ("rentals view, first page", first_page, first_params),
+        ("rentals view, next page", next_page, next_params),
+        ("customer search", "SELECT id, name FROM customers WHERE name LIKE %s ESCAPE '!' "
+         f"ORDER BY {backend.text_order('name')} LIMIT %s", ['a%', 20]),
+        ("game search", f"SELECT id, title FROM games WHERE title LIKE %s ESCAPE '!' AND {rentable[0]} "
+         f"ORDER BY {backend.text_order('title')} LIMIT %s", ['a%'] + rentable[1] + [20]),
+        ("overdue rentals", "SELECT COUNT(*), SUM(late_fee) FROM rentals "
+         "WHERE return_date IS NULL AND due_date < %s", ['2024-01-01']),
+        ("top games report", "SELECT game_id, rentals, revenue FROM report_games ORDER BY rentals DESC LIMIT %s", [10]),
+        ("customers by name", *system.view_query('customers', 'Name').page_sql(
+            ('M', 1000), 200, backend.row_value_keyset)),
+        ("games by price", *system.view_query('games', 'Price/Day', True).page_sql(
+            None, 200, backend.row_value_keyset)),
+        ("staff by name", *system.view_query('staff', 'Name').page_sql(('M', 10), 200, backend.row_value_keyset)),
+        ("staff by position", *system.view_query('staff', 'Position', True).page_sql(
+            None, 200, backend.row_value_keyset)),
+        ("rentals for a customer", *system.view_query('rentals', filters={'Customer ID': 1}).page_sql(
+            ('2024-01-01', 1000), 200, backend.row_value_keyset)),
+        ("allocate a copy", *system._candidate_copies_sql(1, *unreserved, 1)),
+        ("copies on the shelf", "SELECT COUNT(*) FROM game_copies WHERE game_id = %s AND status = 'available'", [1]),
+        ("copy of an open rental", "SELECT 1 FROM rentals WHERE copy_id = %s AND return_date IS NULL", [1]),
+        ("changed rentals", "SELECT id FROM rentals WHERE updated_at > %s LIMIT %s", ['2024-01-01', 501]),
+        ("customer account", "SELECT c.name, s.rentals, s.open_rentals, s.spent, s.late_fees, s.last_visit "
+         "FROM customers c LEFT JOIN report_customers s ON s.customer_id = c.id WHERE c.id = %s", [1]),
+        ("customer's open rentals", "SELECT r.id, g.title, r.rental_date, r.due_date, r.late_fee FROM rentals r "
+         "LEFT JOIN games g ON g.id = r.game_id WHERE r.customer_id = %s AND r.return_date IS NULL "
+         "ORDER BY r.due_date", [1]),
+        ("daily revenue report", "SELECT day, rentals, returns, revenue, late_fees FROM report_daily "
+         "ORDER BY day DESC LIMIT %s", [30]),
+        ("reservations of a copy", f"SELECT id FROM reservations WHERE copy_id = %s AND {reserved[0]} LIMIT 1",
+         [1] + reserved[1]),
+        ("reservations in a date range", f"SELECT copy_id FROM reservations WHERE {reserved[0]}", reserved[1]),
+        ("copies out in a date range", "SELECT copy_id FROM rentals WHERE return_date IS NULL "
+         "AND copy_id IS NOT NULL AND (due_date >= %s OR due_date < %s)", ['2024-06-01', '2024-01-01']),
+        ("customer's reservations", "SELECT id, game_id, start_date, end_date FROM reservations "
+         "WHERE customer_id = %s AND start_date >= %s AND status = 'active' ORDER BY start_date", [1, '2024-01-01']),
+    ]
+
+
+def check_indexes(system):
+    # EXPLAIN every hot query and flag full scans and filesorts. On a nearly
+    # empty table the optimiser may scan anyway, so check against real data.
+    # Backends that can explain have explain(cursor, query, params) ->
+    # [(step summary, [issues])].
+    backend = system.pool.backend
+    if not hasattr(backend, 'explain'):
+        logger.warning(f"Can't check index use on {backend.describe()}: no EXPLAIN support")
+        return []
+    problems = []
+    for name, query, params in hot_queries(system):
+        with system.pool.cursor() as cursor:
+            plan = backend.explain(cursor, query, params)
+        for step, issues in plan:
+            summary = f"{name}: {step}"
+            if issues:
+                problems.append(f"{summary} ({', '.join(issues)})")
+                logger.warning(f"{summary} ({', '.join(issues)})")
+            else:
+                logger.info(summary)
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or upgrade the game rental database schema")
+    parser.add_argument('--target', type=int, help="Migrate up to this version (default: latest)")
+    parser.add_argument('--create-database', action='store_true', help="Create the database first if needed")
+    parser.add_argument('--check', action='store_true', help="EXPLAIN the hot queries and report missing index use")
+    parser.add_argument('--db', help="Database URL, e.g. sqlite:///rentals.db (default: GAMERENTAL_DB or MySQL)")
+    args = parser.parse_args()
+
+    from videogamerental import DB_CONFIG, GameRentalSystem, configure_logging
+
+    configure_logging()
+
+    backend = from_url(args.db) if args.db else default_backend(DB_CONFIG)
+    if args.create_database:
+        backend.create_database()
+
+    system = GameRentalSystem(None, backend=backend)
+    try:
+        applied = migrate(system, args.target)
+        print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
+        print(f"Schema version: {current_version(system)}")
+        if args.check:
+            problems = check_indexes(system)
+            for problem in problems:
+                print(problem)
+            print("All hot queries use indexes" if not problems else f"{len(problems)} query plans need attention")
+    finally:
+        system.close()
+
+
+if __name__ == "__main__":
+    main()
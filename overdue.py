@@ -0,0 +1,31 @@
+import argparse
+from datetime import datetime
+
+from backends import default_backend, from_url
+
+
+def main():
+    # Meant for a nightly cron job, e.g. 0 2 * * * python overdue.py
+    parser = argparse.ArgumentParser(description="Recompute late fees on every overdue open rental")
+    parser.add_argument('--as-of', help="Assess fees as of this date, YYYY-MM-DD (default: today)")
+    parser.add_argument('--db', help="Database URL, e.g. sqlite:///rentals.db (default: GAMERENTAL_DB or MySQL)")
+    args = parser.parse_args()
+
+    from videogamerental import DB_CONFIG, GameRentalSystem, configure_logging, format_money
+
+    configure_logging()
+
+    as_of = datetime.strptime(args.as_of, '%Y-%m-%d').date() if args.as_of else None
+    system = GameRentalSystem(None, backend=from_url(args.db) if args.db else default_backend(DB_CONFIG))
+    try:
+        result = system.assess_late_fees(as_of)
+    finally:
+        system.close()
+    if result is None:
+        raise SystemExit("Late fee run failed, see the log for details")
+    count, outstanding = result
+    print(f"{count} overdue rentals, {format_money(outstanding)} in late fees outstanding")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+import logging
+import tkinter as tk
+from tkinter import ttk
+
+from lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class PagedTreeview(ttk.Frame):
+    # Treeview that only ever holds a few pages of rows. Pages are fetched with
+    # keyset pagination as the user scrolls towards either edge and kept in a
+    # bounded LRU, so opening a view costs one page whatever the table size.
+    def __init__(self, parent, columns, fetch_page, run_in_background, page_size=200,
+                 window_pages=3, cache_pages=20, on_error=None, fetch_changes=None, refresh_ms=None):
+        super().__init__(parent)
+        self.columns = columns
+        # fetch_page(after_key, limit, until_key=None) -> [(values, key), ...]
+        self.fetch_page = fetch_page
+        # fetch_changes(watermark, after_key, until_key) -> (watermark, changed
+        # row ids, [(values, key), ...]), polled every refresh_ms to patch the
+        # rows on screen in place. Rows are matched up by their first value,
+        # which must be the primary key.
+        self.fetch_changes = fetch_changes
+        self.refresh_ms = refresh_ms
+        self.auto_refresh = bool(fetch_changes and refresh_ms)
+        self.run_in_background = run_in_background
+        self.on_error = on_error
+        self.page_size = page_size
+        self.window_pages = window_pages
+        self.pages = LRUCache(cache_pages)
+
+        # _page_starts[i] is the key page i starts after; it only grows as the
+        # user scrolls forward, one small tuple per page seen
+        self._page_starts = [None]
+        self._last_page = None
+        self._loaded = []
+        self._items = {}
+        self._ids = {}
+        self._pending = {}
+        self._watermark = None
+        self._refresh_task = None
+        self._refresh_job = None
+
+        y_scroll = ttk.Scrollbar(self, orient='vertical')
+        x_scroll = ttk.Scrollbar(self, orient='horizontal')
+        self.y_scroll = y_scroll
+
+        self.tree = ttk.Treeview(self, yscrollcommand=self._on_yscroll, xscrollcommand=x_scroll.set)
+        self.tree['columns'] = columns
+        self.tree.column('#0', width=0, stretch=tk.NO)
+        for col in columns:
+            self.tree.column(col, width=150)
+            self.tree.heading(col, text=col)
+
+        y_scroll.config(command=self.tree.yview)
+        x_scroll.config(command=self.tree.xview)
+
+        self.status = ttk.Label(self, text="Loading...")
+        self.status.pack(side='bottom', fill='x')
+        y_scroll.pack(side='right', fill='y')
+        x_scroll.pack(side='bottom', fill='x')
+        self.tree.pack(fill='both', expand=True)
+
+        self._request(0)
+        if self.auto_refresh:
+            self._refresh()
+
+    def _on_yscroll(self, first, last):
+        self.y_scroll.set(first, last)
+        if not self._loaded:
+            return
+        if float(last) > 0.9:
+            self._ensure(self._loaded[-1] + 1)
+        if float(first) < 0.1 and self._loaded[0] > 0:
+            self._ensure(self._loaded[0] - 1)
+
+    def _ensure(self, page):
+        if self._last_page is not None and page > self._last_page:
+            return
+        if page >= len(self._page_starts):
+            return
+        rows = self.pages.get(page)
+        if rows is not None:
+            # Defer so we never modify the tree from inside its own scroll callback
+            self.after_idle(self._show, page, rows)
+        else:
+            self._request(page)
+
+    def _request(self, page):
+        task = self._pending.get(page)
+        if task is not None and not task.cancelled:
+            return
+        after = self._page_starts[page]
+        self._pending[page] = self.run_in_background(
+            f"Loading page {page + 1}", self.fetch_page, after, self.page_size + 1,
+            on_success=lambda rows: self._loaded_page(page, rows),
+            on_error=self._failed
+        )
+        self.status.config(text="Loading...")
+
+    def _failed(self, err):
+        self._pending.clear()
+        self.status.config(text="Failed to load rows")
+        if self.on_error:
+            self.on_error(err)
+
+    def _loaded_page(self, page, rows):
+        self._pending.pop(page, None)
+        if not self.winfo_exists():
+            return
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            if len(self._page_starts) == page + 1:
+                self._page_starts.append(rows[-1][1])
+        else:
+            self._last_page = page
+        self.pages.put(page, rows)
+        self._show(page, rows)
+
+    def _show(self, page, rows):
+        if not self.winfo_exists() or page in self._items:
+            return
+        tree = self.tree
+        first = float(tree.yview()[0])
+        total = len(tree.get_children())
+        top_row = first * total
+
+        if not self._loaded or page == self._loaded[-1] + 1:
+            self._items[page] = [self._insert('end', values) for values, _ in rows]
+            self._loaded.append(page)
+            if len(self._loaded) > self.window_pages:
+                dropped = self._drop(self._loaded.pop(0))
+                top_row -= dropped
+        elif page == self._loaded[0] - 1:
+            self._items[page] = [self._insert(index, values) for index, (values, _) in enumerate(rows)]
+            self._loaded.insert(0, page)
+            top_row += len(rows)
+            if len(self._loaded) > self.window_pages:
+                self._drop(self._loaded.pop())
+        else:
+            return
+
+        # Keep the rows the user was looking at in place after the window shifts
+        new_total = len(tree.get_children())
+        if new_total and total:
+            tree.yview_moveto(max(0.0, top_row) / new_total)
+        self._update_status()
+
+    def _insert(self, index, values):
+        iid = self.tree.insert('', index, values=values)
+        self._ids[iid] = values[0]
+        return iid
+
+    def _delete(self, items):
+        if items:
+            self.tree.delete(*items)
+        for iid in items:
+            self._ids.pop(iid, None)
+
+    def _drop(self, page):
+        items = self._items.pop(page, [])
+        self._delete(items)
+        return len(items)
+
+    # Auto-refresh: poll for rows changed since the last poll and patch only
+    # those, keeping the selection and the rows the user is looking at
+
+    def set_auto_refresh(self, enabled):
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+            self._refresh_job = None
+        self.auto_refresh = bool(enabled and self.fetch_changes and self.refresh_ms)
+        if self.auto_refresh and self._refresh_task is None:
+            self._refresh()
+
+    def _schedule_refresh(self):
+        if self.auto_refresh and self._refresh_job is None and self.winfo_exists():
+            self._refresh_job = self.after(self.refresh_ms, self._refresh)
+
+    def _window_bounds(self):
+        # Keys the loaded pages lie between: after the first, up to the last
+        if not self._loaded:
+            return None, None
+        first, last = self._loaded[0], self._loaded[-1]
+        until = None if last == self._last_page else self._page_starts[last + 1]
+        return self._page_starts[first], until
+
+    def _refresh(self):
+        # The first poll only takes the watermark
+        self._refresh_job = None
+        after, until = self._window_bounds()
+        self._refresh_task = self.run_in_background(
+            "Refreshing rows", self.fetch_changes, self._watermark, after, until,
+            on_success=self._changed, on_error=self._refresh_failed, cancellable=False, quiet=True
+        )
+
+    def _refresh_failed(self, err):
+        self._refresh_task = None
+        logger.warning(f"Refreshing rows failed: {err}")
+        self._schedule_refresh()
+
+    def _changed(self, result):
+        self._refresh_task = None
+        if not self.winfo_exists():
+            return
+        self._watermark, changed, rows = result
+        if changed is None:
+            # Too much changed to patch; start again from the first page
+            self._reset()
+        elif changed and self._loaded:
+            self._patch(set(changed), rows)
+        self._schedule_refresh()
+
+    def _patch(self, changed, rows):
+        shown = {self._ids[iid]: (page, iid) for page in self._loaded for iid in self._items[page]}
+        fresh = {values[0]: values for values, _ in rows}
+        if any(row_id not in shown for row_id in fresh):
+            # New rows somewhere on screen; let the database put them in order
+            self._reload_window(len(changed))
+            return
+        anchor = self._keep_position()
+        for row_id in changed & shown.keys():
+            page, iid = shown[row_id]
+            if row_id in fresh:
+                self.tree.item(iid, values=fresh[row_id])
+            else:
+                # Changed so that it no longer belongs in the view (a filter)
+                self._items[page].remove(iid)
+                self._delete([iid])
+        # Cached pages may hold any of the changed rows
+        self.pages.clear()
+        anchor()
+        self._update_status()
+
+    def _reload_window(self, new_rows):
+        # Fetch the loaded pages again between their own keys; each can only
+        # have grown by the rows that changed
+        requests = []
+        for page in self._loaded:
+            last = page == self._last_page
+            until = None if last else self._page_starts[page + 1]
+            limit = len(self._items[page]) + new_rows + (1 if last else 0)
+            requests.append((page, self._page_starts[page], limit, until))
+
+        def load():
+            return [(page, limit, self.fetch_page(after, limit, until)) for page, after, limit, until in requests]
+
+        self._refresh_task = self.run_in_background(
+            "Refreshing rows", load, on_success=self._reloaded, on_error=self._refresh_failed, cancellable=False,
+            quiet=True
+        )
+
+    def _reloaded(self, pages):
+        self._refresh_task = None
+        if not self.winfo_exists():
+            return
+        anchor = self._keep_position()
+        for page, limit, rows in pages:
+            if page not in self._items:
+                continue
+            if page == self._last_page and len(rows) == limit and len(self._page_starts) == page + 1:
+                # The last page grew past what was asked for: the rest is a new page
+                rows = rows[:-1]
+                self._page_starts.append(rows[-1][1])
+                self._last_page = None
+            self._replace_page(page, rows)
+        self.pages.clear()
+        anchor()
+        self._update_status()
+        self._schedule_refresh()
+
+    def _replace_page(self, page, rows):
+        # Reuse the items of rows that are still there, so selection survives
+        tree = self.tree
+        offset = sum(len(self._items[earlier]) for earlier in self._loaded if earlier < page)
+        existing = {self._ids[iid]: iid for iid in self._items[page]}
+        items = []
+        for index, (values, _) in enumerate(rows, offset):
+            iid = existing.pop(values[0], None)
+            if iid is None:
+                iid = self._insert(index, values)
+            else:
+                tree.item(iid, values=values)
+                if tree.index(iid) != index:
+                    tree.move(iid, '', index)
+            items.append(iid)
+        self._delete(list(existing.values()))
+        self._items[page] = items
+
+    def _keep_position(self):
+        # -> a function that scrolls back to the row at the top now, if it survived
+        tree = self.tree
+        children = tree.get_children()
+        if not children:
+            return lambda: None
+        top = children[min(len(children) - 1, int(float(tree.yview()[0]) * len(children) + 0.5))]
+
+        def restore():
+            remaining = tree.get_children()
+            if tree.exists(top) and remaining:
+                tree.yview_moveto(tree.index(top) / len(remaining))
+        return restore
+
+    def _reset(self):
+        for task in self._pending.values():
+            task.cancel()
+        self._pending.clear()
+        for page in list(self._loaded):
+            self._drop(page)
+        self._loaded = []
+        self._page_starts = [None]
+        self._last_page = None
+        self.pages.clear()
+        self._request(0)
+
+    def _update_status(self):
+        if not self._loaded or not self.tree.get_children():
+            self.status.config(text="No rows")
+            return
+        start = self._loaded[0] * self.page_size + 1
+        end = start + len(self.tree.get_children()) - 1
+        more = "" if self._last_page is not None and self._loaded[-1] == self._last_page else "+"
+        self.status.config(text=f"Rows {start}-{end}{more}")
+
+    def destroy(self):
+        for task in self._pending.values():
+            task.cancel()
+        self._pending.clear()
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+            self._refresh_job = None
+        self.auto_refresh = False
+        super().destroy()
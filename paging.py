@@ -0,0 +1,85 @@
+class KeysetQuery:
+    # Pages through `SELECT <columns> FROM <source>` in key order without OFFSET,
+    # so fetching page N costs the same as fetching page 1
+    def __init__(self, columns, source, key_columns, descending=False, where=None, format_row=None,
+                 where_params=()):
+        self.columns = columns
+        self.source = source
+        self.key_columns = tuple(key_columns)
+        self.descending = descending
+        self.where = where
+        self.where_params = list(where_params)
+        # Display formatting happens in Python so the SQL stays portable
+        self.format_row = format_row
+
+    def variant(self, sort_column=None, descending=None, conditions=(), params=()):
+        # The same rows ordered by another column, ties broken by the last key
+        # column (the primary key), and/or narrowed by extra WHERE conditions.
+        # Callers must only pass trusted column names and conditions.
+        key_columns = self.key_columns
+        if sort_column is not None:
+            primary_key = self.key_columns[-1]
+            key_columns = (primary_key,) if sort_column == primary_key else (sort_column, primary_key)
+        where = " AND ".join(([f"({self.where})"] if self.where else []) + [f"({c})" for c in conditions])
+        return KeysetQuery(
+            self.columns, self.source, key_columns, self.descending if descending is None else descending,
+            where or None, self.format_row, self.where_params + list(params)
+        )
+
+    def _key_condition(self, key, op, row_values, inclusive=False):
+        if row_values:
+            # SQLite seeks straight to (k1, k2) < (a, b) on a composite index.
+            # The redundant k1 <= a in front lets it seek on a collated
+            # expression too (name COLLATE NOCASE), which the row value alone doesn't.
+            placeholders = ", ".join(["%s"] * len(self.key_columns))
+            row_op = op + '=' if inclusive else op
+            condition = f"(({', '.join(self.key_columns)}) {row_op} ({placeholders}))"
+            if len(self.key_columns) > 1:
+                return f"({self.key_columns[0]} {op}= %s AND {condition})", [key[0], *key]
+            return condition, list(key)
+
+        # (k1 < a) OR (k1 = a AND k2 < b) ... spelled out instead of a row
+        # constructor so MySQL turns it into an index range scan
+        clauses = []
+        params = []
+        for i, column in enumerate(self.key_columns):
+            parts = [f"{prev} = %s" for prev in self.key_columns[:i]]
+            last = inclusive and i == len(self.key_columns) - 1
+            parts.append(f"{column} {op}{'=' if last else ''} %s")
+            clauses.append("(" + " AND ".join(parts) + ")")
+            params.extend(key[:i + 1])
+        return "(" + " OR ".join(clauses) + ")", params
+
+    def page_sql(self, after=None, limit=200, row_values=False, until=None):
+        # Rows after the key `after` and, with `until`, up to and including
+        # that key, in key order
+        conditions = []
+        params = []
+        if self.where:
+            conditions.append(f"({self.where})")
+            params.extend(self.where_params)
+        if after is not None:
+            condition, after_params = self._key_condition(after, '<' if self.descending else '>', row_values)
+            conditions.append(condition)
+            params.extend(after_params)
+        if until is not None:
+            condition, until_params = self._key_condition(
+                until, '>' if self.descending else '<', row_values, inclusive=True
+            )
+            conditions.append(condition)
+            params.extend(until_params)
+
+        direction = 'DESC' if self.descending else 'ASC'
+        query = f"SELECT {self.columns}, {', '.join(self.key_columns)} FROM {self.source}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY " + ", ".join(f"{column} {direction}" for column in self.key_columns)
+        query += " LIMIT %s"
+        params.append(limit)
+        return query, params
+
+    def split_rows(self, rows):
+        # Each fetched row ends with its key columns; hand back (values, key) pairs
+        width = len(self.key_columns)
+        format_row = self.format_row or tuple
+        return [(format_row(row[:-width]), tuple(row[-width:])) for row in rows]
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+# Statements over the threshold go here; point it at a file with log_slow_queries_to()
+slow_logger = logging.getLogger('slow_queries')
+
+# Latency histogram buckets in seconds (Prometheus `le` bounds)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Frames in these files are plumbing; the call site is the first frame outside them
+_PLUMBING_FILES = {
+    os.path.normcase(os.path.abspath(__file__)),
+    os.path.normcase(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backends.py')),
+    os.path.normcase(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'connection_pool.py')),
+}
+# ... and these generic helpers are skipped so the caller that meant the query shows up
+_PLUMBING_FUNCTIONS = {'fetch_all', 'fetch_one', '_search'}
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(query):
+    # Same statement shape -> same operation, whatever the literals or list lengths
+    sql = re.sub(r"\s+", " ", query).strip()
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"(?<![\w.])\d+(?:\.\d+)?\b", "?", sql)
+    sql = sql.replace('%s', '?')
+    sql = re.sub(r"\?(?:\s*,\s*\?)+", "?, ...", sql)
+    sql = re.sub(r"(?:WHEN \? THEN \?\s*)+", "WHEN ? THEN ? ... ", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"(?:\(\?, \.\.\.\)\s*,\s*)+\(\?, \.\.\.\)", "(?, ...), ...", sql)
+    return sql
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    # Short, low-cardinality name such as "select rentals" or "update games"
+    match = re.match(r"(SELECT|INSERT INTO|UPDATE|DELETE FROM|CREATE \w+|\w+)\b", sql, re.IGNORECASE)
+    verb = match.group(1).split()[0].lower() if match else 'other'
+    if verb == 'select':
+        table = re.search(r"\bFROM\s+(\w+)", sql, re.IGNORECASE)
+    elif verb in ('insert', 'update', 'delete'):
+        table = re.search(r"^(?:INSERT INTO|UPDATE|DELETE FROM)\s+(\w+)", sql, re.IGNORECASE)
+    else:
+        table = None
+    return f"{verb} {table.group(1)}" if table else verb
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+@lru_cache(maxsize=4096)
+def _is_plumbing(code):
+    return (os.path.normcase(code.co_filename) in _PLUMBING_FILES
+            or code.co_name in _PLUMBING_FUNCTIONS
+            or code.co_filename.endswith('contextlib.py'))
+
+
+@lru_cache(maxsize=4096)
+def _code_name(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _call_site():
+    frame = sys._getframe(2)
+    while frame is not None:
+        if not _is_plumbing(frame.f_code):
+            return f"{_code_name(frame.f_code)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+class PendingQuery:
+    # A statement being timed: execute plus every fetch until the cursor moves on
+    __slots__ = ('sql', 'site', 'elapsed', 'rows', 'failed')
+
+    def __init__(self, sql, site):
+        self.sql = sql
+        self.site = site
+        self.elapsed = 0.0
+        self.rows = 0
+        self.failed = False
+
+
+class OperationStats:
+    def __init__(self, sql, sample_size):
+        self.sql = sql
+        self.statement = statement_label(sql)
+        self.query_id = hashlib.sha1(sql.encode()).hexdigest()[:8]
+        self.calls = 0
+        self.errors = 0
+        self.slow = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        # Recent latencies for percentiles; the buckets cover all time
+        self.samples = deque(maxlen=sample_size)
+        self.sites = Counter()
+
+    def add(self, elapsed, rows, site, failed):
+        self.calls += 1
+        self.errors += failed
+        self.rows += rows
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        for i, bound in enumerate(BUCKETS):
+            if elapsed <= bound:
+                self.buckets[i] += 1
+                break
+        self.samples.append(elapsed)
+        self.sites[site] += 1
+
+    def snapshot(self):
+        ordered = sorted(self.samples)
+        ms = lambda value: None if value is None else round(value * 1000, 3)
+        return {
+            'query_id': self.query_id,
+            'statement': self.statement,
+            'sql': self.sql,
+            'calls': self.calls,
+            'errors': self.errors,
+            'slow': self.slow,
+            'rows': self.rows,
+            'total_ms': ms(self.total),
+            'mean_ms': ms(self.total / self.calls) if self.calls else None,
+            'p50_ms': ms(_percentile(ordered, 0.50)),
+            'p95_ms': ms(_percentile(ordered, 0.95)),
+            'p99_ms': ms(_percentile(ordered, 0.99)),
+            'max_ms': ms(self.max),
+            'call_sites': self.sites.most_common(5),
+        }
+
+
+class QueryStats:
+    # Latency, row counts and call sites for every statement, grouped by
+    # statement shape. Backends feed it through CursorProxy when installed as
+    # backend.query_stats.
+    def __init__(self, slow_threshold_ms=200, sample_size=1000, slow_history=200):
+        self.slow_threshold = slow_threshold_ms / 1000
+        self.sample_size = sample_size
+        self._operations = {}
+        self._slow = deque(maxlen=slow_history)
+        self._lock = threading.Lock()
+        self.started_at = datetime.now()
+
+    def begin(self, query):
+        return PendingQuery(fingerprint(query), _call_site())
+
+    def finish(self, pending):
+        with self._lock:
+            operation = self._operations.get(pending.sql)
+            if operation is None:
+                operation = self._operations[pending.sql] = OperationStats(pending.sql, self.sample_size)
+            operation.add(pending.elapsed, pending.rows, pending.site, pending.failed)
+            slow = pending.elapsed >= self.slow_threshold
+            if slow:
+                operation.slow += 1
+                self._slow.append({
+                    'at': datetime.now().isoformat(timespec='seconds'),
+                    'ms': round(pending.elapsed * 1000, 3),
+                    'rows': pending.rows,
+                    'site': pending.site,
+                    'statement': operation.statement,
+                    'sql': pending.sql,
+                })
+        if slow:
+            slow_logger.warning(
+                f"{pending.elapsed * 1000:.1f} ms, {pending.rows} rows, {pending.site}: {pending.sql}"
+            )
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+            self._slow.clear()
+            self.started_at = datetime.now()
+
+    def snapshot(self):
+        with self._lock:
+            operations = [operation.snapshot() for operation in self._operations.values()]
+            slow = list(self._slow)
+        operations.sort(key=lambda operation: operation['total_ms'], reverse=True)
+        return {
+            'since': self.started_at.isoformat(timespec='seconds'),
+            'slow_threshold_ms': round(self.slow_threshold * 1000, 3),
+            'operations': operations,
+            'slow_queries': slow,
+        }
+
+    def to_json(self, **extra):
+        return json.dumps(dict(self.snapshot(), **extra), indent=2, default=str)
+
+    def prometheus(self):
+        # Prometheus text exposition format
+        def labels(operation, **more):
+            pairs = {'query_id': operation.query_id, 'statement': operation.statement, **more}
+            return ",".join(f'{key}="{_escape(value)}"' for key, value in pairs.items())
+
+        with self._lock:
+            operations = list(self._operations.values())
+            lines = [
+                "# HELP gamerental_query_duration_seconds Statement latency including fetches.",
+                "# TYPE gamerental_query_duration_seconds histogram",
+            ]
+            for operation in operations:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, operation.buckets):
+                    cumulative += count
+                    lines.append(
+                        f"gamerental_query_duration_seconds_bucket{{{labels(operation, le=bound)}}} {cumulative}"
+                    )
+                lines.append(
+                    f"gamerental_query_duration_seconds_bucket{{{labels(operation, le='+Inf')}}} {operation.calls}"
+                )
+                lines.append(f"gamerental_query_duration_seconds_sum{{{labels(operation)}}} {operation.total:.6f}")
+                lines.append(f"gamerental_query_duration_seconds_count{{{labels(operation)}}} {operation.calls}")
+            for name, attribute, help_text in (
+                ('gamerental_query_rows_total', 'rows', "Rows returned or affected."),
+                ('gamerental_query_errors_total', 'errors', "Statements that raised an error."),
+                ('gamerental_slow_queries_total', 'slow', "Statements over the slow-query threshold."),
+            ):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for operation in operations:
+                    lines.append(f"{name}{{{labels(operation)}}} {getattr(operation, attribute)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def log_slow_queries_to(path):
+    # Idempotent, so several systems in one process don't duplicate lines
+    path = os.path.abspath(path)
+    for handler in slow_logger.handlers:
+        if isinstance(handler, logging.FileHandler) and handler.baseFilename == path:
+            return
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_logger.addHandler(handler)
+    logger.info(f"Logging slow queries to {path}")
@@ -0,0 +1,84 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceCache:
+    # In-process copy of the staff list behind the Rentals tab's staff combo
+    # (customers and games are searched on demand instead). Staff added
+    # through GameRentalSystem patch it directly; refresh() picks up staff
+    # added by other counters with one aggregate query instead of a full reload.
+    def __init__(self, system):
+        self.system = system
+        self._lock = threading.RLock()
+        self._staff = None
+        # (row count, max id) as of the last load
+        self._fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.incremental_updates = 0
+
+    def _load_staff(self):
+        rows = self.system.fetch_all("SELECT id, name FROM staff")
+        # Fingerprint what we actually loaded, so a row inserted meanwhile still
+        # shows up as a change on the next refresh
+        self._fingerprint = (len(rows), max((id for id, _ in rows), default=0))
+        return {id: name for id, name in rows}
+
+    def staff(self):
+        with self._lock:
+            if self._staff is None:
+                self.misses += 1
+                self._staff = self._load_staff()
+            else:
+                self.hits += 1
+            return sorted(self._staff.items())
+
+    # Incremental updates from successful writes in this process
+
+    def staff_added(self, staff_id, name):
+        with self._lock:
+            if self._staff is not None:
+                self._staff[staff_id] = name
+                self.incremental_updates += 1
+                if self._fingerprint is not None:
+                    self._fingerprint = (self._fingerprint[0] + 1, max(self._fingerprint[1], staff_id))
+
+    # Picking up writes from other processes
+
+    def refresh(self):
+        # -> ['staff'] if the staff list changed, else []
+        with self._lock:
+            self.refreshes += 1
+            if self._staff is None:
+                return []
+            count, max_id = self.system.fetch_one("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM staff")
+            known = self._fingerprint
+            if known == (count, max_id):
+                return []
+            if known is not None and count - known[0] == max_id - known[1] and max_id > known[1]:
+                # Only appends since last time: fetch just the new rows
+                rows = self.system.fetch_all("SELECT id, name FROM staff WHERE id > %s", (known[1],))
+                self._staff.update({id: name for id, name in rows})
+                self._fingerprint = (count, max_id)
+            else:
+                self._staff = self._load_staff()
+        logger.debug("Reference cache refreshed: staff")
+        return ['staff']
+
+    def invalidate(self):
+        with self._lock:
+            self._staff = None
+            self._fingerprint = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'incremental_updates': self.incremental_updates,
+                'staff': len(self._staff) if self._staff is not None else None,
+            }
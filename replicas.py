@@ -0,0 +1,211 @@
+import contextvars
+import logging
+import threading
+import time
+import zlib
+from contextlib import ExitStack, contextmanager
+
+from backends import Error
+from connection_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Who the current thread is working for: a service client's session id, or
+# None for the process as a whole (the GUI, CLI tools)
+_session = contextvars.ContextVar('session', default=None)
+
+
+class Replica:
+    # A read-only copy of the database and what we last learned about it
+    def __init__(self, backend, pool_size):
+        self.backend = backend
+        self.pool = ConnectionPool(backend, pool_size=pool_size)
+        self.down_until = 0
+        self.lag = None
+        self.lag_checked = 0
+        self.reads = 0
+        self.failures = 0
+
+
+class ReadRouter:
+    # Read-only queries go to the replicas, everything else to the primary.
+    # A session that has just committed reads from the primary for
+    # read_your_writes seconds, so it always sees its own changes. Replicas
+    # that can't be reached are skipped for retry_after seconds, and ones
+    # further behind than read_your_writes until they catch up; with none
+    # left, reads go to the primary.
+    def __init__(self, primary, replicas=(), pool_size=5, read_your_writes=5.0, retry_after=30,
+                 lag_check_interval=5):
+        self.primary = primary
+        self.replicas = [Replica(backend, pool_size) for backend in replicas]
+        self.read_your_writes = read_your_writes
+        self.retry_after = retry_after
+        self.lag_check_interval = lag_check_interval
+        self._lock = threading.Lock()
+        # session -> monotonic time of its last commit
+        self._last_write = {}
+        self.primary_reads = 0
+        self.pinned_reads = 0
+        self.fallbacks = 0
+        primary.on_commit = self.wrote
+        for replica in self.replicas:
+            try:
+                replica.pool.warm_up()
+            except Error as err:
+                self._mark_down(replica, err)
+
+    @contextmanager
+    def session(self, key):
+        token = _session.set(key)
+        try:
+            yield
+        finally:
+            _session.reset(token)
+
+    def wrote(self):
+        now = time.monotonic()
+        with self._lock:
+            self._last_write[_session.get()] = now
+            if len(self._last_write) > 1000:
+                self._last_write = {
+                    key: at for key, at in self._last_write.items() if now - at < self.read_your_writes
+                }
+
+    def _pinned(self):
+        with self._lock:
+            at = self._last_write.get(_session.get())
+        return at is not None and time.monotonic() - at < self.read_your_writes
+
+    def _mark_down(self, replica, err):
+        with self._lock:
+            replica.down_until = time.monotonic() + self.retry_after
+            replica.failures += 1
+        logger.warning(f"Replica {replica.backend.describe()} unavailable, reading from the primary: {err}")
+
+    def _check_lag(self, replica):
+        with self._lock:
+            now = time.monotonic()
+            if now - replica.lag_checked < self.lag_check_interval:
+                return
+            # One thread checks; the others go on with the last known lag
+            replica.lag_checked = now
+        with replica.pool.cursor() as cursor:
+            lag = replica.backend.replica_lag(cursor)
+        if lag is not None and lag > self.read_your_writes and (replica.lag or 0) <= self.read_your_writes:
+            logger.warning(f"Replica {replica.backend.describe()} is {lag:.0f}s behind, reading from the primary")
+        replica.lag = lag
+
+    def _usable(self):
+        # Healthy replicas, starting from one picked by session so each
+        # client keeps reading from the same copy (monotonic reads, stable paging)
+        if not self.replicas:
+            return []
+        start = zlib.crc32(str(_session.get()).encode()) % len(self.replicas)
+        usable = []
+        for replica in self.replicas[start:] + self.replicas[:start]:
+            if replica.down_until > time.monotonic():
+                continue
+            try:
+                self._check_lag(replica)
+            except Error as err:
+                self._mark_down(replica, err)
+                continue
+            if replica.lag is None or replica.lag <= self.read_your_writes:
+                usable.append(replica)
+        return usable
+
+    def _route(self, primary):
+        # -> replicas to try in order, or None when the read belongs on the primary
+        if primary or not self.replicas:
+            with self._lock:
+                self.primary_reads += 1
+            return None
+        if self._pinned():
+            with self._lock:
+                self.primary_reads += 1
+                self.pinned_reads += 1
+            return None
+        return self._usable()
+
+    def _fell_back(self):
+        with self._lock:
+            self.primary_reads += 1
+            self.fallbacks += 1
+
+    def read(self, work, *args, primary=False):
+        # work(cursor, *args), run once on the first replica that answers
+        replicas = self._route(primary)
+        for replica in replicas or []:
+            try:
+                with replica.pool.cursor() as cursor:
+                    result = work(cursor, *args)
+            except Error as err:
+                self._mark_down(replica, err)
+                continue
+            with self._lock:
+                replica.reads += 1
+            return result
+        if replicas is not None:
+            self._fell_back()
+        with self.primary.cursor() as cursor:
+            return work(cursor, *args)
+
+    def fetch_all(self, query, params=None, primary=False):
+        return self.read(_fetch_all, query, params, primary=primary)
+
+    def fetch_one(self, query, params=None, primary=False):
+        return self.read(_fetch_one, query, params, primary=primary)
+
+    @contextmanager
+    def streaming_cursor(self):
+        # Exports are long scans, the best thing to keep off the primary.
+        # Only failing to connect moves on; a failure mid-export is raised.
+        replicas = self._route(False)
+        for replica in replicas or []:
+            with ExitStack() as stack:
+                try:
+                    cursor = stack.enter_context(replica.pool.streaming_cursor())
+                except Error as err:
+                    self._mark_down(replica, err)
+                    continue
+                with self._lock:
+                    replica.reads += 1
+                yield cursor
+                return
+        if replicas is not None:
+            self._fell_back()
+        with self.primary.streaming_cursor() as cursor:
+            yield cursor
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'primary_reads': self.primary_reads,
+                'pinned_reads': self.pinned_reads,
+                'fallbacks': self.fallbacks,
+                'replicas': [{
+                    'backend': replica.backend.describe(),
+                    'up': replica.down_until <= now,
+                    'lag_s': replica.lag,
+                    'reads': replica.reads,
+                    'failures': replica.failures,
+                } for replica in self.replicas],
+            }
+
+    def close(self):
+        for replica in self.replicas:
+            replica.pool.close()
+
+
+def _fetch_all(cursor, query, params):
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+def _fetch_one(cursor, query, params):
+    cursor.execute(query, params)
+    row = cursor.fetchone()
+    # Drain anything left so the connection goes back to the pool clean
+    cursor.fetchall()
+    return row
@@ -0,0 +1,246 @@
+import argparse
+import logging
+from collections import defaultdict
+
+from backends import Error, default_backend, from_url
+
+logger = logging.getLogger(__name__)
+
+# Summary tables (migration 4). Checkouts and returns add to them in their own
+# transaction, so dashboards read a few hundred rows instead of aggregating
+# the whole rentals history. Rentals count on the day they go out; revenue and
+# late fees count on the day they are paid, i.e. when the game comes back.
+REPORT_TABLES = ('report_daily', 'report_games', 'report_staff', 'report_genres')
+
+
+class ReportDelta:
+    # Changes from one transaction, merged so each summary row is written once
+    def __init__(self):
+        self.daily = defaultdict(lambda: [0, 0, 0, 0])  # day -> [rentals, returns, revenue, late_fees]
+        self.games = defaultdict(lambda: [0, 0])  # game_id -> [rentals, revenue]
+        self.staff = defaultdict(lambda: [0, 0])  # staff_id -> [rentals, revenue]
+        # customer_id -> [rentals, open rentals, spent, late_fees, last visit]
+        self.customers = defaultdict(lambda: [0, 0, 0, 0, None])
+
+    def rented(self, day, game_id, staff_id, count=1, customer_id=None):
+        self.daily[day][0] += count
+        self.games[game_id][0] += count
+        self.staff[staff_id][0] += count
+        if customer_id is not None:
+            customer = self.customers[customer_id]
+            customer[0] += count
+            customer[1] += count
+            customer[4] = max(customer[4] or day, day)
+
+    def returned(self, day, game_id, staff_id, revenue, late_fee, customer_id=None):
+        daily = self.daily[day]
+        daily[1] += 1
+        daily[2] += revenue
+        daily[3] += late_fee
+        self.games[game_id][1] += revenue
+        self.staff[staff_id][1] += revenue
+        if customer_id is not None:
+            customer = self.customers[customer_id]
+            customer[1] -= 1
+            customer[2] += revenue
+            customer[3] += late_fee
+            customer[4] = max(customer[4] or day, day)
+
+    def apply(self, cursor, backend):
+        # Always in the same table order, so concurrent checkouts and returns
+        # lock summary rows in the same order
+        if self.daily:
+            cursor.executemany(
+                "INSERT INTO report_daily (day, rentals, returns, revenue, late_fees) VALUES (%s, %s, %s, %s, %s)"
+                + backend.increment_on_conflict(['day'], ['rentals', 'returns', 'revenue', 'late_fees']),
+                [(day, *values) for day, values in sorted(self.daily.items())]
+            )
+        games = sorted((game_id, values) for game_id, values in self.games.items() if game_id is not None)
+        if games:
+            cursor.executemany(
+                "INSERT INTO report_games (game_id, rentals, revenue) VALUES (%s, %s, %s)"
+                + backend.increment_on_conflict(['game_id'], ['rentals', 'revenue']),
+                [(game_id, *values) for game_id, values in games]
+            )
+        staff = sorted((staff_id, values) for staff_id, values in self.staff.items() if staff_id is not None)
+        if staff:
+            cursor.executemany(
+                "INSERT INTO report_staff (staff_id, rentals, revenue) VALUES (%s, %s, %s)"
+                + backend.increment_on_conflict(['staff_id'], ['rentals', 'revenue']),
+                [(staff_id, *values) for staff_id, values in staff]
+            )
+        if games:
+            # Genre comes from the game row, read in the same statement
+            cursor.executemany(
+                "INSERT INTO report_genres (genre, rentals, revenue) "
+                "SELECT COALESCE(genre, ''), %s, %s FROM games WHERE id = %s"
+                + backend.increment_on_conflict(['genre'], ['rentals', 'revenue']),
+                [(rentals, revenue, game_id) for game_id, (rentals, revenue) in games]
+            )
+        if self.customers:
+            cursor.executemany(
+                "INSERT INTO report_customers (customer_id, rentals, open_rentals, spent, late_fees, last_visit) "
+                "VALUES (%s, %s, %s, %s, %s, %s)"
+                + backend.increment_on_conflict(
+                    ['customer_id'], ['rentals', 'open_rentals', 'spent', 'late_fees'], latest=['last_visit']
+                ),
+                [(customer_id, *values) for customer_id, values in sorted(self.customers.items())]
+            )
+
+
+def rented_statements(backend, day, game_id, staff_id, condition, customer_id=None):
+    # One rental as (sql, params) pairs that only count it while `condition`
+    # holds, so they can go out in the same batch as the checkout itself
+    where = f" FROM games WHERE id = %s AND {condition}"
+    customer = []
+    if customer_id is not None:
+        customer.append((
+            "INSERT INTO report_customers (customer_id, rentals, open_rentals, spent, late_fees, last_visit) "
+            "SELECT %s, 1, 1, 0, 0, %s" + where
+            + backend.increment_on_conflict(
+                ['customer_id'], ['rentals', 'open_rentals', 'spent', 'late_fees'], latest=['last_visit']
+            ),
+            [customer_id, day, game_id]
+        ))
+    return [
+        ("INSERT INTO report_daily (day, rentals, returns, revenue, late_fees) SELECT %s, 1, 0, 0, 0" + where
+         + backend.increment_on_conflict(['day'], ['rentals', 'returns', 'revenue', 'late_fees']), [day, game_id]),
+        ("INSERT INTO report_games (game_id, rentals, revenue) SELECT id, 1, 0" + where
+         + backend.increment_on_conflict(['game_id'], ['rentals', 'revenue']), [game_id]),
+        ("INSERT INTO report_staff (staff_id, rentals, revenue) SELECT %s, 1, 0" + where
+         + backend.increment_on_conflict(['staff_id'], ['rentals', 'revenue']), [staff_id, game_id]),
+        ("INSERT INTO report_genres (genre, rentals, revenue) SELECT COALESCE(genre, ''), 1, 0" + where
+         + backend.increment_on_conflict(['genre'], ['rentals', 'revenue']), [game_id]),
+        *customer,
+    ]
+
+
+def rebuild(cursor, backend):
+    # Recompute every summary from rentals with set-based aggregates
+    for table in REPORT_TABLES:
+        cursor.execute(f"DELETE FROM {table}")
+
+    revenue = "SUM(CASE WHEN r.return_date IS NOT NULL THEN r.total_cost ELSE 0 END)"
+    cursor.execute(
+        "INSERT INTO report_daily (day, rentals, returns, revenue, late_fees) "
+        "SELECT rental_date, COUNT(*), 0, 0, 0 FROM rentals GROUP BY rental_date"
+    )
+    # WHERE is required here: SQLite can't parse an upsert straight after GROUP BY otherwise
+    cursor.execute(
+        "INSERT INTO report_daily (day, rentals, returns, revenue, late_fees) "
+        "SELECT return_date, 0, COUNT(*), SUM(total_cost), SUM(late_fee) FROM rentals "
+        "WHERE return_date IS NOT NULL GROUP BY return_date"
+        + backend.increment_on_conflict(['day'], ['rentals', 'returns', 'revenue', 'late_fees'])
+    )
+    cursor.execute(
+        "INSERT INTO report_games (game_id, rentals, revenue) "
+        f"SELECT r.game_id, COUNT(*), {revenue} FROM rentals r WHERE r.game_id IS NOT NULL GROUP BY r.game_id"
+    )
+    cursor.execute(
+        "INSERT INTO report_staff (staff_id, rentals, revenue) "
+        f"SELECT r.staff_id, COUNT(*), {revenue} FROM rentals r WHERE r.staff_id IS NOT NULL GROUP BY r.staff_id"
+    )
+    cursor.execute(
+        "INSERT INTO report_genres (genre, rentals, revenue) "
+        f"SELECT COALESCE(g.genre, ''), COUNT(*), {revenue} FROM rentals r JOIN games g ON g.id = r.game_id "
+        "GROUP BY COALESCE(g.genre, '')"
+    )
+
+
+def rebuild_customers(cursor, backend):
+    # report_customers (migration 8) is kept apart from rebuild, which
+    # migration 4 runs before the table exists
+    cursor.execute("DELETE FROM report_customers")
+    cursor.execute(
+        "INSERT INTO report_customers (customer_id, rentals, open_rentals, spent, late_fees, last_visit) "
+        "SELECT customer_id, COUNT(*), SUM(CASE WHEN return_date IS NULL THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN return_date IS NOT NULL THEN total_cost ELSE 0 END), "
+        "SUM(CASE WHEN return_date IS NOT NULL THEN late_fee ELSE 0 END), "
+        "MAX(COALESCE(return_date, rental_date)) FROM rentals WHERE customer_id IS NOT NULL GROUP BY customer_id"
+    )
+
+
+def rebuild_reports(system):
+    def work(cursor):
+        rebuild(cursor, system.backend)
+        rebuild_customers(cursor, system.backend)
+
+    try:
+        system.pool.run_transaction(work)
+        logger.info("Report tables rebuilt")
+        return True
+    except Error as err:
+        logger.error(f"Error rebuilding reports: {err}")
+        return False
+
+
+# Dashboard queries: summary tables only, plus primary-key lookups for names
+
+def daily_revenue(system, days=30):
+    return system.fetch_all(
+        "SELECT day, rentals, returns, revenue, late_fees FROM report_daily ORDER BY day DESC LIMIT %s", (days,)
+    )
+
+
+def genre_revenue(system):
+    return system.fetch_all("SELECT genre, rentals, revenue FROM report_genres ORDER BY revenue DESC")
+
+
+def staff_revenue(system):
+    return system.fetch_all(
+        "SELECT rs.staff_id, s.name, rs.rentals, rs.revenue FROM report_staff rs "
+        "LEFT JOIN staff s ON s.id = rs.staff_id ORDER BY rs.revenue DESC"
+    )
+
+
+def top_games(system, limit=10):
+    return system.fetch_all(
+        "SELECT rg.game_id, g.title, rg.rentals, rg.revenue FROM report_games rg "
+        "LEFT JOIN games g ON g.id = rg.game_id ORDER BY rg.rentals DESC LIMIT %s", (limit,)
+    )
+
+
+def dashboard(system, days=30, limit=10):
+    return {
+        'daily': daily_revenue(system, days),
+        'genres': genre_revenue(system),
+        'staff': staff_revenue(system),
+        'top_games': top_games(system, limit),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the management reports, optionally rebuilding them first")
+    parser.add_argument('--rebuild', action='store_true', help="Recompute the summary tables from all rentals")
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--db', help="Database URL, e.g. sqlite:///rentals.db (default: GAMERENTAL_DB or MySQL)")
+    args = parser.parse_args()
+
+    from videogamerental import DB_CONFIG, GameRentalSystem, configure_logging, format_date, format_money
+
+    configure_logging()
+
+    system = GameRentalSystem(None, backend=from_url(args.db) if args.db else default_backend(DB_CONFIG))
+    try:
+        if args.rebuild and not rebuild_reports(system):
+            raise SystemExit("Rebuild failed, see the log for details")
+        data = dashboard(system, args.days)
+    finally:
+        system.close()
+
+    print("Day         Rentals  Returns  Revenue      Late fees")
+    for day, rentals, returns, revenue, late_fees in data['daily']:
+        print(f"{format_date(day):<12}{rentals:>7}  {returns:>7}  {format_money(revenue):<12} {format_money(late_fees)}")
+    print("\nGenre                Rentals  Revenue")
+    for genre, rentals, revenue in data['genres']:
+        print(f"{genre or '(none)':<20} {rentals:>7}  {format_money(revenue)}")
+    print("\nStaff                Rentals  Revenue")
+    for staff_id, name, rentals, revenue in data['staff']:
+        print(f"{name or staff_id:<20} {rentals:>7}  {format_money(revenue)}")
+    print("\nTop games            Rentals  Revenue")
+    for game_id, title, rentals, revenue in data['top_games']:
+        print(f"{title or game_id:<20} {rentals:>7}  {format_money(revenue)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+from datetime import timedelta
+
+# Reservations (migration 9) hold one copy of a game for a customer from
+# start_date to end_date, both inclusive. Open rentals hold their copy from
+# the rental date to the due date, and an overdue one until it comes back.
+# Availability is a question about copies: a copy is free over a range of
+# days when neither overlaps it.
+ACTIVE = 'active'
+FULFILLED = 'fulfilled'
+CANCELLED = 'cancelled'
+
+# The longest reservation, in days. The bound is what makes the start_date
+# indexes work as an interval index: anything overlapping [first, last] must
+# have started in [first - MAX_DAYS, last], one range scan, however many past
+# reservations there are.
+MAX_DAYS = 14
+
+
+def check_range(first_day, last_day, today):
+    if last_day < first_day:
+        raise ValueError("A reservation can't end before it starts")
+    if first_day < today:
+        raise ValueError("Reservations start today or later")
+    if (last_day - first_day).days + 1 > MAX_DAYS:
+        raise ValueError(f"Reservations are at most {MAX_DAYS} days")
+
+
+def overlapping(first_day, last_day, alias='reservations'):
+    # Condition on active reservations overlapping [first_day, last_day]
+    return (
+        f"{alias}.status = %s AND {alias}.start_date >= %s AND {alias}.start_date <= %s "
+        f"AND {alias}.end_date >= %s",
+        [ACTIVE, first_day - timedelta(days=MAX_DAYS), last_day, first_day]
+    )
+
+
+def _out_on_rental(first_day, today, alias='rentals'):
+    # Condition on open rentals still holding their copy on or after
+    # first_day: all of them from today; later on, those not due back by
+    # then and those already overdue
+    condition = f"{alias}.return_date IS NULL AND {alias}.copy_id IS NOT NULL"
+    if first_day <= today:
+        return condition, []
+    return f"{condition} AND ({alias}.due_date >= %s OR {alias}.due_date < %s)", [first_day, today]
+
+
+def unreserved(customer_id, first_day, last_day):
+    # Condition on game_copies rows: no one else has the copy reserved at any
+    # point from first_day to last_day (a checkout's rental to due date); with
+    # no customer, no one at all
+    overlap, params = overlapping(first_day, last_day, 'r')
+    if customer_id is None:
+        return f"NOT EXISTS (SELECT 1 FROM reservations r WHERE r.copy_id = game_copies.id AND {overlap})", params
+    return (
+        f"NOT EXISTS (SELECT 1 FROM reservations r WHERE r.copy_id = game_copies.id AND r.customer_id <> %s "
+        f"AND {overlap})",
+        [customer_id] + params
+    )
+
+
+def free_copies(cursor, game_id, first_day, last_day, today):
+    # Copies of one game that are free for the whole range, lowest id first;
+    # two index probes per copy of the game
+    overlap, overlap_params = overlapping(first_day, last_day, 'r')
+    out, out_params = _out_on_rental(first_day, today, 'o')
+    cursor.execute(
+        f"SELECT c.id FROM game_copies c WHERE c.game_id = %s "
+        f"AND NOT EXISTS (SELECT 1 FROM reservations r WHERE r.copy_id = c.id AND {overlap}) "
+        f"AND NOT EXISTS (SELECT 1 FROM rentals o WHERE o.copy_id = c.id AND {out}) ORDER BY c.id",
+        [game_id] + overlap_params + out_params
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def copy_is_free(cursor, backend, copy_id, first_day, last_day, today):
+    # The same check for one copy whose row the caller has locked. The reads
+    # lock too, so they see what concurrent checkouts and reservations have
+    # committed since this transaction started.
+    overlap, params = overlapping(first_day, last_day)
+    cursor.execute(
+        f"SELECT id FROM reservations WHERE copy_id = %s AND {overlap} LIMIT 1{backend.for_update}",
+        [copy_id] + params
+    )
+    if cursor.fetchall():
+        return False
+    out, params = _out_on_rental(first_day, today)
+    cursor.execute(f"SELECT id FROM rentals WHERE copy_id = %s AND {out} LIMIT 1{backend.for_update}",
+                   [copy_id] + params)
+    return not cursor.fetchall()
+
+
+def available_games(backend, first_day, last_day, today, limit=None):
+    # -> (sql, params) for [(game_id, title, free copies)] across the
+    # catalogue, by title. Taken copies come from one range scan of the
+    # reservation dates and one of the open rentals; history never enters.
+    overlap, overlap_params = overlapping(first_day, last_day)
+    out, out_params = _out_on_rental(first_day, today)
+    sql = (
+        "SELECT g.id, g.title, COUNT(*) FROM game_copies c JOIN games g ON g.id = c.game_id "
+        f"WHERE c.id NOT IN (SELECT copy_id FROM reservations WHERE {overlap} "
+        f"UNION SELECT copy_id FROM rentals WHERE {out}) "
+        f"GROUP BY g.id, g.title ORDER BY {backend.text_order('g.title')}, g.id"
+    )
+    params = overlap_params + out_params
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+def bookings(game_id, first_day, last_day, today):
+    # -> (sql, params) for what holds the game's copies during the range:
+    # [(kind, id, copy_id, customer_id, from, to)], reservations and open
+    # rentals alike, in date order; an overdue rental's "to" is its due date
+    overlap, overlap_params = overlapping(first_day, last_day, 'r')
+    out, out_params = _out_on_rental(first_day, today, 'o')
+    sql = (
+        "SELECT 'reservation', r.id, r.copy_id, r.customer_id, r.start_date, r.end_date FROM game_copies c "
+        f"JOIN reservations r ON r.copy_id = c.id WHERE c.game_id = %s AND {overlap} "
+        "UNION ALL "
+        "SELECT 'rental', o.id, o.copy_id, o.customer_id, o.rental_date, o.due_date FROM game_copies c "
+        f"JOIN rentals o ON o.copy_id = c.id WHERE c.game_id = %s AND {out} "
+        "ORDER BY 5, 2"
+    )
+    return sql, [game_id] + overlap_params + [game_id] + out_params
+
+
+def fulfil(cursor, customer_id, copies, rental_date, due_date):
+    # A customer who picks up a reserved game, on the day or early, has had
+    # the reservation, whichever copy went out; it stops holding its copy.
+    # copies is {game_id: [copy ids checked out]}: each one fulfils one of the
+    # customer's reservations of that game overlapping the rental, the one on
+    # that very copy first.
+    for game_id, copy_ids in copies.items():
+        overlap, params = overlapping(rental_date, due_date)
+        placeholders = ", ".join(["%s"] * len(copy_ids))
+        cursor.execute(
+            f"SELECT id FROM reservations WHERE customer_id = %s AND game_id = %s AND {overlap} "
+            f"ORDER BY CASE WHEN copy_id IN ({placeholders}) THEN 0 ELSE 1 END, start_date, id LIMIT %s",
+            [customer_id, game_id] + params + list(copy_ids) + [len(copy_ids)]
+        )
+        reservation_ids = [row[0] for row in cursor.fetchall()]
+        if reservation_ids:
+            cursor.execute(
+                f"UPDATE reservations SET status = %s WHERE id IN ({', '.join(['%s'] * len(reservation_ids))})",
+                [FULFILLED] + reservation_ids
+            )
@@ -0,0 +1,416 @@
+import argparse
+import base64
+import hmac
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from backends import default_backend, from_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+
+
+class BadRequest(Exception):
+    pass
+
+
+def to_json(value):
+    # Money stays exact as a decimal string; dates go out as YYYY-MM-DD
+    def default(value):
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+    return json.dumps(value, default=default, separators=(',', ':'))
+
+
+def encode_cursor(key):
+    # Keyset position of a row, opaque to clients: they only hand it back as ?after=
+    return base64.urlsafe_b64encode(to_json(list(key)).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise BadRequest("Invalid cursor")
+    if not isinstance(key, list) or not key:
+        raise BadRequest("Invalid cursor")
+    return tuple(key)
+
+
+class RentalService:
+    # The GameRentalSystem operations as JSON in, JSON out. Every request
+    # borrows a connection from the one shared pool, so any number of counters
+    # share pool_size database connections and only the service knows the
+    # database credentials.
+    MAX_PAGE = 1000
+    VIEWS = ('customers', 'games', 'staff', 'rentals')
+
+    def __init__(self, system, token=None):
+        self.system = system
+        self.token = token
+        self.routes = {
+            ('GET', '/health'): self.health,
+            ('GET', '/customers/search'): lambda query, body: self.search(self.system.search_customers, query),
+            ('GET', '/games/search'): self.search_games,
+            ('GET', '/customers/summary'): self.customer_summary,
+            ('GET', '/customers/reservations'): self.customer_reservations,
+            ('GET', '/games/availability'): self.availability,
+            ('GET', '/games/bookings'): self.bookings,
+            ('GET', '/staff/all'): lambda query, body: (200, {'staff': self.system.reference.staff()}),
+            ('GET', '/reports'): self.reports,
+            ('GET', '/diagnostics'): lambda query, body: (200, self.system.diagnostics()),
+            ('POST', '/diagnostics/reset'): self.reset_diagnostics,
+            ('POST', '/customers'): self.add_customer,
+            ('POST', '/games'): self.add_game,
+            ('POST', '/staff'): self.add_staff,
+            ('POST', '/rentals'): self.add_rental,
+            ('POST', '/rentals/basket'): self.add_rentals,
+            ('POST', '/returns'): self.return_rentals,
+            ('POST', '/reservations'): self.reserve,
+            ('POST', '/reservations/cancel'): self.cancel_reservation,
+        }
+        for view in self.VIEWS:
+            self.routes[('GET', f'/{view}')] = lambda query, body, view=view: self.page(view, query)
+            self.routes[('GET', f'/{view}/changes')] = lambda query, body, view=view: self.changes(view, query)
+
+    def authorized(self, header):
+        if not self.token:
+            return True
+        return hmac.compare_digest(header or '', f"Bearer {self.token}")
+
+    def handle(self, method, path, query, body, session=None):
+        # -> (status, payload); the payload is a dict, or a str for /metrics.
+        # session (the client's X-Session header) scopes read-your-writes: a
+        # client's reads go to the primary right after that client writes.
+        with self.system.reads.session(session):
+            return self._handle(method, path, query, body)
+
+    def _handle(self, method, path, query, body):
+        if (method, path) == ('GET', '/metrics'):
+            return 200, self.system.prometheus_metrics()
+        route = self.routes.get((method, path.rstrip('/') or '/'))
+        if route is None:
+            known = {route_path for _, route_path in self.routes}
+            if path.rstrip('/') in known:
+                return 405, {'error': f"{method} not allowed on {path}"}
+            return 404, {'error': f"No such endpoint: {path}"}
+        try:
+            return route(query, body)
+        except BadRequest as err:
+            return 400, {'error': str(err)}
+
+    # Helpers for pulling typed arguments out of the query string and body
+
+    @staticmethod
+    def _int(value, name, default=None):
+        if value is None:
+            if default is None:
+                raise BadRequest(f"'{name}' is required")
+            return default
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise BadRequest(f"'{name}' must be an integer")
+
+    @staticmethod
+    def _field(body, name, required=True):
+        value = body.get(name)
+        if required and value in (None, ''):
+            raise BadRequest(f"'{name}' is required")
+        return value
+
+    @staticmethod
+    def _date(value, name):
+        if value in (None, ''):
+            raise BadRequest(f"'{name}' is required")
+        try:
+            return datetime.strptime(str(value), '%Y-%m-%d').date()
+        except ValueError:
+            raise BadRequest(f"'{name}' must be a YYYY-MM-DD date")
+
+    def _limit(self, query, default):
+        limit = self._int(query.get('limit'), 'limit', default)
+        if not 1 <= limit <= self.MAX_PAGE:
+            raise BadRequest(f"'limit' must be between 1 and {self.MAX_PAGE}")
+        return limit
+
+    # Reads
+
+    def health(self, query, body):
+        return 200, {'status': 'ok', 'backend': self.system.backend.describe()}
+
+    @staticmethod
+    def _view_options(query):
+        # ?sort=<column>&desc=1 and ?filter.<name>=<value> take the same
+        # whitelisted names as the GUI; ?after= and ?until= are row cursors
+        return (
+            decode_cursor(query['after']) if query.get('after') else None,
+            decode_cursor(query['until']) if query.get('until') else None,
+            query.get('sort'),
+            {'1': True, '0': False}.get(query.get('desc')),
+            {key[len('filter.'):]: value for key, value in query.items() if key.startswith('filter.')},
+        )
+
+    def page(self, view, query):
+        # Keyset pages: each row carries the cursor that starts the page after it,
+        # and `next` is set when there may be more rows
+        limit = self._limit(query, 200)
+        after, until, sort, descending, filters = self._view_options(query)
+        try:
+            rows = self.system.fetch_page(view, after, limit, sort, descending, filters, until)
+        except ValueError as err:
+            raise BadRequest(str(err))
+        return 200, {
+            'rows': [{'values': list(values), 'cursor': encode_cursor(key)} for values, key in rows],
+            'next': encode_cursor(rows[-1][1]) if len(rows) == limit else None,
+        }
+
+    def changes(self, view, query):
+        # Rows changed since ?since= (the watermark of the previous call);
+        # `changed` is null when there were too many to patch and the client
+        # should reload
+        after, until, sort, descending, filters = self._view_options(query)
+        try:
+            watermark, changed, rows = self.system.view_changes(
+                view, query.get('since'), after, until, sort, descending, filters
+            )
+        except ValueError as err:
+            raise BadRequest(str(err))
+        return 200, {
+            'watermark': watermark,
+            'changed': changed,
+            'rows': [{'values': list(values), 'cursor': encode_cursor(key)} for values, key in rows or []],
+        }
+
+    def search(self, search, query):
+        return 200, {'results': search(query.get('q', ''), self._limit(query, 20))}
+
+    def search_games(self, query, body):
+        # ?customer= leaves out games whose free copies are all reserved by
+        # others; ?all=1 searches the whole catalogue instead
+        customer_id = self._int(query['customer'], 'customer') if query.get('customer') else None
+        return 200, {'results': self.system.search_games(
+            query.get('q', ''), self._limit(query, 20), customer_id, query.get('all') != '1'
+        )}
+
+    def customer_summary(self, query, body):
+        summary = self.system.customer_summary(self._int(query.get('id'), 'id'))
+        if summary is None:
+            return 404, {'error': "No such customer"}
+        return 200, summary
+
+    def customer_reservations(self, query, body):
+        return 200, {'reservations': self.system.customer_reservations(self._int(query.get('id'), 'id'))}
+
+    def availability(self, query, body):
+        # ?from=&to= -> games with a copy free for the whole range; with ?id=
+        # just how many copies of that game are
+        first_day, last_day = self._date(query.get('from'), 'from'), self._date(query.get('to'), 'to')
+        if query.get('id') is not None:
+            return 200, {'free': self.system.game_availability(self._int(query['id'], 'id'), first_day, last_day)}
+        return 200, {'games': self.system.available_games_between(first_day, last_day, self._limit(query, 200))}
+
+    def bookings(self, query, body):
+        return 200, {'bookings': self.system.game_bookings(
+            self._int(query.get('id'), 'id'), self._date(query.get('from'), 'from'), self._date(query.get('to'), 'to')
+        )}
+
+    def reports(self, query, body):
+        return 200, self.system.dashboard(self._int(query.get('days'), 'days', 30), self._limit(query, 10))
+
+    # Writes: 201 when the row went in, 422 when the system refused it
+
+    def reset_diagnostics(self, query, body):
+        self.system.reset_diagnostics()
+        return 200, {'ok': True}
+
+    def _created(self, ok, what):
+        if ok:
+            return 201, {'ok': True}
+        return 422, {'ok': False, 'error': f"Could not add {what}"}
+
+    def add_customer(self, query, body):
+        return self._created(self.system.add_customer(
+            self._field(body, 'name'), self._field(body, 'email'), self._field(body, 'phone', False)
+        ), "customer")
+
+    def add_game(self, query, body):
+        return self._created(self.system.add_game(
+            self._field(body, 'title'), self._field(body, 'genre', False),
+            self._field(body, 'price_per_day'), self._int(body.get('copies'), 'copies')
+        ), "game")
+
+    def add_staff(self, query, body):
+        return self._created(self.system.add_staff(
+            self._field(body, 'name'), self._field(body, 'position', False), self._field(body, 'email')
+        ), "staff member")
+
+    def add_rental(self, query, body):
+        return self._created(self.system.add_rental(
+            self._int(body.get('customer_id'), 'customer_id'), self._int(body.get('game_id'), 'game_id'),
+            self._int(body.get('staff_id'), 'staff_id'), body.get('rental_date'), body.get('return_date')
+        ), "rental")
+
+    def add_rentals(self, query, body):
+        game_ids = self._field(body, 'game_ids')
+        if not isinstance(game_ids, list):
+            raise BadRequest("'game_ids' must be a list")
+        return self._created(self.system.add_rentals(
+            self._int(body.get('customer_id'), 'customer_id'),
+            [self._int(game_id, 'game_ids') for game_id in game_ids],
+            self._int(body.get('staff_id'), 'staff_id'), body.get('rental_date'), body.get('return_date')
+        ), "rentals")
+
+    def return_rentals(self, query, body):
+        rental_ids = self._field(body, 'rental_ids')
+        if not isinstance(rental_ids, list):
+            raise BadRequest("'rental_ids' must be a list")
+        charges = self.system.return_rentals(
+            [self._int(rental_id, 'rental_ids') for rental_id in rental_ids], body.get('return_date')
+        )
+        if charges is None:
+            return 422, {'ok': False, 'error': "Could not process the return"}
+        return 200, {'charges': {
+            str(rental_id): {'total_cost': total, 'late_fee': fee} for rental_id, (total, fee) in charges.items()
+        }}
+
+    def reserve(self, query, body):
+        reservation_id = self.system.reserve(
+            self._int(body.get('customer_id'), 'customer_id'), self._int(body.get('game_id'), 'game_id'),
+            self._date(body.get('from'), 'from'), self._date(body.get('to'), 'to')
+        )
+        if reservation_id is None:
+            return 422, {'ok': False, 'error': "Could not add reservation"}
+        return 201, {'ok': True, 'id': reservation_id}
+
+    def cancel_reservation(self, query, body):
+        if self.system.cancel_reservation(self._int(body.get('id'), 'id')):
+            return 200, {'ok': True}
+        return 422, {'ok': False, 'error': "Could not cancel reservation"}
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.0: one request per TCP connection, so an idle client never pins a worker
+    server_version = 'GameRentalService/1.0'
+
+    def _respond(self, status, payload):
+        if isinstance(payload, str):
+            data, content_type = payload.encode(), 'text/plain; version=0.0.4'
+        else:
+            data, content_type = to_json(payload).encode(), 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, method):
+        service = self.server.service
+        if not service.authorized(self.headers.get('Authorization')):
+            self._respond(401, {'error': "Missing or wrong token"})
+            return
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        body = {}
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._respond(400, {'error': "Invalid Content-Length"})
+            return
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length))
+            except ValueError:
+                self._respond(400, {'error': "Body is not valid JSON"})
+                return
+            if not isinstance(body, dict):
+                self._respond(400, {'error': "Body must be a JSON object"})
+                return
+        try:
+            status, payload = service.handle(method, url.path, query, body, self.headers.get('X-Session'))
+        except Exception:
+            logger.exception(f"{method} {self.path} failed")
+            status, payload = 500, {'error': "Internal error"}
+        self._respond(status, payload)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class ServiceServer(HTTPServer):
+    # Requests run on a fixed set of worker threads that share the system's
+    # connection pool, instead of a new thread per request
+    def __init__(self, address, service, workers=16):
+        super().__init__(address, ServiceRequestHandler)
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='service-worker')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the rental system as a local HTTP/JSON API")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (default: localhost only)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=16, help="Requests handled at once")
+    parser.add_argument('--pool-size', type=int, default=10, help="Database connections shared by all clients")
+    parser.add_argument('--token', default=os.environ.get('GAMERENTAL_SERVICE_TOKEN'),
+                        help="Require 'Authorization: Bearer <token>' (default: GAMERENTAL_SERVICE_TOKEN)")
+    parser.add_argument('--db', help="Database URL, e.g. sqlite:///rentals.db (default: GAMERENTAL_DB or MySQL)")
+    parser.add_argument('--replica', action='append',
+                        help="Read replica URL for read-only queries (repeatable; default: GAMERENTAL_REPLICAS)")
+    args = parser.parse_args()
+
+    from videogamerental import DB_CONFIG, GameRentalSystem, configure_logging
+
+    configure_logging()
+
+    system = GameRentalSystem(
+        None, pool_size=args.pool_size, backend=from_url(args.db) if args.db else default_backend(DB_CONFIG),
+        replicas=[from_url(url) for url in args.replica] if args.replica else None
+    )
+    server = ServiceServer((args.host, args.port), RentalService(system, args.token), args.workers)
+    logger.info(f"Serving on http://{args.host}:{server.server_port} ({system.backend.describe()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        system.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import tkinter as tk
+from tkinter import ttk
+
+# Keys that move around the field rather than change what was typed
+NAVIGATION_KEYS = {'Up', 'Down', 'Left', 'Right', 'Return', 'Escape', 'Tab', 'Home', 'End',
+                   'Shift_L', 'Shift_R', 'Control_L', 'Control_R', 'Alt_L', 'Alt_R'}
+
+
+class TypeAheadEntry(ttk.Frame):
+    # Entry that searches as you type instead of preloading every row into a
+    # Combobox. Keystrokes are debounced and each search runs in the
+    # background; results from an older search never overwrite a newer one.
+    def __init__(self, parent, search, run_in_background, delay_ms=250, limit=20, min_chars=1, on_select=None):
+        super().__init__(parent)
+        # search(text, limit) -> [(id, label), ...]
+        self.search = search
+        # on_select(id) when a result is picked, on_select(None) when the pick is undone
+        self.on_select = on_select
+        self.run_in_background = run_in_background
+        self.delay_ms = delay_ms
+        self.limit = limit
+        self.min_chars = min_chars
+        self.selected_id = None
+        self._results = []
+        self._after_id = None
+        self._task = None
+        self._generation = 0
+
+        self.entry = ttk.Entry(self)
+        self.entry.pack(fill='x')
+        self.listbox = tk.Listbox(self, height=8, exportselection=False)
+
+        self.entry.bind('<KeyRelease>', self._on_key)
+        self.entry.bind('<Down>', self._focus_results)
+        self.entry.bind('<Escape>', lambda e: self._hide())
+        self.listbox.bind('<Return>', self._choose)
+        self.listbox.bind('<Double-Button-1>', self._choose)
+        self.listbox.bind('<Escape>', lambda e: (self._hide(), self.entry.focus_set()))
+
+    def get(self):
+        return self.entry.get()
+
+    def set(self, text):
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, text)
+
+    def clear(self):
+        self._deselect()
+        self.set('')
+        self._hide()
+
+    def _deselect(self):
+        picked, self.selected_id = self.selected_id, None
+        if picked is not None and self.on_select:
+            self.on_select(None)
+
+    def _on_key(self, event):
+        if event.keysym in NAVIGATION_KEYS:
+            return
+        self._deselect()
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        self._after_id = self.after(self.delay_ms, self._search, self.entry.get())
+
+    def _search(self, text):
+        self._after_id = None
+        text = text.strip()
+        if self._task is not None:
+            self._task.cancel()
+        if len(text) < self.min_chars:
+            self._hide()
+            return
+        self._generation += 1
+        generation = self._generation
+        self._task = self.run_in_background(
+            "Searching", self.search, text, self.limit,
+            on_success=lambda rows: self._show(generation, rows)
+        )
+
+    def _show(self, generation, rows):
+        if generation != self._generation or not self.winfo_exists():
+            return
+        self._results = rows
+        self.listbox.delete(0, tk.END)
+        for id, label in rows:
+            self.listbox.insert(tk.END, f"{id} - {label}")
+        if rows:
+            self.listbox.pack(fill='x')
+        else:
+            self._hide()
+
+    def _hide(self):
+        self.listbox.pack_forget()
+
+    def _focus_results(self, event):
+        if self.listbox.winfo_ismapped() and self._results:
+            self.listbox.focus_set()
+            self.listbox.selection_clear(0, tk.END)
+            self.listbox.selection_set(0)
+            self.listbox.activate(0)
+        return 'break'
+
+    def _choose(self, event):
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        id, label = self._results[selection[0]]
+        self.selected_id = id
+        self.set(f"{id} - {label}")
+        self._hide()
+        self.entry.focus_set()
+        self.entry.icursor(tk.END)
+        if self.on_select:
+            self.on_select(id)
@@ -1,43 +1,439 @@
-from mysql.connector import connect, Error
-from tkinter import messagebox
+import time
+
+# Start of the clock for --measure-startup, taken before the heavier imports below
+STARTED_AT = time.perf_counter()
+
+from tkinter import filedialog, messagebox
+import argparse
+import json
 import logging
+import os
+import sys
 import tkinter as tk
 from tkinter import ttk
-from datetime import datetime
+from collections import Counter
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from backends import Error, default_backend, default_replicas
+from connection_pool import ConnectionPool
+from replicas import ReadRouter
+from background import BackgroundExecutor
+from client import RemoteRentalSystem
+from paging import KeysetQuery
+from paged_view import PagedTreeview
+from reference_cache import ReferenceCache
+from customer_summary import CustomerSummaries
+from type_ahead import TypeAheadEntry
+from query_stats import QueryStats, log_slow_queries_to
+import bulk_import
+import export
+import inventory
+import migrations
+import reports
+import reservations
+from reports import ReportDelta
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+def configure_logging(level=None):
+    # Called by the entry points rather than on import, so importing this
+    # module never reconfigures logging; GAMERENTAL_LOG_LEVEL=DEBUG shows everything
+    level = level or os.environ.get('GAMERENTAL_LOG_LEVEL', 'INFO')
+    logging.basicConfig(level=level.upper())
+
+class BasketUnavailableError(Exception):
+    pass
+
+class ReturnConflictError(Exception):
+    pass
+
+class RentalUnavailableError(Exception):
+    pass
+
+def format_date(value, missing=''):
+    if value is None:
+        return missing
+    # SQLite hands dates back as ISO strings already
+    return value if isinstance(value, str) else value.strftime('%Y-%m-%d')
+
+def parse_date(value):
+    # Dates arrive as date objects or 'YYYY-MM-DD' strings from the forms
+    if value is None or (isinstance(value, date) and not isinstance(value, datetime)):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+
+def format_money(value):
+    return '' if value is None else f"${float(value):,.2f}"
+
+def format_rental_row(row):
+    rental_id, customer, game, staff, rental_date, return_date, total_cost = row
+    return (
+        rental_id, customer, game, staff,
+        format_date(rental_date), format_date(return_date, 'Not Returned'), format_money(total_cost)
+    )
+
+DB_CONFIG = {
+    'host': "localhost",
+    'user': "root",
+    'database': "gamrentaldb",
+    'password': "haiderr",
+    'auth_plugin': 'mysql_native_password'
+}
+
 class GameRentalSystem:
-    def __init__(self, root):
+    # Browsable views, paged by key so no view ever loads a whole table
+    VIEWS = {
+        'customers': KeysetQuery("id, name, email, phone", "customers", ['id']),
+        'games': KeysetQuery("id, title, genre, price_per_day, available_copies", "games", ['id']),
+        'staff': KeysetQuery("id, name, position, email", "staff", ['id']),
+        'rentals': KeysetQuery(
+            """
+            r.id,
+            c.name as customer_name,
+            g.title as game_title,
+            s.name as staff_name,
+            r.rental_date,
+            r.return_date,
+            r.total_cost
+            """,
+            """
+            rentals r
+            LEFT JOIN customers c ON r.customer_id = c.id
+            LEFT JOIN games g ON r.game_id = g.id
+            LEFT JOIN staff s ON r.staff_id = s.id
+            """,
+            ['r.rental_date', 'r.id'],
+            descending=True,
+            format_row=format_rental_row
+        ),
+    }
+
+    # What the view windows may sort and filter on, by column heading. Only
+    # these columns ever reach the SQL. Sorts page on (column, id), each backed
+    # by an index (migrations 2, 5 and 10, or a UNIQUE email); nullable columns
+    # can't be sorted on because keyset paging can't step over NULLs.
+    VIEW_SORTS = {
+        'customers': {'ID': 'id', 'Name': 'name', 'Email': 'email'},
+        'games': {'ID': 'id', 'Title': 'title', 'Price/Day': 'price_per_day'},
+        'staff': {'ID': 'id', 'Name': 'name', 'Position': 'position', 'Contact': 'email'},
+        'rentals': {'ID': 'r.id', 'Rental Date': 'r.rental_date'},
+    }
+    # Sorted case-insensitively, to match their NOCASE indexes on SQLite
+    TEXT_SORTS = {'name', 'title'}
+    # filter -> (column, match): 'prefix' is a case-insensitive starts-with,
+    # 'equals' an exact match, 'id' a whole number, 'status' open/returned
+    VIEW_FILTERS = {
+        'customers': {'Name': ('name', 'prefix'), 'Email': ('email', 'equals')},
+        'games': {'Title': ('title', 'prefix'), 'Genre': ('genre', 'equals')},
+        'staff': {'Name': ('name', 'prefix'), 'Position': ('position', 'equals')},
+        'rentals': {
+            'Customer ID': ('r.customer_id', 'id'),
+            'Game ID': ('r.game_id', 'id'),
+            'Status': ('r.return_date', 'status'),
+        },
+    }
+
+    # Statements slower than this are logged to the slow-query log
+    SLOW_QUERY_MS = 200
+
+    # How far view_changes looks back past its watermark, for transactions
+    # still in flight when it was taken
+    CHANGE_OVERLAP = timedelta(seconds=5)
+
+    # Rentals are due back this many days after they go out; each day later
+    # adds a flat late fee on top of the daily rate
+    RENTAL_PERIOD_DAYS = 7
+    LATE_FEE_PER_DAY = Decimal('1.00')
+
+    def __init__(self, root, pool_size=5, backend=None, slow_query_ms=None,
+                 prepared_statements=True, batch_statements=False, replicas=None):
         logger.debug("Initializing GameRentalSystem...")
         self.root = root
+        # Hot-path inserts reuse server-side prepared statements (MySQL); with
+        # batch_statements a checkout also goes out as a single multi-statement
+        self.prepared_statements = prepared_statements
+        self.batch_statements = batch_statements
+        # Latency, rows and call site of every statement, for the Diagnostics window
+        if slow_query_ms is None:
+            try:
+                slow_query_ms = float(os.environ.get('GAMERENTAL_SLOW_QUERY_MS', self.SLOW_QUERY_MS))
+            except ValueError:
+                logger.warning(f"Ignoring GAMERENTAL_SLOW_QUERY_MS={os.environ['GAMERENTAL_SLOW_QUERY_MS']!r}, "
+                               f"using {self.SLOW_QUERY_MS} ms")
+                slow_query_ms = self.SLOW_QUERY_MS
+        self.query_stats = QueryStats(slow_threshold_ms=slow_query_ms)
+        if os.environ.get('GAMERENTAL_SLOW_QUERY_LOG'):
+            log_slow_queries_to(os.environ['GAMERENTAL_SLOW_QUERY_LOG'])
         try:
-            self.db = connect(
-                host="localhost",
-                user="root",
-                database="gamrentaldb",
-                password="haiderr",
-                auth_plugin='mysql_native_password'
-            )
-            self.cursor = self.db.cursor()
-            logger.debug("Database connection successful")
+            # MySQL by default; GAMERENTAL_DB or an explicit backend can select
+            # another engine (e.g. embedded SQLite) behind the same API
+            self.backend = backend or default_backend(DB_CONFIG)
+            self.backend.query_stats = self.query_stats
+            # Every operation borrows its own connection and cursor from the pool,
+            # so worker threads never share cursor state
+            self.pool = ConnectionPool(self.backend, pool_size=pool_size)
+            self.pool.warm_up()
+            # Read-only queries go to read replicas when there are any
+            # (GAMERENTAL_REPLICAS); writes and transactions stay on self.pool
+            replicas = default_replicas() if replicas is None else replicas
+            for replica in replicas:
+                replica.query_stats = self.query_stats
+            self.reads = ReadRouter(self.pool, replicas, pool_size=pool_size)
+            logger.debug(f"Database connection successful ({self.backend.describe()})")
+            version = migrations.current_version(self)
+            if version < migrations.LATEST_VERSION:
+                logger.warning(
+                    f"Database schema is at version {version}, latest is {migrations.LATEST_VERSION}; "
+                    "run python migrations.py to upgrade"
+                )
+            # Lookup data for the Rentals tab, kept current by the add_* methods below
+            self.reference = ReferenceCache(self)
+            # Account panel data for recently picked customers
+            self.customer_summaries = CustomerSummaries(self)
         except Error as e:
             logger.error(f"Error connecting to database: {e}")
+            if self.root is None:
+                # Headless callers (CLI tools) handle the failure themselves
+                raise
             messagebox.showerror("Connection Error", "Failed to connect to the database.")
             self.root.quit()
 
     def close(self):
-        if self.db.is_connected():
-            self.cursor.close()
-            self.db.close()
-            logger.info("MySQL connection closed.")
+        self.reads.close()
+        self.pool.close()
+        logger.info("Database connection closed.")
+
+    def diagnostics(self):
+        return {
+            'backend': self.backend.describe(),
+            'pool': self.pool.stats(),
+            'reads': self.reads.stats(),
+            'reference_cache': self.reference.stats(),
+            'customer_summaries': self.customer_summaries.stats(),
+            'queries': self.query_stats.snapshot(),
+        }
+
+    def reset_diagnostics(self):
+        self.query_stats.reset()
+
+    def diagnostics_json(self):
+        return json.dumps(self.diagnostics(), indent=2, default=str)
+
+    def prometheus_metrics(self):
+        lines = [self.query_stats.prometheus().rstrip("\n")]
+        pool = self.pool.stats()
+        lines += [
+            "# HELP gamerental_pool_connections Pooled database connections by state.",
+            "# TYPE gamerental_pool_connections gauge",
+            f'gamerental_pool_connections{{state="idle"}} {pool["idle"]}',
+            f'gamerental_pool_connections{{state="in_use"}} {pool["in_use"]}',
+            "# HELP gamerental_pool_retries_total Transactions retried after a deadlock or lock timeout.",
+            "# TYPE gamerental_pool_retries_total counter",
+            f"gamerental_pool_retries_total {pool['retries']}",
+            "# HELP gamerental_pool_retries_exhausted_total Transactions that failed after their last retry.",
+            "# TYPE gamerental_pool_retries_exhausted_total counter",
+            f"gamerental_pool_retries_exhausted_total {pool['retries_exhausted']}",
+        ]
+        reads = self.reads.stats()
+        lines += [
+            "# HELP gamerental_reads_total Read-only queries by the database that answered them.",
+            "# TYPE gamerental_reads_total counter",
+            f'gamerental_reads_total{{target="primary"}} {reads["primary_reads"]}',
+        ] + [
+            f'gamerental_reads_total{{target="{replica["backend"]}"}} {replica["reads"]}'
+            for replica in reads['replicas']
+        ] + [
+            "# HELP gamerental_replica_fallbacks_total Reads sent to the primary because no replica was usable.",
+            "# TYPE gamerental_replica_fallbacks_total counter",
+            f"gamerental_replica_fallbacks_total {reads['fallbacks']}",
+        ]
+        cache = self.reference.stats()
+        lines += [
+            "# HELP gamerental_reference_cache_requests_total Rentals tab lookup cache requests.",
+            "# TYPE gamerental_reference_cache_requests_total counter",
+            f'gamerental_reference_cache_requests_total{{result="hit"}} {cache["hits"]}',
+            f'gamerental_reference_cache_requests_total{{result="miss"}} {cache["misses"]}',
+        ]
+        summaries = self.customer_summaries.stats()
+        lines += [
+            "# HELP gamerental_customer_summary_requests_total Customer account panel cache requests.",
+            "# TYPE gamerental_customer_summary_requests_total counter",
+            f'gamerental_customer_summary_requests_total{{result="hit"}} {summaries["hits"]}',
+            f'gamerental_customer_summary_requests_total{{result="miss"}} {summaries["misses"]}',
+        ]
+        return "\n".join(lines) + "\n"
+
+    # Read-only queries: a replica answers unless there is none, this session
+    # has just written, or primary is set (reads that feed a write decision)
+
+    def fetch_all(self, query, params=None, primary=False):
+        return self.reads.fetch_all(query, params, primary)
+
+    def fetch_one(self, query, params=None, primary=False):
+        return self.reads.fetch_one(query, params, primary)
+
+    def _prefix_pattern(self, text):
+        # '!' is the LIKE escape character, so user input can't smuggle in wildcards
+        escaped = text.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+        return escaped + '%'
+
+    def _search(self, id_query, prefix_query, text, limit, params=()):
+        # Numbers match on id first; everything is also tried as a name prefix,
+        # which an index on the name column turns into a short range scan.
+        # params fill any placeholders between the match and the LIMIT.
+        text = text.strip()
+        rows = []
+        if text.isdigit():
+            rows.extend(self.fetch_all(id_query, (int(text), *params)))
+        seen = {row[0] for row in rows}
+        for row in self.fetch_all(prefix_query, (self._prefix_pattern(text), *params, limit)):
+            if row[0] not in seen:
+                rows.append(row)
+        return rows[:limit]
+
+    def search_customers(self, text, limit=20):
+        return self._search(
+            "SELECT id, name FROM customers WHERE id = %s",
+            "SELECT id, name FROM customers WHERE name LIKE %s ESCAPE '!' "
+            f"ORDER BY {self.backend.text_order('name')} LIMIT %s",
+            text, limit
+        )
+
+    def _rentable(self, customer_id):
+        # Condition on games rows: a copy is on the shelf that nobody but
+        # customer_id has reserved before it would be due back from a rental
+        # today. available_copies alone counts reserved copies too.
+        today = datetime.now().date()
+        unreserved, params = reservations.unreserved(customer_id, today, self.due_date_for(today))
+        return (
+            "games.available_copies > 0 AND EXISTS (SELECT 1 FROM game_copies WHERE game_copies.game_id = games.id "
+            f"AND game_copies.status = %s AND {unreserved})",
+            [inventory.AVAILABLE] + params
+        )
+
+    def search_games(self, text, limit=20, customer_id=None, rentable_only=True):
+        # Only titles that can actually be rented right now, by customer_id
+        # when given (their own reservations don't count against them); with
+        # rentable_only=False the whole catalogue, e.g. to reserve a title
+        # that is out today
+        rentable, params = self._rentable(customer_id) if rentable_only else ("1 = 1", [])
+        return self._search(
+            f"SELECT id, title FROM games WHERE id = %s AND {rentable}",
+            f"SELECT id, title FROM games WHERE title LIKE %s ESCAPE '!' AND {rentable} "
+            f"ORDER BY {self.backend.text_order('title')} LIMIT %s",
+            text, limit, params
+        )
+
+    def shelf_copies(self, game_id, customer_id=None, rental_date=None):
+        # -> (copies of the game on the shelf, how many of them customer_id
+        # could rent from rental_date: the rest are reserved by others)
+        rental_date = parse_date(rental_date) or datetime.now().date()
+        unreserved, params = reservations.unreserved(customer_id, rental_date, self.due_date_for(rental_date))
+        on_shelf, free = self.fetch_one(
+            f"SELECT COUNT(*), COALESCE(SUM(CASE WHEN {unreserved} THEN 1 ELSE 0 END), 0) FROM game_copies "
+            "WHERE game_id = %s AND status = %s",
+            params + [game_id, inventory.AVAILABLE], primary=True
+        )
+        return on_shelf, free
+
+    def dashboard(self, days=30, limit=10):
+        return reports.dashboard(self, days, limit)
+
+    def customer_summary(self, customer_id):
+        # Open rentals, overdue items, lifetime spend and last visit for the
+        # account panel; None for an unknown customer
+        return self.customer_summaries.get(customer_id)
+
+    @classmethod
+    def check_filter(cls, view, name, value):
+        # -> the filter value as view_query uses it; ValueError if it can't be
+        if name not in cls.VIEW_FILTERS[view]:
+            raise ValueError(f"Can't filter {view} by '{name}'")
+        _, match = cls.VIEW_FILTERS[view][name]
+        value = str(value).strip()
+        if match == 'id' and not value.isdigit():
+            raise ValueError(f"{name} must be a number")
+        if match == 'status' and value.lower() not in ('open', 'returned'):
+            raise ValueError(f"{name} must be 'open' or 'returned'")
+        return value
+
+    def view_query(self, view, sort=None, descending=None, filters=None):
+        # The view's keyset query with a whitelisted sort and filters applied;
+        # anything else raises ValueError
+        if sort is not None and sort not in self.VIEW_SORTS[view]:
+            raise ValueError(f"Can't sort {view} by '{sort}'")
+        column = self.VIEW_SORTS[view].get(sort)
+        if column in self.TEXT_SORTS:
+            column = self.backend.text_order(column)
+
+        conditions = []
+        params = []
+        for name, value in (filters or {}).items():
+            value = self.check_filter(view, name, value)
+            filter_column, match = self.VIEW_FILTERS[view][name]
+            if match == 'prefix':
+                conditions.append(f"{filter_column} LIKE %s ESCAPE '!'")
+                params.append(self._prefix_pattern(value))
+            elif match == 'id':
+                conditions.append(f"{filter_column} = %s")
+                params.append(int(value))
+            elif match == 'status':
+                conditions.append(f"{filter_column} IS {'NULL' if value.lower() == 'open' else 'NOT NULL'}")
+            else:
+                conditions.append(f"{filter_column} = %s")
+                params.append(value)
+        return self.VIEWS[view].variant(column, descending, conditions, params)
+
+    def fetch_page(self, view, after=None, limit=200, sort=None, descending=None, filters=None, until=None):
+        keyset = self.VIEWS[view]
+        if sort is not None or descending is not None or filters:
+            keyset = self.view_query(view, sort, descending, filters)
+        query, params = keyset.page_sql(
+            tuple(after) if after is not None else None, limit, self.backend.row_value_keyset,
+            tuple(until) if until is not None else None
+        )
+        return keyset.split_rows(self.fetch_all(query, params))
+
+    def view_changes(self, view, since=None, after=None, until=None, sort=None, descending=None, filters=None,
+                     limit=500):
+        # What changed in a view window since the watermark of the last call:
+        # -> (watermark, ids of every row of the table inserted or updated,
+        # those rows as they now appear in the view between the keys after and
+        # until). The ids are None if more than limit rows changed; reload then.
+        # Rows are stamped with updated_at by the database (migration 7).
+        keyset = self.view_query(view, sort, descending, filters)
+        # From the primary: a lagging replica's clock runs ahead of its data,
+        # so its watermark would skip rows it hasn't received yet
+        watermark = self.fetch_one(f"SELECT {self.backend.current_timestamp}", primary=True)[0]
+        if since is None:
+            return watermark, [], []
+        if isinstance(since, str):
+            since = datetime.fromisoformat(since)
+        # Re-read a few seconds back: a row stamped just before the last
+        # watermark may have been committed just after it
+        changed = [row[0] for row in self.fetch_all(
+            f"SELECT id FROM {view} WHERE updated_at > %s LIMIT %s", (since - self.CHANGE_OVERLAP, limit + 1),
+            primary=True
+        )]
+        if len(changed) > limit:
+            return watermark, None, None
+        if not changed:
+            return watermark, [], []
+        primary_key = keyset.key_columns[-1]
+        rows = keyset.variant(conditions=[f"{primary_key} IN ({', '.join(['%s'] * len(changed))})"], params=changed)
+        query, params = rows.page_sql(
+            tuple(after) if after is not None else None, len(changed), self.backend.row_value_keyset,
+            tuple(until) if until is not None else None
+        )
+        return watermark, changed, rows.split_rows(self.fetch_all(query, params, primary=True))
 
     def add_customer(self, name, email, phone):
         try:
             query = "INSERT INTO customers (name, email, phone) VALUES (%s, %s, %s)"
-            self.cursor.execute(query, (name, email, phone))
-            self.db.commit()
+            with self.pool.transaction(self.prepared_statements) as cursor:
+                cursor.execute(query, (name, email, phone))
             logger.info(f"Customer {name} added successfully")
             return True
         except Error as err:
@@ -46,68 +442,504 @@ class GameRentalSystem:
 
     def add_game(self, title, genre, price_per_day, copies):
         try:
+            # Same rules as bulk_import: NaN and Infinity parse, but can't be
+            # compared or stored
+            try:
+                price_per_day = Decimal(str(price_per_day).strip())
+            except InvalidOperation:
+                raise ValueError("price per day must be a number")
+            if not price_per_day.is_finite():
+                raise ValueError("price per day must be a number")
+            if price_per_day < 0:
+                raise ValueError("price per day cannot be negative")
+            try:
+                copies = int(str(copies).strip())
+            except ValueError:
+                raise ValueError("copies must be a whole number")
+            if copies < 0:
+                raise ValueError("copies cannot be negative")
             query = "INSERT INTO games (title, genre, price_per_day, available_copies) VALUES (%s, %s, %s, %s)"
-            self.cursor.execute(query, (title, genre, price_per_day, copies))
-            self.db.commit()
+            with self.pool.transaction(self.prepared_statements) as cursor:
+                cursor.execute(query, (title, genre, price_per_day, copies))
+                game_id = cursor.lastrowid
+                inventory.add_copies(cursor, [(game_id, copies)])
             return True
-        except Error as err:
+        except (Error, ValueError) as err:
             logger.error(f"Error adding game: {err}")
             return False
 
     def add_rental(self, customer_id, game_id, staff_id, rental_date=None, return_date=None):
+        # Default rental_date to today if not provided
+        if rental_date is None:
+            rental_date = datetime.now().date()
+
         try:
-        # Check if the game is available
-            self.cursor.execute("SELECT available_copies, price_per_day FROM games WHERE id = %s", (game_id,))
-            game_data = self.cursor.fetchone()
-            if not game_data:
-                logger.error(f"Game with ID {game_id} does not exist.")
-                return False
-            if game_data[0] <= 0:
-                logger.error("Game not available for rental.")
+            rental_date, return_date = parse_date(rental_date), parse_date(return_date)
+            due_date = self.due_date_for(rental_date)
+            if self.batch_statements and self.backend.multi_statements and return_date is None:
+                checked_out = self.pool.run_transaction(
+                    self._checkout_batched, customer_id, game_id, staff_id, rental_date, due_date
+                )
+            else:
+                try:
+                    checked_out = self.pool.run_transaction(
+                        self._checkout, customer_id, game_id, staff_id, rental_date, due_date, return_date,
+                        prepared=self.prepared_statements
+                    )
+                except RentalUnavailableError:
+                    checked_out = False
+            if checked_out:
+                self.customer_summaries.invalidate([customer_id])
+                logger.info(f"Rental successfully added for customer ID {customer_id}")
+                return True
+            on_shelf, free = self.shelf_copies(game_id, customer_id, rental_date) if return_date is None else (0, 0)
+            if on_shelf and not free:
+                logger.error(f"All {on_shelf} copies of game ID {game_id} on the shelf are reserved by other customers.")
+            else:
+                logger.error(f"Game with ID {game_id} does not exist or has no copies available.")
+            return False
+        except (Error, ValueError) as err:
+            logger.error(f"Error adding rental: {err}")
+            return False
+
+    def due_date_for(self, rental_date):
+        return parse_date(rental_date) + timedelta(days=self.RENTAL_PERIOD_DAYS)
+
+    def _candidate_copies_sql(self, game_id, unreserved, unreserved_params, limit):
+        # -> (query, params) for copies of a game free to claim, locked as
+        # _allocate_copies needs; migrations.hot_queries checks the same query
+        lock = self.backend.skip_locked or self.backend.for_update
+        return (
+            f"SELECT id FROM game_copies WHERE game_id = %s AND status = %s AND {unreserved} "
+            f"ORDER BY id LIMIT %s{lock}",
+            [game_id, inventory.AVAILABLE] + unreserved_params + [limit]
+        )
+
+    def _allocate_copies(self, cursor, game_id, customer_id, rental_date, due_date, count=1):
+        # Claim count free copies of a game in the ledger, passing over copies
+        # someone else has reserved before the due date. Copies another
+        # checkout has locked are skipped rather than waited for where the
+        # engine can (MySQL 8), so counters renting the same title don't queue
+        # behind each other; the guards on the UPDATE mean a copy is only ever
+        # claimed once, and never from under a reservation, either way.
+        # -> copy ids, or None if there aren't enough; the caller must then
+        # roll back whatever was claimed
+        unreserved, unreserved_params = reservations.unreserved(customer_id, rental_date, due_date)
+        claimed = []
+        while len(claimed) < count:
+            cursor.execute(
+                *self._candidate_copies_sql(game_id, unreserved, unreserved_params, count - len(claimed))
+            )
+            candidates = [row[0] for row in cursor.fetchall()]
+            if not candidates:
+                return None
+            for copy_id in candidates:
+                cursor.execute(
+                    f"UPDATE game_copies SET status = %s WHERE id = %s AND status = %s AND {unreserved}",
+                    [inventory.RENTED, copy_id, inventory.AVAILABLE] + unreserved_params
+                )
+                if cursor.rowcount == 1:
+                    claimed.append(copy_id)
+        return claimed
+
+    def _checkout(self, cursor, customer_id, game_id, staff_id, rental_date, due_date, return_date):
+        # A rental entered after it came back never takes a copy off the shelf
+        copy_id = None
+        if return_date is None:
+            copies = self._allocate_copies(cursor, game_id, customer_id, rental_date, due_date)
+            if copies is None:
                 return False
+            copy_id = copies[0]
+            # The counter follows the ledger, after it in lock order like _checkin
+            cursor.execute(
+                f"UPDATE games SET available_copies = {self.backend.greatest('available_copies - 1', '0')} "
+                "WHERE id = %s",
+                (game_id,)
+            )
 
-        # Calculate total cost (initial rental cost)
-            total_cost = game_data[1]  # Price per day from database
+        # The daily rate is locked in at the game's current price, read in the
+        # same statement; initial cost is one day until the game comes back
+        rental_query = """
+        INSERT INTO rentals (customer_id, game_id, staff_id, rental_date, due_date, return_date, daily_rate, total_cost,
+                             copy_id)
+        SELECT %s, %s, %s, %s, %s, %s, price_per_day, price_per_day, %s FROM games WHERE id = %s
+        """
+        cursor.execute(
+            rental_query, (customer_id, game_id, staff_id, rental_date, due_date, return_date, copy_id, game_id)
+        )
+        if cursor.rowcount != 1:
+            # Raise rather than return so the copy claimed above is rolled back
+            raise RentalUnavailableError()
+        if return_date is None:
+            reservations.fulfil(cursor, customer_id, {game_id: [copy_id]}, rental_date, due_date)
+
+        delta = ReportDelta()
+        delta.rented(rental_date, game_id, staff_id, customer_id=customer_id)
+        if return_date is not None:
+            # Entered after the fact, so it has been paid for already, for
+            # the days it was actually kept
+            rental_id = cursor.lastrowid
+            total_cost, late_fee = self._charge_returned(cursor, [rental_id], return_date)[rental_id]
+            delta.returned(return_date, game_id, staff_id, total_cost, late_fee, customer_id)
+        delta.apply(cursor, self.backend)
+        return True
+
+    def _checkout_batched(self, cursor, customer_id, game_id, staff_id, rental_date, due_date):
+        # _checkout as one multi-statement batch: the statements after the
+        # copy is claimed only take effect if it was, so the whole checkout
+        # costs one round trip plus the COMMIT
+        unreserved, unreserved_params = reservations.unreserved(customer_id, rental_date, due_date)
+        reserved, reserved_params = reservations.overlapping(rental_date, due_date)
+        statements = [
+            ("SET @copy = NULL", []),
+            (f"SELECT id FROM game_copies WHERE game_id = %s AND status = %s AND {unreserved} ORDER BY id LIMIT 1"
+             f"{self.backend.skip_locked or self.backend.for_update} INTO @copy",
+             [game_id, inventory.AVAILABLE] + unreserved_params),
+            (f"UPDATE game_copies SET status = %s WHERE id = @copy AND status = %s AND {unreserved}",
+             [inventory.RENTED, inventory.AVAILABLE] + unreserved_params),
+            ("SET @took = ROW_COUNT()", []),
+            (f"UPDATE games SET available_copies = {self.backend.greatest('available_copies - 1', '0')} "
+             "WHERE id = %s AND @took = 1", [game_id]),
+            ("INSERT INTO rentals (customer_id, game_id, staff_id, rental_date, due_date, daily_rate, total_cost, "
+             "copy_id) SELECT %s, %s, %s, %s, %s, price_per_day, price_per_day, @copy FROM games "
+             "WHERE id = %s AND @took = 1",
+             [customer_id, game_id, staff_id, rental_date, due_date, game_id]),
+            # reservations.fulfil for the one copy, the reservation on it first
+            (f"UPDATE reservations SET status = %s WHERE customer_id = %s AND game_id = %s AND {reserved} "
+             "AND @took = 1 ORDER BY copy_id = @copy DESC, start_date, id LIMIT 1",
+             [reservations.FULFILLED, customer_id, game_id] + reserved_params),
+            *reports.rented_statements(self.backend, rental_date, game_id, staff_id, "@took = 1", customer_id),
+            ("SELECT @took", []),
+        ]
+        cursor.execute(";\n".join(sql for sql, _ in statements), [p for _, params in statements for p in params])
+        took = None
+        while True:
+            if cursor.description:
+                took = cursor.fetchall()[0][0]
+            if not cursor.nextset():
+                break
+        return took == 1
+
+    def add_rentals(self, customer_id, game_ids, staff_id, rental_date=None, return_date=None):
+        # Rent a whole basket in one transaction: either every game goes out or none does
+        if not game_ids:
+            return False
+        if rental_date is None:
+            rental_date = datetime.now().date()
 
-        # Default rental_date to today if not provided
-            if rental_date is None:
-                rental_date = datetime.date.today()
+        quantities = Counter(game_ids)
+        try:
+            rental_date, return_date = parse_date(rental_date), parse_date(return_date)
+            due_date = self.due_date_for(rental_date)
+            self.pool.run_transaction(
+                self._checkout_basket, customer_id, quantities, staff_id, rental_date, due_date, return_date
+            )
+            self.customer_summaries.invalidate([customer_id])
+            logger.info(f"{len(game_ids)} rentals added for customer ID {customer_id}")
+            return True
+        except BasketUnavailableError:
+            logger.error(f"Basket rolled back, not available: {self.unavailable_games(quantities)}")
+            return False
+        except (Error, ValueError) as err:
+            logger.error(f"Error adding rentals: {err}")
+            return False
 
-        # Start a transaction
-            self.cursor.execute("START TRANSACTION")
+    def _quantity_sql(self, quantities):
+        game_ids = list(quantities)
+        placeholders = ", ".join(["%s"] * len(game_ids))
+        case = "CASE id " + " ".join(["WHEN %s THEN %s"] * len(game_ids)) + " END"
+        case_params = [value for game_id in game_ids for value in (game_id, quantities[game_id])]
+        return game_ids, placeholders, case, case_params
+
+    def unavailable_games(self, quantities):
+        # Games in the basket that are missing or short of copies right now
+        game_ids, placeholders, case, case_params = self._quantity_sql(quantities)
+        rows = self.fetch_all(
+            f"SELECT id FROM games WHERE id IN ({placeholders}) AND available_copies >= {case}",
+            game_ids + case_params, primary=True
+        )
+        return sorted(set(game_ids) - {row[0] for row in rows})
+
+    def _checkout_basket(self, cursor, customer_id, quantities, staff_id, rental_date, due_date, return_date):
+        game_ids, placeholders, case, case_params = self._quantity_sql(quantities)
+
+        cursor.execute(f"SELECT id, price_per_day FROM games WHERE id IN ({placeholders})", game_ids)
+        prices = dict(cursor.fetchall())
+        if len(prices) != len(game_ids):
+            raise BasketUnavailableError()
+
+        copies = {game_id: [None] * quantities[game_id] for game_id in game_ids}
+        if return_date is None:
+            # Claim the copies game by game in id order, so two baskets that
+            # share games lock them in the same order; raising rolls back
+            # whatever was claimed before a game came up short
+            for game_id in sorted(game_ids):
+                copies[game_id] = self._allocate_copies(
+                    cursor, game_id, customer_id, rental_date, due_date, quantities[game_id]
+                )
+                if copies[game_id] is None:
+                    raise BasketUnavailableError()
+            # One decrement of the counters for the whole basket
+            cursor.execute(
+                f"UPDATE games SET available_copies = {self.backend.greatest(f'available_copies - {case}', '0')} "
+                f"WHERE id IN ({placeholders})",
+                case_params + game_ids
+            )
 
-        # Insert a rental record
-            rental_query = """
-            INSERT INTO rentals (customer_id, game_id, staff_id, rental_date, return_date, total_cost)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            self.cursor.execute(rental_query, (customer_id, game_id, staff_id, rental_date, return_date, total_cost))
+        rental_query = """
+        INSERT INTO rentals (customer_id, game_id, staff_id, rental_date, due_date, return_date, daily_rate, total_cost,
+                             copy_id)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        rows = [
+            (customer_id, game_id, staff_id, rental_date, due_date, return_date, prices[game_id], prices[game_id],
+             copy_id)
+            for game_id in game_ids
+            for copy_id in copies[game_id]
+        ]
+        delta = ReportDelta()
+        for game_id in game_ids:
+            delta.rented(rental_date, game_id, staff_id, quantities[game_id], customer_id)
+        if return_date is None:
+            # executemany on a plain VALUES insert is sent as one multi-row INSERT
+            cursor.executemany(rental_query, rows)
+            reservations.fulfil(cursor, customer_id, copies, rental_date, due_date)
+        else:
+            # Entered after the fact: one at a time for the ids, then charged
+            # for the days actually kept like a return
+            rental_games = {}
+            for row in rows:
+                cursor.execute(rental_query, row)
+                rental_games[cursor.lastrowid] = row[1]
+            charges = self._charge_returned(cursor, list(rental_games), return_date)
+            for rental_id, game_id in rental_games.items():
+                delta.returned(return_date, game_id, staff_id, *charges[rental_id], customer_id)
+        delta.apply(cursor, self.backend)
+
+    def _charge_sql(self):
+        # late_fee and total_cost for a rental that ends on the date bound to
+        # each %s: every day kept at the locked-in rate (at least one) plus the
+        # flat fee for every day past due. Shared by returns and the overdue run.
+        days_late = self.backend.greatest("0", self.backend.days_between("due_date", "%s"))
+        days_kept = self.backend.greatest("1", self.backend.days_between("rental_date", "%s"))
+        late_fee = f"{days_late} * %s"
+        total_cost = f"ROUND({days_kept} * daily_rate + {late_fee}, 2)"
+        return late_fee, total_cost
+
+    def _charge_returned(self, cursor, rental_ids, return_date):
+        # Price rentals that came back on return_date, the same way _checkin
+        # does. -> {rental_id: (total_cost, late_fee)}
+        placeholders = ", ".join(["%s"] * len(rental_ids))
+        late_fee, total_cost = self._charge_sql()
+        cursor.execute(
+            f"UPDATE rentals SET late_fee = {late_fee}, total_cost = {total_cost} WHERE id IN ({placeholders})",
+            [return_date, self.LATE_FEE_PER_DAY, return_date, return_date, self.LATE_FEE_PER_DAY] + list(rental_ids)
+        )
+        cursor.execute(f"SELECT id, total_cost, late_fee FROM rentals WHERE id IN ({placeholders})", list(rental_ids))
+        return {rental_id: (total, fee) for rental_id, total, fee in cursor.fetchall()}
+
+    def return_rental(self, rental_id, return_date=None):
+        # -> (total_cost, late_fee), or None if the rental isn't open or the return failed
+        charges = self.return_rentals([rental_id], return_date)
+        return charges.get(rental_id) if charges else None
+
+    def return_rentals(self, rental_ids, return_date=None):
+        # Close every open rental in one transaction, charging for the days
+        # actually kept and putting the copies back on the shelf.
+        # -> {rental_id: (total_cost, late_fee)} for the rentals that were open,
+        # or None on error
+        rental_ids = sorted(set(rental_ids))
+        if not rental_ids:
+            return {}
+        try:
+            return_date = parse_date(return_date) or datetime.now().date()
+            charges, customers = self.pool.run_transaction(self._checkin, rental_ids, return_date)
+        except ReturnConflictError:
+            logger.error(f"Rentals {rental_ids} were returned concurrently; nothing was changed")
+            return None
+        except (Error, ValueError) as err:
+            logger.error(f"Error returning rentals: {err}")
+            return None
+
+        self.customer_summaries.invalidate(customers)
+        skipped = sorted(set(rental_ids) - set(charges))
+        if skipped:
+            logger.warning(f"Rentals {skipped} are unknown or already returned")
+        logger.info(f"{len(charges)} rentals returned")
+        return charges
+
+    def _checkin(self, cursor, rental_ids, return_date):
+        placeholders = ", ".join(["%s"] * len(rental_ids))
+        cursor.execute(
+            f"SELECT id, game_id, staff_id, copy_id, customer_id FROM rentals WHERE id IN ({placeholders}) "
+            f"AND return_date IS NULL{self.backend.for_update}",
+            rental_ids
+        )
+        open_rentals = cursor.fetchall()
+        if not open_rentals:
+            return {}, set()
+        open_ids = [rental_id for rental_id, _, _, _, _ in open_rentals]
+        placeholders = ", ".join(["%s"] * len(open_ids))
+
+        # One set-based UPDATE prices every rental; the return_date guard makes
+        # a concurrent return of the same rental show up in rowcount
+        late_fee, total_cost = self._charge_sql()
+        cursor.execute(
+            f"UPDATE rentals SET return_date = %s, late_fee = {late_fee}, total_cost = {total_cost} "
+            f"WHERE id IN ({placeholders}) AND return_date IS NULL",
+            [return_date, return_date, self.LATE_FEE_PER_DAY, return_date, return_date, self.LATE_FEE_PER_DAY]
+            + open_ids
+        )
+        if cursor.rowcount != len(open_ids):
+            raise ReturnConflictError()
+
+        # Copies back on the shelf before the counters, the same lock order as checkout
+        copy_ids = [copy_id for _, _, _, copy_id, _ in open_rentals if copy_id is not None]
+        if copy_ids:
+            cursor.execute(
+                f"UPDATE game_copies SET status = %s WHERE id IN ({', '.join(['%s'] * len(copy_ids))})",
+                [inventory.AVAILABLE] + copy_ids
+            )
 
-        # Decrease available copies of the game
-            update_query = """
-            UPDATE games 
-            SET available_copies = available_copies - 1 
-            WHERE id = %s
-            """
-            self.cursor.execute(update_query, (game_id,))
+        quantities = Counter(game_id for _, game_id, _, _, _ in open_rentals)
+        game_ids, game_placeholders, case, case_params = self._quantity_sql(quantities)
+        cursor.execute(
+            f"UPDATE games SET available_copies = available_copies + {case} WHERE id IN ({game_placeholders})",
+            case_params + game_ids
+        )
 
-        # Commit the transaction
-            self.db.commit()
-            logger.info(f"Rental successfully added for customer ID {customer_id}")
-            return True
+        cursor.execute(f"SELECT id, total_cost, late_fee FROM rentals WHERE id IN ({placeholders})", open_ids)
+        charges = {rental_id: (total, fee) for rental_id, total, fee in cursor.fetchall()}
+
+        delta = ReportDelta()
+        for rental_id, game_id, staff_id, _, customer_id in open_rentals:
+            delta.returned(return_date, game_id, staff_id, *charges[rental_id], customer_id)
+        delta.apply(cursor, self.backend)
+        customers = {customer_id for _, _, _, _, customer_id in open_rentals if customer_id is not None}
+        return charges, customers
+
+    def assess_late_fees(self, as_of=None):
+        # Nightly run: recompute the late fee accrued so far on every overdue
+        # open rental in one statement. Idempotent, so re-running is harmless.
+        # -> (overdue rentals, total outstanding late fees), or None on error
+        if as_of is None:
+            as_of = datetime.now().date()
+        late_fee, _ = self._charge_sql()
+
+        def work(cursor):
+            cursor.execute(
+                f"UPDATE rentals SET late_fee = {late_fee} WHERE return_date IS NULL AND due_date < %s",
+                (as_of, self.LATE_FEE_PER_DAY, as_of)
+            )
+            cursor.execute(
+                "SELECT COUNT(*), COALESCE(SUM(late_fee), 0) FROM rentals WHERE return_date IS NULL AND due_date < %s",
+                (as_of,)
+            )
+            count, outstanding = cursor.fetchone()
+            return count, outstanding
 
-        except Exception as err:
-        # Roll back in case of an error
-            self.db.rollback()
-            logger.error(f"Error adding rental: {err}")
-            return False
+        try:
+            count, outstanding = self.pool.run_transaction(work)
+        except Error as err:
+            logger.error(f"Error assessing late fees: {err}")
+            return None
+        # Every overdue customer's late fees just changed
+        self.customer_summaries.invalidate()
+        logger.info(f"Late fees assessed as of {as_of}: {count} overdue rentals, {format_money(outstanding)} outstanding")
+        return count, outstanding
+
+    def reserve(self, customer_id, game_id, first_day, last_day):
+        # Hold one copy of a game for a customer over [first_day, last_day];
+        # checkouts by anyone else pass that copy over while it's held.
+        # -> reservation id, or None if no copy is free for the whole range
+        try:
+            first_day, last_day = parse_date(first_day), parse_date(last_day)
+            reservations.check_range(first_day, last_day, datetime.now().date())
+            reservation_id = self.pool.run_transaction(self._reserve, customer_id, game_id, first_day, last_day)
+        except (Error, ValueError) as err:
+            logger.error(f"Error adding reservation: {err}")
+            return None
+        if reservation_id is None:
+            logger.error(f"No copy of game ID {game_id} is free from {first_day} to {last_day}")
+            return None
+        logger.info(f"Reservation {reservation_id} added for customer ID {customer_id}")
+        return reservation_id
+
+    def _reserve(self, cursor, customer_id, game_id, first_day, last_day):
+        today = datetime.now().date()
+        for copy_id in reservations.free_copies(cursor, game_id, first_day, last_day, today):
+            # Lock the copy, then check again: a checkout or reservation may
+            # have taken it since the unlocked read above
+            cursor.execute(f"SELECT status FROM game_copies WHERE id = %s{self.backend.for_update}", (copy_id,))
+            if not cursor.fetchall():
+                continue
+            if not reservations.copy_is_free(cursor, self.backend, copy_id, first_day, last_day, today):
+                continue
+            cursor.execute(
+                "INSERT INTO reservations (customer_id, game_id, copy_id, start_date, end_date, status) "
+                "SELECT %s, %s, %s, %s, %s, %s FROM customers WHERE id = %s",
+                (customer_id, game_id, copy_id, first_day, last_day, reservations.ACTIVE, customer_id)
+            )
+            if cursor.rowcount != 1:
+                raise ValueError(f"Customer with ID {customer_id} does not exist")
+            return cursor.lastrowid
+        return None
 
+    def cancel_reservation(self, reservation_id):
+        try:
+            with self.pool.transaction() as cursor:
+                cursor.execute(
+                    "UPDATE reservations SET status = %s WHERE id = %s AND status = %s",
+                    (reservations.CANCELLED, reservation_id, reservations.ACTIVE)
+                )
+                cancelled = cursor.rowcount == 1
+        except Error as err:
+            logger.error(f"Error cancelling reservation: {err}")
+            return False
+        if not cancelled:
+            logger.error(f"Reservation {reservation_id} is unknown or no longer active")
+            return False
+        logger.info(f"Reservation {reservation_id} cancelled")
+        return True
+
+    def available_games_between(self, first_day, last_day, limit=None):
+        # [(game_id, title, copies free for the whole range)], by title
+        first_day, last_day = parse_date(first_day), parse_date(last_day)
+        query, params = reservations.available_games(
+            self.backend, first_day, last_day, datetime.now().date(), limit
+        )
+        return self.fetch_all(query, params)
+
+    def game_availability(self, game_id, first_day, last_day):
+        # How many copies of one game are free for the whole range
+        first_day, last_day = parse_date(first_day), parse_date(last_day)
+        return len(self.reads.read(
+            reservations.free_copies, game_id, first_day, last_day, datetime.now().date()
+        ))
+
+    def game_bookings(self, game_id, first_day, last_day):
+        # Reservations and open rentals holding the game's copies during the range
+        first_day, last_day = parse_date(first_day), parse_date(last_day)
+        query, params = reservations.bookings(game_id, first_day, last_day, datetime.now().date())
+        return self.fetch_all(query, params)
+
+    def customer_reservations(self, customer_id):
+        # The customer's active reservations that haven't ended yet, soonest first
+        return self.fetch_all(
+            "SELECT r.id, r.game_id, g.title, r.copy_id, r.start_date, r.end_date FROM reservations r "
+            "JOIN games g ON g.id = r.game_id WHERE r.customer_id = %s AND r.start_date >= %s "
+            "AND r.end_date >= %s AND r.status = %s ORDER BY r.start_date, r.id",
+            (customer_id, datetime.now().date() - timedelta(days=reservations.MAX_DAYS),
+             datetime.now().date(), reservations.ACTIVE)
+        )
 
     def add_staff(self, name, position, email):
         try:
             query = "INSERT INTO staff (name, position, email) VALUES (%s, %s, %s)"
-            self.cursor.execute(query, (name, email, position))
-            self.db.commit()
+            with self.pool.transaction(self.prepared_statements) as cursor:
+                cursor.execute(query, (name, position, email))
+                staff_id = cursor.lastrowid
+            self.reference.staff_added(staff_id, name)
             logger.info(f"Staff member {name} added successfully")
             return True
         except Error as err:
@@ -115,14 +947,28 @@ class GameRentalSystem:
         return False
 
 class ModernGameRentalGUI:
-    def __init__(self):
+    # How often the Rentals tab looks for customers, games and staff added elsewhere
+    REFERENCE_REFRESH_MS = 30000
+    # How often open View windows pick up rows added or changed since they last looked
+    VIEW_REFRESH_MS = 5000
+    # --measure-startup fails when the window takes longer than this to appear
+    FIRST_PAINT_BUDGET_MS = 500
+
+    def __init__(self, on_ready=None):
         # Create single root window
         self.root = tk.Tk()
         self.root.title("Game Rental System")
         self.root.geometry("1000x700")
-        
-        # Initialize system with root
-        self.system = GameRentalSystem(self.root)
+
+        # Nothing below touches the database: the window paints straight away
+        # and the connection is opened in the background (see connect())
+        self.system = None
+        self.on_ready = on_ready
+        self.startup_times = {}
+
+        # Database work runs on worker threads; results come back via root.after
+        self.executor = BackgroundExecutor(self.root)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Basic colors
         self.colors = {
@@ -134,6 +980,9 @@ class ModernGameRentalGUI:
         # Configure basic styles
         self.setup_styles()
         
+        # Status bar shows background work and lets the user cancel it
+        self.setup_status_bar()
+
         # Create main container
         self.main_container = ttk.Frame(self.root)
         self.main_container.pack(fill='both', expand=True, padx=20, pady=20)
@@ -150,13 +999,67 @@ class ModernGameRentalGUI:
         self.notebook = ttk.Notebook(self.main_container)
         self.notebook.pack(fill='both', expand=True)
         
-        # Initialize tabs
+        # Initialize tabs; their contents are built the first time each is shown
         self.setup_tabs()
 
+        self.root.after_idle(self._mark_startup, 'first_paint')
+        self.connect()
+
+    def _mark_startup(self, stage):
+        self.startup_times[stage] = round((time.perf_counter() - STARTED_AT) * 1000, 1)
+        logger.debug(f"Startup: {stage} after {self.startup_times[stage]} ms")
+        if stage == 'ready' and self.on_ready:
+            self.on_ready(self.startup_times)
+
+    def connect(self):
+        # GAMERENTAL_SERVICE=http://host:port makes this counter a thin client
+        # of service.py instead of a database client
+        service_url = os.environ.get('GAMERENTAL_SERVICE')
+
+        def open_system():
+            if service_url:
+                return RemoteRentalSystem(None, service_url, os.environ.get('GAMERENTAL_SERVICE_TOKEN'))
+            return GameRentalSystem(None)
+
+        def failed(err):
+            target = f"the rental service at {service_url}" if service_url else "the database"
+            messagebox.showerror("Connection Error", f"Failed to connect to {target}.")
+            self.on_close()
+
+        # The status bar spinner is the splash; Cancel can't abandon it
+        self.executor.submit(
+            open_system, on_success=self.connected, on_error=failed,
+            description="Connecting to the rental service" if service_url else "Connecting to the database",
+            cancellable=False
+        )
+
+    def connected(self, system):
+        self._mark_startup('connected')
+        self.system = system
+        self.setup_menus()
+        self.show_tab()
+        self.root.after(self.REFERENCE_REFRESH_MS, self.schedule_reference_refresh)
+        self.root.after_idle(self._mark_startup, 'ready')
+
+    def setup_menus(self):
         # Add menubar
         self.menubar = tk.Menu(self.root)
         self.root.config(menu=self.menubar)
         
+        # Create File menu. Import and export stream straight to and from the
+        # database, so a thin client leaves them to the service machine.
+        if isinstance(self.system, GameRentalSystem):
+            self.file_menu = tk.Menu(self.menubar, tearoff=0)
+            self.menubar.add_cascade(label="File", menu=self.file_menu)
+            self.file_menu.add_command(label="Import Customers...", command=lambda: self.import_csv('customers'))
+            self.file_menu.add_command(label="Import Games...", command=lambda: self.import_csv('games'))
+            self.file_menu.add_command(label="Import Staff...", command=lambda: self.import_csv('staff'))
+            self.file_menu.add_separator()
+            self.file_menu.add_command(label="Export Rentals...", command=self.export_rentals)
+            self.file_menu.add_command(label="Export Customers...", command=lambda: self.export_data('customers'))
+            self.file_menu.add_command(label="Export Games...", command=lambda: self.export_data('games'))
+            self.file_menu.add_command(label="Export Staff...", command=lambda: self.export_data('staff'))
+
         # Create View menu
         self.view_menu = tk.Menu(self.menubar, tearoff=0)
         self.menubar.add_cascade(label="View", menu=self.view_menu)
@@ -164,6 +1067,8 @@ class ModernGameRentalGUI:
         self.view_menu.add_command(label="Games", command=self.show_games)
         self.view_menu.add_command(label="Staff", command=self.show_staff)
         self.view_menu.add_command(label="Rentals", command=self.show_rentals)
+        self.view_menu.add_separator()
+        self.view_menu.add_command(label="Diagnostics", command=self.show_diagnostics)
 
     def setup_styles(self):
         # Simplified styling
@@ -172,6 +1077,46 @@ class ModernGameRentalGUI:
         style.configure('TLabel', background=self.colors['bg'])
         style.configure('TButton', padding=5)
         
+    def setup_status_bar(self):
+        self.status_bar = ttk.Frame(self.root)
+        self.status_bar.pack(side='bottom', fill='x', padx=20, pady=(0, 10))
+        self.status_label = ttk.Label(self.status_bar, text="Ready")
+        self.status_label.pack(side='left')
+        self.cancel_btn = ttk.Button(self.status_bar, text="Cancel", command=self.executor.cancel_all)
+        self.progress = ttk.Progressbar(self.status_bar, mode='indeterminate', length=150)
+        self.executor.add_listener(self.update_status)
+
+    def update_status(self, active_tasks):
+        if active_tasks:
+            self.status_label.config(text=f"{active_tasks[-1].description}... ({len(active_tasks)} running)")
+            if not self.progress.winfo_ismapped():
+                self.cancel_btn.pack(side='right')
+                self.progress.pack(side='right', padx=10)
+                self.progress.start(10)
+        else:
+            self.status_label.config(text="Ready")
+            self.progress.stop()
+            self.progress.pack_forget()
+            self.cancel_btn.pack_forget()
+
+    def run_in_background(self, description, fn, *args, on_success=None, on_error=None, **kwargs):
+        def report_error(err):
+            messagebox.showerror("Error", f"{description} failed")
+
+        return self.executor.submit(
+            fn, *args,
+            on_success=on_success,
+            on_error=on_error or report_error,
+            description=description,
+            **kwargs
+        )
+
+    def on_close(self):
+        self.executor.shutdown()
+        if self.system is not None:
+            self.system.close()
+        self.root.destroy()
+
     def create_modern_frame(self, parent, title):
         frame = ttk.LabelFrame(
             parent,
@@ -201,17 +1146,39 @@ class ModernGameRentalGUI:
         self.customers_tab = ttk.Frame(self.notebook)
         self.games_tab = ttk.Frame(self.notebook)
         self.rentals_tab = ttk.Frame(self.notebook)
+        self.reservations_tab = ttk.Frame(self.notebook)
         self.staff_tab = ttk.Frame(self.notebook)
+        self.reports_tab = ttk.Frame(self.notebook)
 
         self.notebook.add(self.customers_tab, text='Customers')
         self.notebook.add(self.games_tab, text='Games')
         self.notebook.add(self.rentals_tab, text='Rentals')
+        self.notebook.add(self.reservations_tab, text='Reservations')
         self.notebook.add(self.staff_tab, text='Staff')
-
-        self.setup_customers_tab()
-        self.setup_games_tab()
-        self.setup_rentals_tab()
-        self.setup_staff_tab()
+        self.notebook.add(self.reports_tab, text='Reports')
+
+        # Tab frame -> builder, run once when the tab is first shown after connecting
+        self.tab_builders = {
+            str(self.customers_tab): self.setup_customers_tab,
+            str(self.games_tab): self.setup_games_tab,
+            str(self.rentals_tab): self.setup_rentals_tab,
+            str(self.reservations_tab): self.setup_reservations_tab,
+            str(self.staff_tab): self.setup_staff_tab,
+            str(self.reports_tab): self.setup_reports_tab,
+        }
+        self.built_tabs = set()
+        self.notebook.bind('<<NotebookTabChanged>>', lambda event: self.show_tab())
+
+    def show_tab(self):
+        if self.system is None:
+            return
+        selected = self.notebook.select()
+        if selected not in self.built_tabs:
+            self.built_tabs.add(selected)
+            self.tab_builders[selected]()
+        # Reports are loaded when the tab is opened rather than at startup
+        if selected == str(self.reports_tab):
+            self.load_reports()
 
     def setup_customers_tab(self):
         customers_frame = self.create_modern_frame(self.customers_tab, "Customer Management")
@@ -304,18 +1271,37 @@ class ModernGameRentalGUI:
         # Customer selection
         customer_frame = ttk.Frame(input_frame)
         customer_frame.pack(fill='x', pady=5)
-        ttk.Label(customer_frame, text="Customer").pack(side='left')
-        self.rental_customer = ttk.Combobox(customer_frame, state='readonly')
+        ttk.Label(customer_frame, text="Customer").pack(side='left', anchor='n')
+        self.rental_customer = TypeAheadEntry(
+            customer_frame, self.system.search_customers, self.run_in_background,
+            on_select=self.show_customer_account
+        )
         self.rental_customer.pack(side='right', expand=True, fill='x', padx=10)
-        self.load_customers_combo()
+
+        # Account panel: appears as soon as a customer is picked
+        self.account_panel = ttk.Frame(input_frame)
+        self.account_anchor = customer_frame
+        self.account_summary = ttk.Label(self.account_panel, justify='left')
+        self.account_summary.pack(fill='x', padx=10)
+        account_columns = ('ID', 'Game', 'Rented', 'Due', 'Late Fee')
+        self.account_rentals = ttk.Treeview(self.account_panel, columns=account_columns, show='headings', height=4)
+        for column in account_columns:
+            self.account_rentals.heading(column, text=column)
+            self.account_rentals.column(column, width=220 if column == 'Game' else 90, anchor='w')
+        self.account_rentals.tag_configure('overdue', foreground='red')
+        self.account_rentals.pack(fill='x', padx=10, pady=(5, 0))
 
         # Game selection
         game_frame = ttk.Frame(input_frame)
         game_frame.pack(fill='x', pady=5)
-        ttk.Label(game_frame, text="Game").pack(side='left')
-        self.rental_game = ttk.Combobox(game_frame, state='readonly')
+        ttk.Label(game_frame, text="Game").pack(side='left', anchor='n')
+        # Offers only games the picked customer could take home now, reservations included
+        self.rental_game = TypeAheadEntry(
+            game_frame,
+            lambda text, limit: self.system.search_games(text, limit, self.rental_customer.selected_id),
+            self.run_in_background
+        )
         self.rental_game.pack(side='right', expand=True, fill='x', padx=10)
-        self.load_games_combo()
 
         # Staff selection
         staff_frame = ttk.Frame(input_frame)
@@ -348,36 +1334,387 @@ class ModernGameRentalGUI:
         )
         add_btn.pack(pady=10)
 
-    def load_customers_combo(self):
-        self.system.cursor.execute("SELECT id, name FROM customers")
-        customers = self.system.cursor.fetchall()
-        self.rental_customer['values'] = [f"{id} - {name}" for id, name in customers]
-
-    def load_games_combo(self):
-        self.system.cursor.execute("SELECT id, title FROM games WHERE available_copies > 0")
-        games = self.system.cursor.fetchall()
-        self.rental_game['values'] = [f"{id} - {title}" for id, title in games]
+        # Basket for renting several games in one checkout
+        basket_frame = ttk.Frame(rentals_frame)
+        basket_frame.pack(fill='both', expand=True, pady=5)
+        ttk.Label(basket_frame, text="Basket").pack(anchor='w')
+        self.basket_list = tk.Listbox(basket_frame, height=5)
+        self.basket_list.pack(side='left', fill='both', expand=True, padx=(0, 10))
+
+        basket_buttons = ttk.Frame(basket_frame)
+        basket_buttons.pack(side='right', fill='y')
+        self.create_modern_button(basket_buttons, "Add to Basket", self.add_to_basket).pack(fill='x', pady=2)
+        self.create_modern_button(basket_buttons, "Remove", self.remove_from_basket).pack(fill='x', pady=2)
+        self.create_modern_button(basket_buttons, "Checkout Basket", self.checkout_basket).pack(fill='x', pady=2)
+
+        # Returns: one or more rental IDs, charged for the days actually kept
+        return_frame = ttk.Frame(rentals_frame)
+        return_frame.pack(fill='x', pady=(10, 5))
+        ttk.Label(return_frame, text="Return Rental IDs").pack(side='left')
+        self.return_ids = self.create_modern_entry(return_frame)
+        self.return_ids.pack(side='left', expand=True, fill='x', padx=10)
+        self.create_modern_button(return_frame, "Process Return", self.process_return).pack(side='right')
+
+    def show_customer_account(self, customer_id):
+        if customer_id is None:
+            self.account_panel.pack_forget()
+            return
+        self.account_summary.config(text="Loading account...")
+        self.account_rentals.delete(*self.account_rentals.get_children())
+        self.account_panel.pack(fill='x', pady=5, after=self.account_anchor)
+
+        def fill(summary):
+            # Ignore an answer for a customer who is no longer picked
+            if self.rental_customer.selected_id != customer_id:
+                return
+            if summary is None:
+                self.account_summary.config(text="Customer not found")
+                return
+            self.account_summary.config(text=(
+                f"{summary['open_rentals']} rented out, {summary['overdue']} overdue "
+                f"({format_money(summary['late_fees_due'])} late fees so far)   "
+                f"Lifetime: {summary['rentals']} rentals, {format_money(summary['spent'])} spent   "
+                f"Last visit: {format_date(summary['last_visit'], 'never')}"
+            ))
+            self.account_rentals.delete(*self.account_rentals.get_children())
+            for rental in summary['active']:
+                self.account_rentals.insert('', 'end', values=(
+                    rental['rental_id'], rental['title'], format_date(rental['rental_date']),
+                    format_date(rental['due_date']), format_money(rental['late_fee'])
+                ), tags=('overdue',) if rental['overdue'] else ())
+
+        self.run_in_background("Loading customer account", self.system.customer_summary, customer_id, on_success=fill)
+
+    def refresh_customer_account(self):
+        # After a checkout or return the picked customer's numbers have moved
+        if self.rental_customer.selected_id is not None:
+            self.show_customer_account(self.rental_customer.selected_id)
 
     def load_staff_combo(self):
-        self.system.cursor.execute("SELECT id, name FROM staff")
-        staff = self.system.cursor.fetchall()
-        self.rental_staff['values'] = [f"{id} - {name}" for id, name in staff]
+        # Loaded when the Rentals tab is first built, not at startup
+        if str(self.rentals_tab) not in self.built_tabs:
+            return
+
+        def fill(staff):
+            self.rental_staff['values'] = [f"{id} - {name}" for id, name in staff]
+
+        self.run_in_background("Loading staff", self.system.reference.staff, on_success=fill)
+
+    def refresh_reference_data(self):
+        # Cheap "changed since" check; only combos whose table changed are rebuilt
+        # Customers and games are searched on demand, so only staff is preloaded
+        def done(changed):
+            if 'staff' in changed:
+                self.load_staff_combo()
+
+        self.run_in_background(
+            "Checking for changes", self.system.reference.refresh, on_success=done, cancellable=False, quiet=True
+        )
+
+    def schedule_reference_refresh(self):
+        self.refresh_reference_data()
+        self.root.after(self.REFERENCE_REFRESH_MS, self.schedule_reference_refresh)
 
     def add_rental_record(self):
+        # Customers and games only count once picked from the search results
+        customer_id, game_id = self.rental_customer.selected_id, self.rental_game.selected_id
+        if customer_id is None or game_id is None:
+            messagebox.showerror("Error", "Please search for and select a customer and a game")
+            return
         try:
-            customer_id = int(self.rental_customer.get().split(' - ')[0])
-            game_id = int(self.rental_game.get().split(' - ')[0])
             staff_id = int(self.rental_staff.get().split(' - ')[0])
             rental_date = self.rental_date.get()
             return_date = self.return_date.get() if self.return_date.get() else None
+        except ValueError:
+            messagebox.showerror("Error", "Please fill all required fields correctly")
+            return
 
-            if self.system.add_rental(customer_id, game_id, staff_id, rental_date, return_date):
+        def done(added):
+            if added:
                 messagebox.showinfo("Success", "Rental added successfully!")
-                self.load_games_combo()  # Refresh available games
+                self.rental_game.clear()  # The next search sees the new availability
+                self.refresh_customer_account()
             else:
                 messagebox.showerror("Error", "Failed to add rental")
+
+        self.run_in_background(
+            "Adding rental", self.system.add_rental,
+            customer_id, game_id, staff_id, rental_date, return_date,
+            on_success=done
+        )
+
+    def add_to_basket(self):
+        if self.rental_game.selected_id is None:
+            messagebox.showerror("Error", "Please search for and select a game")
+            return
+        self.basket_list.insert(tk.END, self.rental_game.get())
+        self.rental_game.clear()
+
+    def remove_from_basket(self):
+        for index in reversed(self.basket_list.curselection()):
+            self.basket_list.delete(index)
+
+    def checkout_basket(self):
+        basket = self.basket_list.get(0, tk.END)
+        customer_id = self.rental_customer.selected_id
+        if customer_id is None:
+            messagebox.showerror("Error", "Please search for and select a customer")
+            return
+        try:
+            staff_id = int(self.rental_staff.get().split(' - ')[0])
+            game_ids = [int(game.split(' - ')[0]) for game in basket]
+            rental_date = self.rental_date.get()
+            return_date = self.return_date.get() if self.return_date.get() else None
         except ValueError:
             messagebox.showerror("Error", "Please fill all required fields correctly")
+            return
+        if not game_ids:
+            messagebox.showerror("Error", "The basket is empty")
+            return
+
+        def done(added):
+            if added:
+                messagebox.showinfo("Success", f"{len(game_ids)} rentals added successfully!")
+                self.basket_list.delete(0, tk.END)
+                self.rental_game.clear()
+                self.refresh_customer_account()
+            else:
+                messagebox.showerror("Error", "Not every game in the basket is available; nothing was rented")
+
+        self.run_in_background(
+            "Checking out basket", self.system.add_rentals,
+            customer_id, game_ids, staff_id, rental_date, return_date,
+            on_success=done
+        )
+
+    def setup_reservations_tab(self):
+        reservations_frame = self.create_modern_frame(self.reservations_tab, "Reservations")
+        reservations_frame.pack(fill='both', expand=True, padx=10, pady=5)
+
+        input_frame = ttk.Frame(reservations_frame)
+        input_frame.pack(fill='x', pady=10)
+
+        customer_frame = ttk.Frame(input_frame)
+        customer_frame.pack(fill='x', pady=5)
+        ttk.Label(customer_frame, text="Customer").pack(side='left', anchor='n')
+        self.reservation_customer = TypeAheadEntry(
+            customer_frame, self.system.search_customers, self.run_in_background,
+            on_select=lambda customer_id: self.load_customer_reservations()
+        )
+        self.reservation_customer.pack(side='right', expand=True, fill='x', padx=10)
+
+        game_frame = ttk.Frame(input_frame)
+        game_frame.pack(fill='x', pady=5)
+        ttk.Label(game_frame, text="Game").pack(side='left', anchor='n')
+        # Any title: whether a copy is free is up to reserve() for the chosen dates
+        self.reservation_game = TypeAheadEntry(
+            game_frame,
+            lambda text, limit: self.system.search_games(text, limit, rentable_only=False),
+            self.run_in_background
+        )
+        self.reservation_game.pack(side='right', expand=True, fill='x', padx=10)
+
+        dates_frame = ttk.Frame(input_frame)
+        dates_frame.pack(fill='x', pady=5)
+        ttk.Label(dates_frame, text="From").pack(side='left')
+        self.reservation_from = self.create_modern_entry(dates_frame)
+        self.reservation_from.insert(0, datetime.now().strftime('%Y-%m-%d'))
+        self.reservation_from.pack(side='left', expand=True, fill='x', padx=10)
+        ttk.Label(dates_frame, text="To").pack(side='left')
+        self.reservation_to = self.create_modern_entry(dates_frame)
+        self.reservation_to.insert(0, (datetime.now() + timedelta(days=2)).strftime('%Y-%m-%d'))
+        self.reservation_to.pack(side='left', expand=True, fill='x', padx=10)
+
+        buttons = ttk.Frame(reservations_frame)
+        buttons.pack(pady=5)
+        self.create_modern_button(buttons, "Reserve", self.add_reservation).pack(side='left', padx=5)
+        self.create_modern_button(buttons, "Find Free Games", self.find_free_games).pack(side='left', padx=5)
+
+        # Games with a copy free over the dates, by title
+        ttk.Label(reservations_frame, text="Free for the whole range").pack(anchor='w')
+        free_columns = ('ID', 'Title', 'Free Copies')
+        self.free_games = ttk.Treeview(reservations_frame, columns=free_columns, show='headings', height=8)
+        for column in free_columns:
+            self.free_games.heading(column, text=column)
+            self.free_games.column(column, width=260 if column == 'Title' else 90, anchor='w')
+        self.free_games.pack(fill='both', expand=True, pady=(0, 10))
+
+        # The picked customer's upcoming reservations
+        ttk.Label(reservations_frame, text="Customer's reservations").pack(anchor='w')
+        booked_columns = ('ID', 'Game', 'Copy', 'From', 'To')
+        self.customer_booked = ttk.Treeview(reservations_frame, columns=booked_columns, show='headings', height=5)
+        for column in booked_columns:
+            self.customer_booked.heading(column, text=column)
+            self.customer_booked.column(column, width=260 if column == 'Game' else 90, anchor='w')
+        self.customer_booked.pack(fill='both', expand=True)
+        self.create_modern_button(
+            reservations_frame, "Cancel Selected", self.cancel_selected_reservation
+        ).pack(pady=5)
+
+    def _reservation_dates(self):
+        return parse_date(self.reservation_from.get()), parse_date(self.reservation_to.get())
+
+    def add_reservation(self):
+        customer_id = self.reservation_customer.selected_id
+        game_id = self.reservation_game.selected_id
+        try:
+            first_day, last_day = self._reservation_dates()
+        except ValueError:
+            messagebox.showerror("Error", "Dates must be YYYY-MM-DD")
+            return
+        if customer_id is None or game_id is None:
+            messagebox.showerror("Error", "Please search for and select a customer and a game")
+            return
+        # The same rules reserve() applies, checked here so the message says what's wrong
+        try:
+            reservations.check_range(first_day, last_day, datetime.now().date())
+        except ValueError as err:
+            messagebox.showerror("Error", str(err))
+            return
+
+        def done(reservation_id):
+            if reservation_id is None:
+                messagebox.showerror("Error", "No copy is free for those dates")
+                return
+            messagebox.showinfo("Success", f"Reservation {reservation_id} added")
+            self.load_customer_reservations()
+
+        self.run_in_background(
+            "Adding reservation", self.system.reserve, customer_id, game_id, first_day, last_day,
+            on_success=done
+        )
+
+    def find_free_games(self):
+        try:
+            first_day, last_day = self._reservation_dates()
+        except ValueError:
+            messagebox.showerror("Error", "Dates must be YYYY-MM-DD")
+            return
+
+        def fill(games):
+            self.free_games.delete(*self.free_games.get_children())
+            for game in games:
+                self.free_games.insert('', 'end', values=game)
+
+        self.run_in_background(
+            "Finding free games", self.system.available_games_between, first_day, last_day, 200, on_success=fill
+        )
+
+    def load_customer_reservations(self):
+        customer_id = self.reservation_customer.selected_id
+        self.customer_booked.delete(*self.customer_booked.get_children())
+        if customer_id is None:
+            return
+
+        def fill(booked):
+            if self.reservation_customer.selected_id != customer_id:
+                return
+            self.customer_booked.delete(*self.customer_booked.get_children())
+            for reservation_id, _, title, copy_id, first_day, last_day in booked:
+                self.customer_booked.insert('', 'end', values=(
+                    reservation_id, title, copy_id, format_date(first_day), format_date(last_day)
+                ))
+
+        self.run_in_background(
+            "Loading reservations", self.system.customer_reservations, customer_id, on_success=fill
+        )
+
+    def cancel_selected_reservation(self):
+        selected = self.customer_booked.selection()
+        if not selected:
+            messagebox.showerror("Error", "Please select a reservation")
+            return
+        reservation_id = self.customer_booked.item(selected[0], 'values')[0]
+
+        def done(cancelled):
+            if not cancelled:
+                messagebox.showerror("Error", "Failed to cancel reservation")
+            self.load_customer_reservations()
+
+        self.run_in_background(
+            "Cancelling reservation", self.system.cancel_reservation, int(reservation_id), on_success=done
+        )
+
+    def setup_reports_tab(self):
+        reports_frame = self.create_modern_frame(self.reports_tab, "Reports")
+        reports_frame.pack(fill='both', expand=True, padx=10, pady=5)
+
+        # Each panel reads one small summary table, never the rentals history
+        panels = [
+            ('daily', "Revenue per day (last 30 days)", ('Day', 'Rentals', 'Returns', 'Revenue', 'Late fees')),
+            ('top_games', "Top games", ('ID', 'Title', 'Rentals', 'Revenue')),
+            ('genres', "Revenue per genre", ('Genre', 'Rentals', 'Revenue')),
+            ('staff', "Revenue per staff member", ('ID', 'Name', 'Rentals', 'Revenue')),
+        ]
+        grid = ttk.Frame(reports_frame)
+        grid.pack(fill='both', expand=True)
+        self.report_tables = {}
+        for index, (key, title, columns) in enumerate(panels):
+            panel = ttk.LabelFrame(grid, text=title, padding=5)
+            panel.grid(row=index // 2, column=index % 2, sticky='nsew', padx=5, pady=5)
+            tree = ttk.Treeview(panel, columns=columns, show='headings', height=8)
+            for column in columns:
+                tree.heading(column, text=column)
+                tree.column(column, width=60 if column == 'ID' else 110)
+            tree.pack(fill='both', expand=True)
+            self.report_tables[key] = tree
+        for index in range(2):
+            grid.columnconfigure(index, weight=1)
+            grid.rowconfigure(index, weight=1)
+
+        self.create_modern_button(reports_frame, "Refresh", self.load_reports).pack(pady=5)
+
+    def load_reports(self):
+        def fill(data):
+            rows = {
+                'daily': [
+                    (format_date(day), rentals, returns, format_money(revenue), format_money(late_fees))
+                    for day, rentals, returns, revenue, late_fees in data['daily']
+                ],
+                'top_games': [(game_id, title, rentals, format_money(revenue))
+                              for game_id, title, rentals, revenue in data['top_games']],
+                'genres': [(genre or '(none)', rentals, format_money(revenue))
+                           for genre, rentals, revenue in data['genres']],
+                'staff': [(staff_id, name, rentals, format_money(revenue))
+                          for staff_id, name, rentals, revenue in data['staff']],
+            }
+            for key, tree in self.report_tables.items():
+                tree.delete(*tree.get_children())
+                for values in rows[key]:
+                    tree.insert('', 'end', values=values)
+
+        self.run_in_background("Loading reports", self.system.dashboard, on_success=fill)
+
+    def process_return(self):
+        try:
+            rental_ids = [int(value) for value in self.return_ids.get().replace(',', ' ').split()]
+        except ValueError:
+            messagebox.showerror("Error", "Enter rental IDs separated by commas or spaces")
+            return
+        if not rental_ids:
+            messagebox.showerror("Error", "Enter at least one rental ID")
+            return
+
+        def done(charges):
+            if charges is None:
+                messagebox.showerror("Error", "Failed to process the return")
+                return
+            if not charges:
+                messagebox.showerror("Error", "None of those rentals are out")
+                return
+            total = sum(cost for cost, _ in charges.values())
+            late_fees = sum(fee for _, fee in charges.values())
+            message = f"Returned {len(charges)} rental(s). Amount due: {format_money(total)}"
+            if late_fees:
+                message += f" (including {format_money(late_fees)} in late fees)"
+            skipped = sorted(set(rental_ids) - set(charges))
+            if skipped:
+                message += f"\n\nNot out, skipped: {', '.join(map(str, skipped))}"
+            messagebox.showinfo("Return processed", message)
+            self.return_ids.delete(0, tk.END)
+            self.refresh_customer_account()
+
+        self.run_in_background("Processing return", self.system.return_rentals, rental_ids, on_success=done)
 
     def setup_staff_tab(self):
         staff_frame = self.create_modern_frame(self.staff_tab, "Staff Management")
@@ -420,122 +1757,384 @@ class ModernGameRentalGUI:
         name = self.customer_name.get()
         email = self.customer_email.get()
         phone = self.customer_phone.get()
-        
-        if self.system.add_customer(name, email, phone):
-            messagebox.showinfo("Success", "Customer added successfully!")
-            self.customer_name.delete(0, tk.END)
-            self.customer_email.delete(0, tk.END)
-            self.customer_phone.delete(0, tk.END)
-        else:
-            messagebox.showerror("Error", "Failed to add customer")
+
+        def done(added):
+            if added:
+                messagebox.showinfo("Success", "Customer added successfully!")
+                self.customer_name.delete(0, tk.END)
+                self.customer_email.delete(0, tk.END)
+                self.customer_phone.delete(0, tk.END)
+            else:
+                messagebox.showerror("Error", "Failed to add customer")
+
+        self.run_in_background("Adding customer", self.system.add_customer, name, email, phone, on_success=done)
 
     def add_game(self):
         title = self.game_title.get()
         genre = self.game_genre.get()
         price = self.game_price.get()
         copies = self.game_copies.get()
-        
-        if self.system.add_game(title, genre, price, copies):
-            messagebox.showinfo("Success", "Game added successfully!")
-            self.game_title.delete(0, tk.END)
-            self.game_genre.delete(0, tk.END)
-            self.game_price.delete(0, tk.END)
-            self.game_copies.delete(0, tk.END)
+
+        def done(added):
+            if added:
+                messagebox.showinfo("Success", "Game added successfully!")
+                self.game_title.delete(0, tk.END)
+                self.game_genre.delete(0, tk.END)
+                self.game_price.delete(0, tk.END)
+                self.game_copies.delete(0, tk.END)
+
+        self.run_in_background("Adding game", self.system.add_game, title, genre, price, copies, on_success=done)
 
     def add_staff(self):
         name = self.staff_name.get()
         email = self.staff_email.get()
         role = self.staff_role.get()
-        
-        if self.system.add_staff(name, email, role):
-            messagebox.showinfo("Success", "Staff added successfully!")
-            self.staff_name.delete(0, tk.END)
-            self.staff_email.delete(0, tk.END)
-            self.staff_role.set('')
-
-    def add_rental(self):
-        customer_id = self.customer_select.get()
-        game_id = self.game_select.get()
-        staff_id = self.staff_select.get()
-        
-        if self.system.add_rental(customer_id, game_id, staff_id):
-            messagebox.showinfo("Success", "Rental created successfully!")
-            self.customer_select.set('')
-            self.game_select.set('')
-            self.staff_select.set('')
+
+        def done(added):
+            if added:
+                messagebox.showinfo("Success", "Staff added successfully!")
+                self.staff_name.delete(0, tk.END)
+                self.staff_email.delete(0, tk.END)
+                self.staff_role.set('')
+                self.load_staff_combo()  # Served from the reference cache
+
+        self.run_in_background("Adding staff", self.system.add_staff, name, email, role, on_success=done)
+
+    def import_csv(self, kind):
+        path = filedialog.askopenfilename(
+            title=f"Import {kind}",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        def done(report):
+            message = report.summary()
+            if report.errors:
+                shown = "\n".join(f"line {line}: {error}" for line, error in report.errors[:20])
+                more = f"\n... and {len(report.errors) - 20} more" if len(report.errors) > 20 else ""
+                message += f"\n\n{shown}{more}"
+            messagebox.showinfo("Import finished", message)
+            # Pick up the new rows in the Rentals tab
+            self.refresh_reference_data()
+
+        def failed(err):
+            messagebox.showerror("Import failed", str(err))
+
+        self.run_in_background(
+            f"Importing {kind}", bulk_import.import_csv, self.system, kind, path,
+            on_success=done, on_error=failed
+        )
+
+    def export_rentals(self):
+        # Optional date range first, then the file
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Export Rentals")
+        dialog.transient(self.root)
+        ttk.Label(dialog, text="Rental dates (YYYY-MM-DD), blank for all").grid(
+            row=0, column=0, columnspan=2, padx=10, pady=(10, 5)
+        )
+        ttk.Label(dialog, text="From:").grid(row=1, column=0, sticky='e', padx=5, pady=2)
+        date_from = ttk.Entry(dialog, width=14)
+        date_from.grid(row=1, column=1, sticky='w', padx=5, pady=2)
+        ttk.Label(dialog, text="To:").grid(row=2, column=0, sticky='e', padx=5, pady=2)
+        date_to = ttk.Entry(dialog, width=14)
+        date_to.grid(row=2, column=1, sticky='w', padx=5, pady=2)
+
+        def go():
+            try:
+                dates = parse_date(date_from.get().strip() or None), parse_date(date_to.get().strip() or None)
+            except ValueError:
+                messagebox.showerror("Error", "Dates must be YYYY-MM-DD", parent=dialog)
+                return
+            dialog.destroy()
+            self.export_data('rentals', *dates)
+
+        ttk.Button(dialog, text="Export...", command=go).grid(row=3, column=0, columnspan=2, pady=10)
+        date_from.focus_set()
+
+    def export_data(self, kind, date_from=None, date_to=None):
+        path = filedialog.asksaveasfilename(
+            title=f"Export {kind}",
+            defaultextension='.csv',
+            initialfile=f"{kind}.csv",
+            filetypes=[
+                ("CSV files", "*.csv"), ("Compressed CSV", "*.csv.gz"),
+                ("JSON Lines", "*.jsonl"), ("Compressed JSON Lines", "*.jsonl.gz"), ("All files", "*.*"),
+            ]
+        )
+        if not path:
+            return
+        task = None
+
+        def done(count):
+            messagebox.showinfo("Export finished", f"Exported {count} {kind} to {path}")
+
+        def failed(err):
+            if not isinstance(err, export.ExportCancelled):
+                messagebox.showerror("Export failed", str(err))
+
+        # Cancel in the status bar stops the export at the next chunk
+        task = self.run_in_background(
+            f"Exporting {kind}", export.export, self.system, kind, path,
+            date_from=date_from, date_to=date_to,
+            should_stop=lambda: task is not None and task.cancelled,
+            on_success=done, on_error=failed
+        )
 
     def show_customers(self):
         columns = ('ID', 'Name', 'Email', 'Phone')
-        query = "SELECT * FROM customers"
-        self.create_view_window("Customer List", columns, query)
+        self.create_view_window("Customer List", columns, 'customers')
 
     def show_games(self):
         columns = ('ID', 'Title', 'Genre', 'Price/Day', 'Copies')
-        query = "SELECT * FROM games"
-        self.create_view_window("Games List", columns, query)
+        self.create_view_window("Games List", columns, 'games')
 
     def show_staff(self):
         columns = ('ID', 'Name', 'Position', 'Contact')
-        query = "SELECT * FROM staff"
-        self.create_view_window("Staff List", columns, query)
+        self.create_view_window("Staff List", columns, 'staff')
 
     def show_rentals(self):
         columns = ('ID', 'Customer', 'Game', 'Staff', 'Rental Date', 'Return Date', 'Total Cost')
-        query = """
-        SELECT 
-            r.id,
-            c.name as customer_name,
-            g.title as game_title,
-            s.name as staff_name,
-            DATE_FORMAT(r.rental_date, '%Y-%m-%d') as rental_date,
-            IFNULL(DATE_FORMAT(r.return_date, '%Y-%m-%d'), 'Not Returned') as return_date,
-            CONCAT('$', FORMAT(r.total_cost, 2)) as total_cost
-        FROM rentals r
-        LEFT JOIN customers c ON r.customer_id = c.id
-        LEFT JOIN games g ON r.game_id = g.id
-        LEFT JOIN staff s ON r.staff_id = s.id
-        ORDER BY r.rental_date DESC
-        """
-        self.create_view_window("Rental Records", columns, query)
+        self.create_view_window("Rental Records", columns, 'rentals')
 
-    def create_view_window(self, title, columns, query):
-        try:
-            window = tk.Toplevel(self.root)
-            window.title(title)
-            window.geometry("1200x500")
-
-            frame = ttk.Frame(window)
-            frame.pack(fill='both', expand=True)
-
-            y_scroll = ttk.Scrollbar(frame, orient='vertical')
-            x_scroll = ttk.Scrollbar(frame, orient='horizontal')
-            
-            tree = ttk.Treeview(frame, yscrollcommand=y_scroll.set, xscrollcommand=x_scroll.set)
-            tree['columns'] = columns
-
-            tree.column('#0', width=0, stretch=tk.NO)
-            for col in columns:
-                tree.column(col, width=150)
-                tree.heading(col, text=col)
-
-            self.system.cursor.execute(query)
-            for row in self.system.cursor.fetchall():
-                tree.insert('', 'end', values=row)
-
-            y_scroll.config(command=tree.yview)
-            x_scroll.config(command=tree.xview)
-            
-            y_scroll.pack(side='right', fill='y')
-            x_scroll.pack(side='bottom', fill='x')
-            tree.pack(fill='both', expand=True)
+    def create_view_window(self, title, columns, view):
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.geometry("1200x500")
 
-        except Error as err:
+        sorts = GameRentalSystem.VIEW_SORTS[view]
+        filters = GameRentalSystem.VIEW_FILTERS[view]
+        # Sort column (None: the view's default order), direction, active filters
+        state = {'sort': None, 'descending': None, 'filters': {}, 'table': None}
+
+        def failed(err):
             logger.error(f"Database error in {title}: {err}")
-            messagebox.showerror("Error", f"Failed to load {title.lower()} data")
+            if window.winfo_exists():
+                message = str(err) if isinstance(err, ValueError) else f"Failed to load {title.lower()} data"
+                messagebox.showerror("Error", message, parent=window)
+
+        def reload():
+            # Sorting and filtering happen in the database; the new table starts
+            # again from the first page of the new order
+            if state['table'] is not None:
+                state['table'].destroy()
+            sort, descending, active = state['sort'], state['descending'], dict(state['filters'])
+            table = PagedTreeview(
+                window,
+                columns,
+                lambda after, limit, until=None: self.system.fetch_page(
+                    view, after, limit, sort, descending, active, until
+                ),
+                self.run_in_background,
+                on_error=failed,
+                # Open windows stay live: only rows changed since the last poll are fetched
+                fetch_changes=lambda since, after, until: self.system.view_changes(
+                    view, since, after, until, sort, descending, active
+                ),
+                refresh_ms=self.VIEW_REFRESH_MS if live.get() else None
+            )
+            for column in columns:
+                arrow = (' \u25bc' if descending else ' \u25b2') if column == sort else ''
+                command = (lambda column=column: sort_by(column)) if column in sorts else ''
+                table.tree.heading(column, text=column + arrow, command=command)
+            table.pack(fill='both', expand=True)
+            state['table'] = table
+            shown.config(text=", ".join(f"{name}: {value}" for name, value in active.items()) or "No filters")
+
+        def sort_by(column):
+            if state['sort'] == column:
+                state['descending'] = not state['descending']
+            else:
+                state['sort'], state['descending'] = column, False
+            reload()
+
+        def apply_filter(event=None):
+            value = filter_value.get().strip()
+            if value:
+                # A value the query would reject never joins the active
+                # filters, so later sorts and reloads keep working
+                try:
+                    value = GameRentalSystem.check_filter(view, filter_name.get(), value)
+                except ValueError as err:
+                    messagebox.showerror("Error", str(err), parent=window)
+                    return
+                state['filters'][filter_name.get()] = value
+            else:
+                state['filters'].pop(filter_name.get(), None)
+            reload()
+
+        def clear_filters():
+            filter_value.delete(0, tk.END)
+            state['filters'].clear()
+            reload()
+
+        # Filter bar: pick a filter, type a value, Apply; filters combine
+        filter_bar = ttk.Frame(window)
+        filter_bar.pack(fill='x', padx=10, pady=5)
+        ttk.Label(filter_bar, text="Filter").pack(side='left')
+        filter_name = ttk.Combobox(filter_bar, state='readonly', values=list(filters), width=14)
+        filter_name.set(next(iter(filters)))
+        filter_name.pack(side='left', padx=5)
+        filter_value = ttk.Entry(filter_bar, width=30)
+        filter_value.pack(side='left', padx=5)
+        filter_value.bind('<Return>', apply_filter)
+        ttk.Button(filter_bar, text="Apply", command=apply_filter).pack(side='left', padx=5)
+        ttk.Button(filter_bar, text="Clear", command=clear_filters).pack(side='left')
+        shown = ttk.Label(filter_bar)
+        shown.pack(side='left', padx=10)
+        live = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            filter_bar, text="Auto-refresh", variable=live,
+            command=lambda: state['table'].set_auto_refresh(live.get())
+        ).pack(side='right')
+
+        # Rows are fetched a page at a time as the user scrolls
+        reload()
+
+    def show_diagnostics(self):
+        window = tk.Toplevel(self.root)
+        window.title("Diagnostics")
+        window.geometry("1100x600")
+
+        summary = ttk.Label(window, justify='left')
+        summary.pack(fill='x', padx=10, pady=(10, 5))
+
+        tabs = ttk.Notebook(window)
+        tabs.pack(fill='both', expand=True, padx=10)
+
+        # Statements grouped by shape, most total time first
+        query_columns = ('Statement', 'Calls', 'Total ms', 'Mean ms', 'p95 ms', 'p99 ms', 'Rows', 'Slow', 'Call site')
+        queries_frame = ttk.Frame(tabs)
+        tabs.add(queries_frame, text="Queries")
+        queries = ttk.Treeview(queries_frame, columns=query_columns, show='headings', height=12)
+        for column in query_columns:
+            queries.heading(column, text=column)
+            queries.column(column, width=260 if column == 'Call site' else 90, anchor='w')
+        queries.pack(fill='both', expand=True)
+        details = tk.Text(queries_frame, height=6, wrap='word')
+        details.pack(fill='x', pady=(5, 0))
+
+        slow_columns = ('Time', 'ms', 'Rows', 'Statement', 'Call site')
+        slow_frame = ttk.Frame(tabs)
+        tabs.add(slow_frame, text="Slow queries")
+        slow = ttk.Treeview(slow_frame, columns=slow_columns, show='headings')
+        for column in slow_columns:
+            slow.heading(column, text=column)
+            slow.column(column, width=260 if column == 'Call site' else 140, anchor='w')
+        slow.pack(fill='both', expand=True)
+
+        operations = {}
+
+        def show_details(event=None):
+            selected = queries.selection()
+            if not selected or selected[0] not in operations:
+                return
+            operation = operations[selected[0]]
+            sites = "\n".join(f"  {site} ({count} calls)" for site, count in operation['call_sites'])
+            details.delete('1.0', 'end')
+            details.insert('1.0', f"{operation['sql']}\n\np50 {operation['p50_ms']} ms, "
+                                  f"max {operation['max_ms']} ms, {operation['errors']} errors\n{sites}")
+
+        queries.bind('<<TreeviewSelect>>', show_details)
+
+        def refresh():
+            # Over the service this is an HTTP call, so it runs off the Tk
+            # thread; a failed poll is shown and the next one tries again
+            if window.winfo_exists():
+                self.run_in_background("Loading diagnostics", self.system.diagnostics,
+                                       on_success=redraw, on_error=failed, cancellable=False, quiet=True)
+
+        def failed(err):
+            if window.winfo_exists():
+                summary.config(text=f"Diagnostics unavailable: {err}")
+                window.after(2000, refresh)
+
+        def redraw(data):
+            if not window.winfo_exists():
+                return
+            pool, cache, stats = data['pool'], data['reference_cache'], data['queries']
+            summary.config(text=(
+                f"{data['backend']}   Pool: {pool['in_use']} in use, {pool['idle']} idle, "
+                f"{pool['retries']} retries   Lookup cache: {cache['hits']} hits, {cache['misses']} misses\n"
+                f"Since {stats['since']}, slow-query threshold {stats['slow_threshold_ms']} ms"
+            ))
+
+            selected = queries.selection()
+            operations.clear()
+            queries.delete(*queries.get_children())
+            for operation in stats['operations']:
+                top_site = operation['call_sites'][0][0] if operation['call_sites'] else ''
+                operations[operation['query_id']] = operation
+                queries.insert('', 'end', iid=operation['query_id'], values=(
+                    operation['statement'], operation['calls'], operation['total_ms'], operation['mean_ms'],
+                    operation['p95_ms'], operation['p99_ms'], operation['rows'], operation['slow'], top_site
+                ))
+            if selected and queries.exists(selected[0]):
+                queries.selection_set(selected[0])
+
+            slow.delete(*slow.get_children())
+            for entry in reversed(stats['slow_queries']):
+                slow.insert('', 'end', values=(entry['at'], entry['ms'], entry['rows'], entry['statement'], entry['site']))
+
+            window.after(2000, refresh)
+
+        def reset():
+            details.delete('1.0', 'end')
+            self.run_in_background("Resetting diagnostics", self.system.reset_diagnostics)
+
+        def export(kind):
+            json_export = kind == 'json'
+            path = filedialog.asksaveasfilename(
+                parent=window,
+                title="Export diagnostics",
+                defaultextension='.json' if json_export else '.prom',
+                filetypes=[("JSON", "*.json")] if json_export else [("Prometheus text", "*.prom *.txt")]
+            )
+            if not path:
+                return
+
+            def write(text):
+                try:
+                    with open(path, 'w') as out:
+                        out.write(text)
+                except OSError as err:
+                    messagebox.showerror("Export failed", str(err), parent=window)
+
+            self.run_in_background(
+                "Exporting diagnostics",
+                self.system.diagnostics_json if json_export else self.system.prometheus_metrics,
+                on_success=write
+            )
+
+        buttons = ttk.Frame(window)
+        buttons.pack(fill='x', padx=10, pady=10)
+        ttk.Button(buttons, text="Reset", command=reset).pack(side='left')
+        ttk.Button(buttons, text="Export JSON...", command=lambda: export('json')).pack(side='right')
+        ttk.Button(buttons, text="Export Prometheus...", command=lambda: export('prometheus')).pack(side='right', padx=5)
+
+        refresh()
 
 def main():
-    app = ModernGameRentalGUI()
+    parser = argparse.ArgumentParser(description="Game rental counter")
+    parser.add_argument('--measure-startup', action='store_true',
+                        help="Print startup timings as JSON once the app is ready, then exit")
+    parser.add_argument('--budget-ms', type=float, default=ModernGameRentalGUI.FIRST_PAINT_BUDGET_MS,
+                        help="With --measure-startup, exit with status 1 if the first paint takes longer")
+    args = parser.parse_args()
+    configure_logging()
+
+    result = {}
+
+    def report(times):
+        result.update(times, budget_ms=args.budget_ms, within_budget=times['first_paint'] <= args.budget_ms)
+        print(json.dumps(result))
+        app.on_close()
+
+    app = ModernGameRentalGUI(on_ready=report if args.measure_startup else None)
     app.root.mainloop()
+    if args.measure_startup and not result.get('within_budget'):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file